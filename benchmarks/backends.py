@@ -0,0 +1,123 @@
+'''
+This script runs the same random workload (scripts/check_backend_conformance.py: create/join/leave/delete/rename/
+list calls with exact, lowercase and typo'd team names) against every registered HackathonBase backend and
+reports ops/sec, so that the backend and its settings can be picked for a roster size.
+
+- sequential: the calls run one after the other, per call kind latencies are reported, and every backend's results
+  are compared with the first backend's (HackathonSQLite), differences are correctness bugs
+- concurrent: the calls are split over --threads threads, results depend on the interleaving so only what must
+  hold whatever the order is checked afterwards (team sizes, one team per participant, no duplicate names)
+
+Results are written as JSON with --output.
+'''
+
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, List
+
+from benchmarks.db_overhead import write_participants_csv
+from benchmarks.sqlite_ops import git_commit, summarise
+from core.backends import BACKENDS, create_backend
+from scripts.check_backend_conformance import Call, Outcome, check_invariants, final_state, random_workload, run_call
+
+MAX_TEAM_SIZE = 5
+
+
+def run_sequential(name: str, data_dirpath: str, csv_filepath: str, calls: List[Call]) -> Dict:
+    db = create_backend(name, data_dirpath, csv_filepath, max_team_size=MAX_TEAM_SIZE)
+    timings = defaultdict(list)
+    outcomes: List[Outcome] = []
+    start = time.perf_counter()
+    for call in calls:
+        call_start = time.perf_counter()
+        outcomes.append(run_call(db, call))
+        timings[call[0]].append(time.perf_counter() - call_start)
+    elapsed = time.perf_counter() - start
+    outcomes += final_state(db)
+    db.close()
+    return {"ops_per_s": round(len(calls) / elapsed), "outcomes": outcomes,
+            "calls": {kind: summarise(kind_timings) for kind, kind_timings in sorted(timings.items())}}
+
+
+def run_concurrent(name: str, data_dirpath: str, csv_filepath: str, calls: List[Call], threads: int,
+                   num_participants: int) -> Dict:
+    db = create_backend(name, data_dirpath, csv_filepath, max_team_size=MAX_TEAM_SIZE)
+    exceptions = []
+
+    def worker(k: int):
+        for call in calls[k::threads]:
+            kind, value = run_call(db, call)
+            if kind == "exception":
+                exceptions.append(f"{call[0]}: {value}")
+
+    workers = [threading.Thread(target=worker, args=(k,)) for k in range(threads)]
+    start = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    violations = exceptions + check_invariants(db, num_participants, MAX_TEAM_SIZE)
+    db.close()
+    return {"ops_per_s": round(len(calls) / elapsed), "violations": violations}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backends", default=",".join(BACKENDS), help="comma separated, the first one is the reference")
+    parser.add_argument("--participants", type=int, default=1000)
+    parser.add_argument("--ops", type=int, default=20000)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the results to this JSON file")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(os.environ.get("LOG_LEVEL", "CRITICAL"))
+    backends = args.backends.split(",")
+    calls = random_workload(random.Random(args.seed), args.participants, args.ops)
+    results = {
+        "meta": {"commit": git_commit(), "python": platform.python_version(), "platform": platform.platform(),
+                 "time": time.strftime("%Y-%m-%dT%H:%M:%S"), "participants": args.participants, "ops": args.ops,
+                 "threads": args.threads, "seed": args.seed},
+        "results": {},
+    }
+    with tempfile.TemporaryDirectory() as tmpdir:
+        csv_filepath = os.path.join(tmpdir, "participants.csv")
+        write_participants_csv(csv_filepath, args.participants)
+
+        reference = None
+        for name in backends:
+            sequential = run_sequential(name, os.path.join(tmpdir, name, "sequential"), csv_filepath, calls)
+            outcomes = sequential.pop("outcomes")
+            reference = reference or outcomes
+            sequential["differences"] = sum(expected != actual for expected, actual in zip(reference, outcomes))
+            concurrent = run_concurrent(name, os.path.join(tmpdir, name, "concurrent"), csv_filepath, calls,
+                                        args.threads, args.participants)
+            results["results"][name] = {"sequential": sequential, "concurrent": concurrent}
+
+            print(f"{name}: sequential {sequential['ops_per_s']} ops/s, {sequential['differences']} difference(s) "
+                  f"from {backends[0]}; concurrent ({args.threads} threads) {concurrent['ops_per_s']} ops/s, "
+                  f"{len(concurrent['violations'])} violation(s)")
+            for violation in concurrent["violations"][:5]:
+                print(f"    {violation}")
+            for kind, result in sequential["calls"].items():
+                print(f"  {kind:<30} p50 {result['p50_ms']:>8.3f} ms  p95 {result['p95_ms']:>8.3f} ms  n={result['n']}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+'''
+USAGE
+    python -m benchmarks.backends --participants 1000 --ops 20000 --threads 8
+    python -m benchmarks.backends --backends sqlite,journal --participants 50000 --ops 50000 --output bench_backends.json
+'''
@@ -0,0 +1,94 @@
+'''
+This script hammers a HackathonSQLite instance from N threads, each thread repeatedly joining a team,
+listing teams and leaving the team again, and reports throughput and latency per operation.
+'''
+
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+from benchmarks.db_overhead import write_participants_csv
+from core.hackathon_base import HackathonError
+from core.sqlite.hackathon_sqlite import HackathonSQLite
+
+
+def percentile(timings, p):
+    return timings[min(len(timings) - 1, int(len(timings) * p))]
+
+
+def worker(db: HackathonSQLite, usernames, team_names, duration: float, timings, errors, lock):
+    local_timings = defaultdict(list)
+    local_errors = defaultdict(int)
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        username = random.choice(usernames)
+        for op, call in (
+            ("join_team", lambda: db.join_team(random.choice(team_names), username)),
+            ("list_teams", db.list_teams),
+            ("leave_current_team", lambda: db.leave_current_team(username)),
+        ):
+            start = time.perf_counter()
+            try:
+                call()
+            except HackathonError as e:
+                # business errors (team full, already in a team) are expected, only count them
+                local_errors[f"{op}: {e.message}"] += 1
+            local_timings[op].append((time.perf_counter() - start) * 1000)
+
+    with lock:
+        for op, values in local_timings.items():
+            timings[op].extend(values)
+        for key, count in local_errors.items():
+            errors[key] += count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--participants", type=int, default=2000)
+    parser.add_argument("--teams", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=5.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        db_filepath = os.path.join(tmpdir, "hackathon_data.db")
+        csv_filepath = os.path.join(tmpdir, "participants.csv")
+        write_participants_csv(csv_filepath, args.participants)
+        db = HackathonSQLite(db_filepath, csv_filepath)
+
+        # first participants are captains, the rest keep joining and leaving
+        team_names = [f"team {i} crew" for i in range(args.teams)]
+        for i, team_name in enumerate(team_names):
+            db.create_team(team_name, f"user{i}")
+        usernames = [f"user{i}" for i in range(args.teams, args.participants)]
+
+        timings, errors, lock = defaultdict(list), defaultdict(int), threading.Lock()
+        threads = [
+            threading.Thread(target=worker, args=(db, usernames, team_names, args.duration, timings, errors, lock))
+            for _ in range(args.threads)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        read_cache_stats = db.read_cache.stats()
+        db.close()
+
+    total_ops = sum(len(values) for values in timings.values())
+    print(f"threads={args.threads} duration={args.duration}s total ops={total_ops} throughput={total_ops / args.duration:.0f} ops/s")
+    for op, values in sorted(timings.items()):
+        values.sort()
+        print(f"{op:>20}: {len(values) / args.duration:8.0f} ops/s, p50 {percentile(values, 0.5):.3f} ms, p99 {percentile(values, 0.99):.3f} ms")
+    print(f"read cache: {read_cache_stats}")
+    for key, count in sorted(errors.items()):
+        print(f"{count:>8} x {key}")
+
+
+'''
+USAGE
+    python -m benchmarks.concurrency --threads 16 --duration 5
+'''
@@ -0,0 +1,77 @@
+'''
+This script reports the resident memory of the slack bot process after N threads have been mentioned, with
+conversations kept in a plain dict (old behaviour) vs kept in the bounded ConversationStore.
+
+Each run happens in its own process so that their peak RSS can be compared. Conversations get a few turns of
+canned messages, the LLM is never called.
+'''
+
+import argparse
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+
+from benchmarks.db_overhead import write_participants_csv
+from benchmarks.slack_handlers import BenchmarkLLM
+from core.sqlite.hackathon_sqlite import HackathonSQLite
+from llm.conversation_store import ConversationStore
+
+USER_MESSAGE = "I want to create a team called the spaghetti coders, we are building an expense bot " * 2
+BOT_MESSAGE = '{"action": "create_team", "team_name": "spaghetti coders", "message": "Mamma mia, done!"}' * 2
+
+
+def add_turns(chain, turns: int):
+    for _ in range(turns):
+        chain.memory.save_context({"input": USER_MESSAGE}, {"response": BOT_MESSAGE})
+
+
+def run(mode: str, threads: int, turns: int, max_entries: int, result_queue):
+    os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        db_filepath = os.path.join(tmpdir, "hackathon_data.db")
+        csv_filepath = os.path.join(tmpdir, "participants.csv")
+        write_participants_csv(csv_filepath, 10)
+        llm = BenchmarkLLM(HackathonSQLite(db_filepath, csv_filepath))
+
+        start = time.perf_counter()
+        if mode == "dict":
+            active_conversations = {}
+            for i in range(threads):
+                active_conversations[f"C1:{i}"] = chain = llm.get_conversation_chain()
+                add_turns(chain, turns)
+        else:
+            active_conversations = ConversationStore(llm.get_conversation_chain, llm.db, max_entries=max_entries)
+            for i in range(threads):
+                with active_conversations.conversation(f"C1:{i}") as chain:
+                    add_turns(chain, turns)
+        elapsed = time.perf_counter() - start
+
+        # linux reports ru_maxrss in KB
+        max_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        result_queue.put((mode, len(active_conversations), max_rss_mb, elapsed))
+        llm.db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--threads", type=int, default=10000)
+    parser.add_argument("--turns", type=int, default=2)
+    parser.add_argument("--max-entries", type=int, default=1000)
+    args = parser.parse_args()
+
+    result_queue = multiprocessing.Queue()
+    print(f"threads={args.threads} turns per thread={args.turns} store max entries={args.max_entries}")
+    for mode in ("dict", "store"):
+        process = multiprocessing.Process(target=run, args=(mode, args.threads, args.turns, args.max_entries, result_queue))
+        process.start()
+        mode, in_memory, max_rss_mb, elapsed = result_queue.get()
+        process.join()
+        print(f"{mode:>6}: {in_memory} conversations in memory, max RSS {max_rss_mb:.0f} MB, {elapsed:.1f}s")
+
+
+'''
+USAGE
+    python -m benchmarks.conversation_store --threads 10000 --max-entries 1000
+'''
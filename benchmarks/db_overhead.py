@@ -0,0 +1,70 @@
+'''
+This script measures the database overhead paid per slack message, i.e the DB work done by
+OpenAILLM.get_conversation outside of the LLM call (a participant lookup followed by one action).
+
+It compares a fresh HackathonSQLite per DB call (old behaviour) with the process-wide shared instance.
+'''
+
+import argparse
+import csv
+import os
+import statistics
+import tempfile
+import time
+
+from core.sqlite.hackathon_sqlite import HackathonSQLite
+
+
+def write_participants_csv(filepath: str, num_participants: int):
+    with open(filepath, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=["username", "full_name", "bio"])
+        writer.writeheader()
+        for i in range(num_participants):
+            writer.writerow({"username": f"user{i}", "full_name": f"User {i}", "bio": f"bio of user {i}"})
+
+
+def simulate_message(get_db, username: str):
+    get_db().get_participant_details(username=username)
+    get_db().list_my_team(username=username)
+
+
+def measure(get_db, num_messages: int, num_participants: int):
+    timings = []
+    for i in range(num_messages):
+        start = time.perf_counter()
+        simulate_message(get_db, f"user{i % num_participants}")
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return {
+        "mean_ms": statistics.mean(timings),
+        "p50_ms": timings[len(timings) // 2],
+        "p99_ms": timings[min(len(timings) - 1, int(len(timings) * 0.99))],
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--participants", type=int, default=3000)
+    parser.add_argument("--messages", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        db_filepath = os.path.join(tmpdir, "hackathon_data.db")
+        csv_filepath = os.path.join(tmpdir, "participants.csv")
+        write_participants_csv(csv_filepath, args.participants)
+
+        new_instance_per_call = lambda: HackathonSQLite(db_filepath, csv_filepath)
+        before = measure(new_instance_per_call, args.messages, args.participants)
+
+        shared = HackathonSQLite(db_filepath, csv_filepath)
+        after = measure(lambda: shared, args.messages, args.participants)
+
+    print(f"participants={args.participants} messages={args.messages}")
+    for label, result in (("instance per call", before), ("shared instance", after)):
+        print(f"{label:>18}: mean {result['mean_ms']:.3f} ms, p50 {result['p50_ms']:.3f} ms, p99 {result['p99_ms']:.3f} ms")
+
+
+'''
+USAGE
+    python -m benchmarks.db_overhead --participants 3000 --messages 200
+'''
@@ -0,0 +1,78 @@
+'''
+This script evaluates the local intent fast path (llm/intent.py) on the labelled corpus llm/intent_corpus.csv.
+
+The model is scored with k-fold cross validation, i.e every message is classified by a model which was not
+trained on it. It reports
+    - accuracy of the classifier over all nine actions
+    - coverage: share of messages answered locally, and how many of those got the right action
+    - classification latency, and the LLM latency saved per message given the average LLM call latency
+'''
+
+import argparse
+import random
+import statistics
+import time
+from collections import Counter
+
+from llm.intent import LOCAL_ACTIONS, IntentClassifier, read_corpus
+
+
+def percentile(values: list, p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--min-confidence", type=float, default=0.9)
+    parser.add_argument("--llm-latency", type=float, default=1.5, help="average LLM call latency in seconds")
+    parser.add_argument("--verbose", action="store_true", help="print misclassified messages")
+    args = parser.parse_args()
+
+    corpus = read_corpus()
+    random.Random(42).shuffle(corpus)
+
+    correct, handled, handled_correct, local_expected = 0, 0, 0, 0
+    latencies = []
+    mistakes = Counter()
+    for fold in range(args.folds):
+        train = [example for i, example in enumerate(corpus) if i % args.folds != fold]
+        test = [example for i, example in enumerate(corpus) if i % args.folds == fold]
+        classifier = IntentClassifier(train, min_confidence=args.min_confidence)
+
+        for text, action in test:
+            start = time.perf_counter()
+            local = classifier.local_action(text)
+            latencies.append(time.perf_counter() - start)
+
+            prediction = classifier.predict(text)
+            correct += prediction.action == action
+            local_expected += action in LOCAL_ACTIONS
+            if local is not None:
+                handled += 1
+                handled_correct += local.action == action
+                if local.action != action:
+                    mistakes[(text, action, local.action)] += 1
+            elif args.verbose and prediction.action != action:
+                print(f"  to LLM, predicted {prediction.action} ({prediction.confidence:.2f}) for {action}: {text}")
+
+    total = len(corpus)
+    classify_ms = statistics.mean(latencies) * 1000
+    coverage = handled / total
+    print(f"corpus={total} messages, {args.folds} fold cross validation, min confidence={args.min_confidence}")
+    print(f"classifier accuracy (all actions): {correct / total:.1%}")
+    print(f"answered locally: {handled}/{total} ({coverage:.1%}) of all messages, "
+          f"{handled}/{local_expected} of messages with a local action")
+    print(f"fast path precision: {handled_correct}/{handled} ({handled_correct / max(handled, 1):.1%})")
+    print(f"classification latency: mean {classify_ms:.3f} ms, p99 {percentile(latencies, 0.99) * 1000:.3f} ms")
+    print(f"LLM latency saved: {coverage * args.llm_latency * 1000:.0f} ms per message on average "
+          f"({args.llm_latency * 1000:.0f} ms per locally answered message)")
+    for (text, action, predicted), count in mistakes.items():
+        print(f"  wrong local answer {predicted} for {action}: {text}")
+
+
+'''
+USAGE
+    python -m benchmarks.intent_fast_path --llm-latency 1.5
+'''
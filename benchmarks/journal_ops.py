@@ -0,0 +1,141 @@
+'''
+This script times HackathonJournal, the in-memory backend persisted to an append-only journal, at increasing scales:
+- startup, replaying the whole journal (no snapshot yet) and from a compacted snapshot plus a short log tail
+- join, leave, create, rename and delete latency, each mutation waiting for its fsync (fsync interval 0)
+- mutations per second from --threads threads, with every mutation fsynced (group commit) and with periodic
+  fsyncs every --fsync-interval seconds
+
+Teams (captain + 2 members each, at most --max-teams) are created through the public API, i.e journaled.
+'''
+
+import argparse
+import logging
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+from typing import Dict
+
+from benchmarks.db_overhead import write_participants_csv
+from benchmarks.sqlite_ops import MEMBERS_PER_TEAM, summarise, team_name, time_calls
+from core.hackathon_base import HackathonError
+from core.journal.hackathon_journal import HackathonJournal
+
+
+def seed(db: HackathonJournal, num_teams: int):
+    '''
+    team i has user{3i} as captain and user{3i+1}, user{3i+2} as members
+    '''
+    for i in range(num_teams):
+        db.create_team(team_name(i), f"user{MEMBERS_PER_TEAM * i}")
+        for j in range(1, MEMBERS_PER_TEAM):
+            db.join_team(team_name(i), f"user{MEMBERS_PER_TEAM * i + j}")
+
+
+def mutations_per_second(db: HackathonJournal, num_teams: int, participants: int, threads: int, duration: float) -> float:
+    '''
+    every thread joins a random team with a random unassigned participant and leaves it again
+    '''
+    counts = [0] * threads
+    deadline = time.perf_counter() + duration
+
+    def worker(k: int):
+        rng = random.Random(k)
+        usernames = [f"user{i}" for i in range(MEMBERS_PER_TEAM * num_teams + k, participants, threads)]
+        while time.perf_counter() < deadline:
+            username = rng.choice(usernames)
+            try:
+                db.join_team(team_name(rng.randrange(num_teams)), username)
+                db.leave_current_team(username)
+                counts[k] += 2
+            except HackathonError:
+                counts[k] += 1
+
+    workers = [threading.Thread(target=worker, args=(k,)) for k in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return sum(counts) / duration
+
+
+def bench_scale(tmpdir: str, participants: int, max_teams: int, repeat: int, threads: int, duration: float,
+                fsync_interval: float) -> Dict[str, dict]:
+    num_teams = min(max_teams, participants // 5)
+    data_dirpath = os.path.join(tmpdir, f"journal_{participants}")
+    csv_filepath = os.path.join(tmpdir, f"participants_{participants}.csv")
+    write_participants_csv(csv_filepath, participants)
+    results = {}
+
+    # nothing is compacted while seeding, startup replays every record
+    db = HackathonJournal(data_dirpath, csv_filepath, compact_after=10 ** 9)
+    seed(db, num_teams)
+    records = db.journal.seq
+    db.close()
+    start = time.perf_counter()
+    db = HackathonJournal(data_dirpath, csv_filepath, compact_after=1)
+    results["startup_replay"] = summarise([time.perf_counter() - start])
+    results["startup_replay"]["records"] = records
+
+    # compact_after=1 compacts on the next mutation, startup loads the snapshot and a one record tail
+    db.leave_current_team("user1")
+    db.close()
+    start = time.perf_counter()
+    db = HackathonJournal(data_dirpath, csv_filepath)
+    results["startup_snapshot"] = summarise([time.perf_counter() - start])
+    db.join_team(team_name(0), "user1")
+
+    teams = [i * num_teams // repeat for i in range(repeat)]
+    unassigned = [f"user{MEMBERS_PER_TEAM * num_teams + i}" for i in range(min(repeat, participants - MEMBERS_PER_TEAM * num_teams))]
+    joiners = list(zip(unassigned, teams))
+
+    results["join_team"] = summarise(time_calls([lambda u=u, t=t: db.join_team(team_name(t), u) for u, t in joiners]))
+    results["leave_current_team"] = summarise(time_calls([lambda u=u: db.leave_current_team(u) for u, _ in joiners]))
+    results["create_team"] = summarise(time_calls([lambda u=u: db.create_team(f"new team of {u}", u) for u in unassigned]))
+    results["rename_my_team"] = summarise(time_calls([lambda u=u: db.rename_my_team(f"renamed team of {u}", u) for u in unassigned]))
+    results["delete_my_team"] = summarise(time_calls([lambda u=u: db.delete_my_team(u) for u in unassigned]))
+    results["list_teams"] = summarise(time_calls([db.list_teams] * 5, before=db.read_cache.bump_version))
+
+    fsyncs = db.journal.fsyncs
+    results["mutations_per_s_fsync_each"] = {"ops_per_s": round(mutations_per_second(db, num_teams, participants, threads, duration))}
+    results["mutations_per_s_fsync_each"]["fsyncs"] = db.journal.fsyncs - fsyncs
+    db.close()
+    db = HackathonJournal(data_dirpath, csv_filepath, fsync_interval=fsync_interval)
+    results["mutations_per_s_fsync_periodic"] = {"ops_per_s": round(mutations_per_second(db, num_teams, participants, threads, duration))}
+    db.close()
+    shutil.rmtree(data_dirpath)
+
+    for op in results.values():
+        op.update(participants=participants, teams=num_teams)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--participants", default="1000,10000,100000", help="comma separated scales")
+    parser.add_argument("--max-teams", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=200, help="calls per operation")
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=3.0, help="seconds of each throughput run")
+    parser.add_argument("--fsync-interval", type=float, default=0.01)
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(os.environ.get("LOG_LEVEL", "WARNING"))
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for participants in (int(scale) for scale in args.participants.split(",")):
+            ops = bench_scale(tmpdir, participants, args.max_teams, args.repeat, args.threads, args.duration, args.fsync_interval)
+            print(f"participants={participants} teams={next(iter(ops.values()))['teams']}")
+            for op, result in ops.items():
+                if "ops_per_s" in result:
+                    print(f"  {op:<36} {result['ops_per_s']:>10} ops/s")
+                else:
+                    print(f"  {op:<36} p50 {result['p50_ms']:>10.3f} ms  p95 {result['p95_ms']:>10.3f} ms  n={result['n']}")
+
+
+'''
+USAGE
+    python -m benchmarks.journal_ops --participants 1000,10000,100000
+    python -m benchmarks.journal_ops --participants 10000 --threads 16 --fsync-interval 0.05
+'''
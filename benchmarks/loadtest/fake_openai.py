@@ -0,0 +1,296 @@
+'''
+a local stand-in for the OpenAI chat completions API, for load tests which must not spend real tokens.
+
+In "fake" mode it answers with canned JSON intents (see scenario.intent_for) after a latency drawn from a
+configurable distribution, streamed in chunks if the request asks for it. In "record" mode it proxies requests to
+the real API and saves every response with its latency to a cassette file, which "replay" mode then serves, so
+that runs are reproducible.
+
+Faults can be injected to exercise the bot's retries, JSON re-prompts and circuit breaker: a share of requests
+failing with HTTP 503, a share answered with text which is not JSON, and an outage window during which every
+request fails.
+'''
+
+import hashlib
+import json
+import logging
+import math
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Optional, Tuple
+
+from benchmarks.loadtest.scenario import intent_for
+
+logger = logging.getLogger(__name__)
+
+OPENAI_API_BASE = "https://api.openai.com/v1"
+MODES = ("fake", "record", "replay")
+# streamed responses: share of the latency before the first token, and characters per chunk
+FIRST_TOKEN_SHARE = 0.3
+STREAM_CHUNK_CHARS = 8
+
+
+def parse_latency(spec: str) -> Callable[[random.Random], float]:
+    '''
+    parses a latency distribution in seconds, e.g "fixed:1.0", "uniform:0.5,1.5", "normal:1.0,0.2" or
+    "lognormal:1.0,0.4" (median, sigma)
+    '''
+    kind, _, params = spec.partition(":")
+    values = [float(value) for value in params.split(",")] if params else []
+    if kind == "fixed":
+        return lambda rng: values[0]
+    if kind == "uniform":
+        return lambda rng: rng.uniform(values[0], values[1])
+    if kind == "normal":
+        return lambda rng: max(0.0, rng.gauss(values[0], values[1]))
+    if kind == "lognormal":
+        return lambda rng: rng.lognormvariate(math.log(values[0]), values[1])
+    raise ValueError(f"Unknown latency distribution {spec}, should be fixed, uniform, normal or lognormal")
+
+
+def approximate_tokens(text: str) -> int:
+    # ~4 characters per token for english, the fake server can't download tiktoken encodings offline
+    return max(1, len(text) // 4)
+
+
+def parse_outage(spec: str) -> Optional[Tuple[float, float]]:
+    '''
+    parses "START,END", seconds since the server started during which every request fails
+    '''
+    if not spec:
+        return None
+    start, end = (float(value) for value in spec.split(","))
+    return start, end
+
+
+class InjectedFault(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.payload = {"error": {"message": message, "type": "server_error"}}
+
+
+def request_key(request: dict) -> str:
+    return hashlib.sha256(json.dumps([request.get("model"), request.get("messages")], sort_keys=True).encode()).hexdigest()
+
+
+class FakeOpenAIServer:
+    '''
+    Usage:
+        with FakeOpenAIServer(latency="lognormal:1.0,0.4") as server:
+            os.environ["OPENAI_API_BASE"] = server.api_base
+            ...
+    '''
+
+    def __init__(self, latency: str = "lognormal:1.0,0.4", mode: str = "fake", cassette_filepath: str = None,
+                 upstream: str = OPENAI_API_BASE, seed: int = 42, error_rate: float = 0.0,
+                 invalid_json_rate: float = 0.0, outage: Optional[Tuple[float, float]] = None):
+        if mode not in MODES:
+            raise ValueError(f"Unknown mode {mode}, should be one of {MODES}")
+        if mode != "fake" and not cassette_filepath:
+            raise ValueError(f"{mode} mode needs a cassette file")
+        self.mode = mode
+        self.latency = parse_latency(latency)
+        self.cassette_filepath = cassette_filepath
+        self.upstream = upstream.rstrip("/")
+        self.error_rate = error_rate
+        self.invalid_json_rate = invalid_json_rate
+        self.outage = outage
+
+        self.requests = 0
+        self.injected_errors = 0
+        self.invalid_json = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.replay_misses = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._cassette: Dict[str, dict] = {}
+        if mode == "replay":
+            with open(cassette_filepath, "r") as f:
+                for line in f:
+                    entry = json.loads(line)
+                    self._cassette[entry["key"]] = entry
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+        self._started_at = time.monotonic()
+
+    @property
+    def api_base(self) -> str:
+        host, port = self._server.server_address
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "FakeOpenAIServer":
+        self._started_at = time.monotonic()
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-openai", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "FakeOpenAIServer":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "llm_requests": self.requests,
+                "prompt_tokens": self.prompt_tokens,
+                "completion_tokens": self.completion_tokens,
+                "replay_misses": self.replay_misses,
+                "injected_errors": self.injected_errors,
+                "invalid_json": self.invalid_json,
+            }
+
+    def complete(self, request: dict, authorization: str) -> Tuple[dict, float]:
+        '''
+        returns the chat completion response for a request and the latency to simulate before it's complete
+        '''
+        self._inject_error()
+        if self.mode == "record":
+            return self._record(request, authorization), 0.0
+
+        entry = self._cassette.get(request_key(request)) if self.mode == "replay" else None
+        if entry is not None:
+            latency, response = entry["latency"], entry["response"]
+        else:
+            if self.mode == "replay":
+                logger.warning("No recorded response for request, answering with a canned intent")
+                with self._lock:
+                    self.replay_misses += 1
+            with self._lock:
+                latency = self.latency(self._random)
+            response = self._canned_response(request)
+            with self._lock:
+                invalid_json = self._random.random() < self.invalid_json_rate
+                self.invalid_json += invalid_json
+            if invalid_json:
+                message = response["choices"][0]["message"]
+                message["content"] = f"Sure! {message['content']}"
+
+        self._count(response)
+        return response, latency
+
+    def _inject_error(self):
+        with self._lock:
+            elapsed = time.monotonic() - self._started_at
+            in_outage = self.outage is not None and self.outage[0] <= elapsed < self.outage[1]
+            if not in_outage and self._random.random() >= self.error_rate:
+                return
+            self.injected_errors += 1
+        raise InjectedFault(503, "The server is overloaded or not ready yet.")
+
+    def _canned_response(self, request: dict) -> dict:
+        prompt = "\n".join(message.get("content") or "" for message in request.get("messages", []))
+        action, team_name = intent_for(prompt)
+        content = json.dumps({"action": action, "team_name": team_name or "", "message": f"Mamma mia, {action}!"})
+        prompt_tokens, completion_tokens = approximate_tokens(prompt), approximate_tokens(content)
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "gpt-4o"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                      "total_tokens": prompt_tokens + completion_tokens},
+        }
+
+    def _record(self, request: dict, authorization: str) -> dict:
+        # always recorded whole, streamed to the bot afterwards if it asked for it
+        upstream_request = urllib.request.Request(
+            f"{self.upstream}/chat/completions", data=json.dumps({**request, "stream": False}).encode(),
+            headers={"Content-Type": "application/json", "Authorization": authorization})
+        start = time.perf_counter()
+        with urllib.request.urlopen(upstream_request, timeout=120) as upstream_response:
+            response = json.loads(upstream_response.read())
+        latency = time.perf_counter() - start
+
+        entry = {"key": request_key(request), "latency": latency, "response": response}
+        with self._lock:
+            with open(self.cassette_filepath, "a") as f:
+                f.write(json.dumps(entry) + "\n")
+        self._count(response)
+        return response
+
+    def _count(self, response: dict):
+        usage = response.get("usage", {})
+        with self._lock:
+            self.requests += 1
+            self.prompt_tokens += usage.get("prompt_tokens", 0)
+            self.completion_tokens += usage.get("completion_tokens", 0)
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                if not self.path.endswith("/chat/completions"):
+                    return self._send(404, {"error": {"message": f"Unknown path {self.path}"}})
+                request = json.loads(body)
+                try:
+                    response, latency = server.complete(request, self.headers.get("Authorization", ""))
+                except urllib.error.HTTPError as e:
+                    return self._send(e.code, json.loads(e.read() or b"{}"))
+                except InjectedFault as e:
+                    return self._send(e.status, e.payload)
+                if request.get("stream"):
+                    return self._stream(response, latency)
+                time.sleep(latency)
+                self._send(200, response)
+
+            def _stream(self, response: dict, latency: float):
+                '''
+                sends the response as server sent events, the first chunk after FIRST_TOKEN_SHARE of the latency
+                and the rest spread evenly over the remaining time
+                '''
+                content = response["choices"][0]["message"]["content"]
+                pieces = [content[i:i + STREAM_CHUNK_CHARS] for i in range(0, len(content), STREAM_CHUNK_CHARS)]
+                time.sleep(latency * FIRST_TOKEN_SHARE)
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                self.close_connection = True
+
+                interval = latency * (1 - FIRST_TOKEN_SHARE) / max(1, len(pieces))
+                for i, piece in enumerate(pieces + [None]):
+                    chunk = {
+                        "id": response["id"], "object": "chat.completion.chunk", "created": response["created"],
+                        "model": response["model"],
+                        "choices": [{"index": 0, "delta": {"content": piece} if piece is not None else {},
+                                     "finish_reason": None if piece is not None else "stop"}],
+                    }
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                    self.wfile.flush()
+                    if piece is not None and i < len(pieces) - 1:
+                        time.sleep(interval)
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.wfile.flush()
+
+            def _send(self, status: int, payload: dict):
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
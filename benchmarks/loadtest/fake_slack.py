@@ -0,0 +1,202 @@
+'''
+a local stand-in for slack: a Web API server answering auth.test, chat.postMessage and chat.update, and a source of
+app_mention events in the shape slack delivers them over socket mode.
+
+Replies are matched to the mention they answer by thread, in order, which is how the bot processes them.
+Streamed replies are posted as a placeholder and updated in place, they are final once they no longer end with
+the typing indicator.
+'''
+
+import itertools
+import json
+import threading
+import time
+import urllib.parse
+import uuid
+from collections import defaultdict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Deque, Dict, List, Optional, Tuple
+
+from core.slack_reply import TYPING_INDICATOR
+
+BOT_USER_ID = "UFAKEBOT"
+TEAM_ID = "TFAKE"
+
+
+class SlackReply:
+    __slots__ = ("action", "text", "sent_at", "first_feedback_at", "replied_at", "updates")
+
+    def __init__(self, action: str, sent_at: float):
+        self.action = action
+        self.sent_at = sent_at
+        self.text: Optional[str] = None
+        # first message posted in reply, i.e the placeholder of a streamed reply
+        self.first_feedback_at: Optional[float] = None
+        # final text posted or updated
+        self.replied_at: Optional[float] = None
+        self.updates = 0
+
+    @property
+    def latency(self) -> float:
+        return self.replied_at - self.sent_at
+
+    @property
+    def first_feedback_latency(self) -> float:
+        return self.first_feedback_at - self.sent_at
+
+
+class FakeSlack:
+    '''
+    Usage:
+        with FakeSlack() as slack:
+            os.environ["SLACK_API_URL"] = slack.api_url
+            body = slack.mention(user_id, channel_id, thread_ts, text, action)
+            ...
+            slack.wait_for_replies(timeout)
+    '''
+
+    def __init__(self):
+        self.posted = 0
+        self.updated = 0
+        self.unmatched = 0
+        self.replies: List[SlackReply] = []
+        # thread_ts -> mentions waiting for a reply, oldest first
+        self._waiting: Dict[str, Deque[SlackReply]] = defaultdict(deque)
+        # ts of a posted message -> the reply it is
+        self._posted: Dict[str, SlackReply] = {}
+        self._ts = itertools.count(1)
+        self._lock = threading.Lock()
+        self._all_replied = threading.Condition(self._lock)
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler_class())
+        self._server.daemon_threads = True
+
+    @property
+    def api_url(self) -> str:
+        host, port = self._server.server_address
+        return f"http://{host}:{port}/api/"
+
+    def start(self) -> "FakeSlack":
+        threading.Thread(target=self._server.serve_forever, name="fake-slack", daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "FakeSlack":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def mention(self, user_id: str, channel_id: str, thread_ts: str, text: str, action: str) -> dict:
+        '''
+        returns the socket mode payload of an app_mention event, and starts waiting for its reply
+        '''
+        ts = self._next_ts()
+        reply = SlackReply(action, time.perf_counter())
+        with self._lock:
+            self.replies.append(reply)
+            self._waiting[thread_ts or ts].append(reply)
+        event = {
+            "type": "app_mention",
+            "user": user_id,
+            "text": f"<@{BOT_USER_ID}> {text}",
+            "ts": ts,
+            "channel": channel_id,
+            "event_ts": ts,
+            "client_msg_id": str(uuid.uuid4()),
+        }
+        if thread_ts:
+            event["thread_ts"] = thread_ts
+        return {
+            "token": "fake",
+            "team_id": TEAM_ID,
+            "api_app_id": "AFAKE",
+            "event": event,
+            "type": "event_callback",
+            "event_id": f"Ev{uuid.uuid4().hex[:12].upper()}",
+            "event_time": int(time.time()),
+            "authorizations": [{"team_id": TEAM_ID, "user_id": BOT_USER_ID, "is_bot": True}],
+        }
+
+    def _next_ts(self) -> str:
+        # unique, unlike the current time when messages are posted from many threads
+        return f"{int(time.time())}.{next(self._ts):06d}"
+
+    def wait_for_replies(self, timeout: float) -> bool:
+        with self._all_replied:
+            return self._all_replied.wait_for(lambda: all(reply.replied_at for reply in self.replies), timeout)
+
+    def _on_post_message(self, params: Dict[str, str]) -> Tuple[str, str]:
+        thread_ts = params.get("thread_ts", "")
+        ts = self._next_ts()
+        now = time.perf_counter()
+        with self._lock:
+            self.posted += 1
+            waiting = self._waiting.get(thread_ts)
+            if waiting:
+                reply = waiting.popleft()
+                if not waiting:
+                    del self._waiting[thread_ts]
+                reply.first_feedback_at = now
+                self._posted[ts] = reply
+                self._on_text(reply, params.get("text", ""), now)
+            else:
+                self.unmatched += 1
+        return params.get("channel", ""), ts
+
+    def _on_update(self, params: Dict[str, str]):
+        now = time.perf_counter()
+        with self._lock:
+            self.updated += 1
+            reply = self._posted.get(params.get("ts", ""))
+            if reply is not None:
+                reply.updates += 1
+                self._on_text(reply, params.get("text", ""), now)
+
+    def _on_text(self, reply: SlackReply, text: str, now: float):
+        reply.text = text
+        if not text.endswith(TYPING_INDICATOR):
+            reply.replied_at = now
+            self._all_replied.notify_all()
+
+    def _handler_class(self):
+        slack = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0))).decode()
+                if self.headers.get("Content-Type", "").startswith("application/json"):
+                    params = json.loads(body or "{}")
+                else:
+                    params = dict(urllib.parse.parse_qsl(body))
+                method = self.path.rsplit("/", 1)[-1]
+
+                if method == "auth.test":
+                    return self._send({"ok": True, "url": "https://fake.slack.com/", "team": "fake", "user": "mrgorlomi",
+                                       "team_id": TEAM_ID, "user_id": BOT_USER_ID, "bot_id": "BFAKE"})
+                if method == "chat.postMessage":
+                    channel, ts = slack._on_post_message(params)
+                    return self._send({"ok": True, "channel": channel, "ts": ts, "message": {"text": params.get("text", "")}})
+                if method == "chat.update":
+                    slack._on_update(params)
+                    return self._send({"ok": True, "channel": params.get("channel", ""), "ts": params.get("ts", ""),
+                                       "text": params.get("text", "")})
+                self._send({"ok": False, "error": "unknown_method"})
+
+            def _send(self, payload: dict):
+                data = json.dumps(payload).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
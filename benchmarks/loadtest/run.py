@@ -0,0 +1,226 @@
+'''
+Offline load test of the slack bot: a fake OpenAI server (benchmarks/loadtest/fake_openai.py) and a fake slack
+(benchmarks/loadtest/fake_slack.py) stand in for the real services, no tokens are spent.
+
+Mentions of a create/join/list mix (benchmarks/loadtest/scenario.py) are sent at a target rate, either
+    - as slack events dispatched to slackbot.py's bolt app (--target slack), i.e through handle_mention, the
+      worker pool and say(), latency is measured until the reply is posted to the fake slack, or
+    - straight to OpenAILLM.get_conversation (--target llm)
+
+and it reports p50/p95/p99 latency, throughput, DB lock errors and LLM token counts. For slack, the time to first
+feedback is reported as well, which is the placeholder of a streamed reply with --stream.
+
+--error-rate, --invalid-json-rate and --outage inject faults in the fake OpenAI server, to see how the retries,
+JSON re-prompts and circuit breaker of llm/resilience.py hold up.
+
+--mode record proxies the LLM calls to the real OpenAI API (needs a real OPENAI_API_KEY) and saves them in a
+cassette, --mode replay serves them back with their recorded latency, so that runs are reproducible.
+'''
+
+import argparse
+import http.client
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from typing import List
+
+from benchmarks.db_overhead import write_participants_csv
+from benchmarks.loadtest.fake_openai import MODES, OPENAI_API_BASE, FakeOpenAIServer, parse_outage
+from benchmarks.loadtest.fake_slack import BOT_USER_ID, FakeSlack
+from benchmarks.loadtest.scenario import Scenario, parse_mix
+from core.tracing import FileSpanExporter, tracer
+from scripts.trace_summary import load_spans, summarise
+
+ERROR_REPLIES = ("Oopsiedoodle", "Some error occured")
+
+
+class LockErrorCounter(logging.Handler):
+    '''
+    counts logged "database is locked" errors, HackathonSQLite turns them into a generic HackathonError
+    '''
+
+    def __init__(self):
+        super().__init__(level=logging.ERROR)
+        self.count = 0
+
+    def emit(self, record: logging.LogRecord):
+        text = record.getMessage() + (logging.Formatter().formatException(record.exc_info) if record.exc_info else "")
+        if "database is locked" in text or "database table is locked" in text:
+            self.count += 1
+
+
+def percentile(values: List[float], p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] if values else 0.0
+
+
+def format_percentiles(latencies: List[float]) -> str:
+    return (f"p50 {percentile(latencies, 0.50) * 1000:.0f} ms, p95 {percentile(latencies, 0.95) * 1000:.0f} ms, "
+            f"p99 {percentile(latencies, 0.99) * 1000:.0f} ms, max {max(latencies, default=0) * 1000:.0f} ms")
+
+
+def send_at_rate(rate: float, total: int, rng: random.Random, send):
+    '''
+    calls send(i) total times with poisson arrivals at the given rate per second
+    '''
+    next_at = time.perf_counter()
+    for i in range(total):
+        next_at += rng.expovariate(rate)
+        delay = next_at - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        send(i)
+
+
+def run_slack(args, scenario: Scenario, rng: random.Random, slack: FakeSlack) -> dict:
+    os.environ["SLACK_API_URL"] = slack.api_url
+    os.environ["SLACK_BOT_TOKEN"] = "xoxb-loadtest"
+    os.environ["SLACK_BOT_USER_ID"] = BOT_USER_ID
+    from slack_bolt.request import BoltRequest
+    import slackbot
+    http.client.HTTPConnection.debuglevel = 0
+
+    threads = {}  # user -> thread_ts of their conversation with the bot
+
+    def send(i):
+        user_id = f"user{rng.randrange(args.users)}"
+        action, text = scenario.next_message()
+        body = slack.mention(user_id, f"C{user_id}", threads.get(user_id), text, action)
+        threads.setdefault(user_id, body["event"]["ts"])
+        slackbot.app.dispatch(BoltRequest(body=body, mode="socket_mode"))
+
+    start = time.perf_counter()
+    send_at_rate(args.rate, args.mentions, rng, send)
+    if not slack.wait_for_replies(args.timeout):
+        print(f"timed out waiting for replies after {args.timeout}s")
+    results = [(reply.action, reply.text, reply.latency) for reply in slack.replies if reply.replied_at]
+    first_feedback = [reply.first_feedback_latency for reply in slack.replies if reply.first_feedback_at]
+    end = max((reply.replied_at for reply in slack.replies if reply.replied_at), default=time.perf_counter())
+    return {"results": results, "first_feedback": first_feedback, "elapsed": end - start,
+            "pool": slackbot.mention_workers.stats(), "duplicates": slackbot.slack_events.stats()["duplicates_dropped"],
+            "slack_updates": slack.updated, "llm_caller": slackbot.llm.llm_caller.stats()}
+
+
+def run_llm(args, scenario: Scenario, rng: random.Random) -> dict:
+    from core.worker_pool import BoundedWorkerPool
+    from llm.conversation_store import ConversationStore
+    from llm.openai import OpenAILLM
+
+    llm = OpenAILLM()
+    store = ConversationStore.from_env(llm.get_conversation_chain, llm.get_hackathon_database_connection())
+    pool = BoundedWorkerPool(max_workers=args.workers, max_queue_size=args.mentions, name="loadtest")
+    results = []
+    results_lock = threading.Lock()
+
+    def process(user_id: str, action: str, text: str, sent_at: float):
+        with store.conversation(user_id) as chain:
+            reply, _ = llm.get_conversation(chain=chain, prompt=text, username=user_id, conversation_id=user_id)
+        with results_lock:
+            results.append((action, reply, time.perf_counter() - sent_at))
+
+    def send(i):
+        user_id = f"user{rng.randrange(args.users)}"
+        action, text = scenario.next_message()
+        pool.submit(process, user_id, action, text, time.perf_counter(), key=user_id)
+
+    start = time.perf_counter()
+    send_at_rate(args.rate, args.mentions, rng, send)
+    pool.close()
+    return {"results": results, "elapsed": time.perf_counter() - start, "pool": pool.stats(), "duplicates": 0,
+            "llm_caller": llm.llm_caller.stats()}
+
+
+def report(args, run: dict, llm_stats: dict, lock_errors: int):
+    results = run["results"]
+    latencies = [latency for _, _, latency in results]
+    errors = sum(any(error in (text or "") for error in ERROR_REPLIES) for _, text, _ in results)
+    print(f"target={args.target} mode={args.mode} mentions={args.mentions} rate={args.rate}/s users={args.users} "
+          f"llm latency={args.llm_latency} streaming={args.stream}")
+    print(f"replied: {len(results)}/{args.mentions}, error replies: {errors}, DB lock errors: {lock_errors}")
+    print(f"throughput: {len(results) / run['elapsed']:.1f} replies/s over {run['elapsed']:.1f}s")
+    print(f"latency: {format_percentiles(latencies)}")
+    if "first_feedback" in run:
+        # until the user sees anything in the thread, the placeholder of a streamed reply
+        print(f"time to first feedback: {format_percentiles(run['first_feedback'])}, {run['slack_updates']} message updates")
+    print(f"LLM: {llm_stats['llm_requests']} requests, {llm_stats['prompt_tokens']} prompt tokens, "
+          f"{llm_stats['completion_tokens']} completion tokens, {llm_stats['replay_misses']} replay misses")
+    print(f"LLM faults injected: {llm_stats['injected_errors']} errors, {llm_stats['invalid_json']} invalid JSON responses")
+    print(f"LLM caller: {run['llm_caller']}")
+    print(f"worker pool: {run['pool']}, duplicates dropped: {run['duplicates']}")
+    print("actions: " + ", ".join(f"{action} {count}" for action, count in Counter(a for a, _, _ in results).most_common()))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--target", choices=("slack", "llm"), default="slack")
+    parser.add_argument("--mentions", type=int, default=500)
+    parser.add_argument("--rate", type=float, default=20, help="mentions per second")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=10, help="worker pool size (WORKER_POOL_SIZE)")
+    parser.add_argument("--llm-latency", default="lognormal:1.0,0.4",
+                        help="fixed:S, uniform:A,B, normal:MEAN,STD or lognormal:MEDIAN,SIGMA in seconds")
+    parser.add_argument("--mix", help="action weights, e.g create_team=0.2,join_team=0.3,list_teams=0.5")
+    parser.add_argument("--mode", choices=MODES, default="fake")
+    parser.add_argument("--cassette", help="recorded LLM responses, for --mode record/replay")
+    parser.add_argument("--upstream", default=OPENAI_API_BASE, help="API recorded in --mode record")
+    parser.add_argument("--stream", action="store_true", help="streamed replies (STREAM_REPLIES=1)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of LLM requests failing with HTTP 503")
+    parser.add_argument("--invalid-json-rate", type=float, default=0.0, help="share of LLM responses which are not JSON")
+    parser.add_argument("--outage", help="START,END seconds after the start during which every LLM request fails")
+    parser.add_argument("--trace", help="export spans to this JSON lines file and summarise them")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--timeout", type=float, default=300, help="max seconds to wait for the last replies")
+    args = parser.parse_args()
+    cassette = os.path.abspath(args.cassette) if args.cassette else None
+    if args.trace:
+        args.trace = os.path.abspath(args.trace)
+        tracer.configure(FileSpanExporter(args.trace))
+
+    # the bot is imported from the temporary directory, so that it uses a fresh data/ directory
+    sys.path.insert(0, os.getcwd())
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    os.environ["WORKER_POOL_SIZE"] = str(args.workers)
+    os.environ["WORKER_QUEUE_SIZE"] = str(args.mentions)
+    os.environ["STREAM_REPLIES"] = "1" if args.stream else "0"
+    lock_errors = LockErrorCounter()
+    logging.getLogger().addHandler(lock_errors)
+
+    with tempfile.TemporaryDirectory() as tmpdir, \
+            FakeOpenAIServer(args.llm_latency, args.mode, cassette, args.upstream, seed=args.seed, error_rate=args.error_rate,
+                             invalid_json_rate=args.invalid_json_rate, outage=parse_outage(args.outage)) as fake_openai, \
+            FakeSlack() as slack:
+        os.makedirs(os.path.join(tmpdir, "data"))
+        write_participants_csv(os.path.join(tmpdir, "data", "participants.csv"), args.users)
+        os.chdir(tmpdir)
+
+        os.environ["OPENAI_API_BASE"] = fake_openai.api_base
+        if args.mode != "record":
+            os.environ["OPENAI_API_KEY"] = "sk-loadtest"
+
+        scenario = Scenario(parse_mix(args.mix) if args.mix else None, seed=args.seed)
+        rng = random.Random(args.seed)
+        run = run_slack(args, scenario, rng, slack) if args.target == "slack" else run_llm(args, scenario, rng)
+        report(args, run, fake_openai.stats(), lock_errors.count)
+
+    if args.trace:
+        tracer.close()
+        print()
+        summarise(load_spans(args.trace))
+
+
+'''
+USAGE
+    python -m benchmarks.loadtest.run --target slack --mentions 500 --rate 20 --llm-latency lognormal:1.0,0.4
+    python -m benchmarks.loadtest.run --target slack --stream --llm-latency lognormal:3.0,0.4
+    python -m benchmarks.loadtest.run --target slack --mentions 200 --trace /tmp/traces.jsonl
+    python -m benchmarks.loadtest.run --target llm --error-rate 0.2 --invalid-json-rate 0.1
+    LLM_CIRCUIT_RESET_SECONDS=5 python -m benchmarks.loadtest.run --target llm --mentions 400 --outage 5,12
+    LLM_HEDGE_PERCENTILE=95 python -m benchmarks.loadtest.run --target llm --llm-latency lognormal:1.0,0.8
+    python -m benchmarks.loadtest.run --target llm --mode record --cassette data/llm_cassette.jsonl
+    python -m benchmarks.loadtest.run --target llm --mode replay --cassette data/llm_cassette.jsonl
+'''
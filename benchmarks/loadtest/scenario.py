@@ -0,0 +1,93 @@
+'''
+the simulated workload: which messages the fake slack users send, and the intent the fake LLM answers them with
+'''
+
+import random
+import re
+from typing import Dict, List, Optional, Tuple
+
+# action -> message the user sends, {team} is replaced with a team name
+MESSAGE_TEMPLATES: Dict[str, str] = {
+    "create_team": "hey, can you create a team called {team} for us",
+    "join_team": "please add me to the team {team}",
+    "list_teams": "which teams have signed up so far?",
+    "list_my_team": "who else is on my team right now?",
+    "get_unassigned_participants": "can you suggest people who could join us",
+    "leave_current_team": "i think i want to leave my team",
+    "clarify": "when is the hackathon happening?",
+}
+
+# share of messages per action
+DEFAULT_MIX: Dict[str, float] = {
+    "create_team": 0.15,
+    "join_team": 0.25,
+    "list_teams": 0.25,
+    "list_my_team": 0.15,
+    "get_unassigned_participants": 0.08,
+    "leave_current_team": 0.04,
+    "clarify": 0.08,
+}
+
+TEAM_WORDS = ["spaghetti", "lambda", "token", "null", "byte", "prompt", "pasta", "neural", "vector", "async",
+              "coders", "llamas", "rings", "pointers", "wizards", "ninjas", "avengers", "gang", "force", "squad"]
+
+_USER_SAID = re.compile(r"The user has just said: (.*)")
+# the bot only strips its user id from the mention, "<@>" is left in front of the text
+_MENTION = re.compile(r"^<@\w*>\s*")
+_PATTERNS: List[Tuple[str, "re.Pattern"]] = [
+    (action, re.compile(re.escape(template).replace(re.escape("{team}"), "(?P<team>.+)")))
+    for action, template in MESSAGE_TEMPLATES.items()
+]
+
+
+def parse_mix(mix: str) -> Dict[str, float]:
+    '''
+    parses "create_team=0.2,join_team=0.3,..." into action weights
+    '''
+    weights = {}
+    for part in mix.split(","):
+        action, weight = part.split("=")
+        if action not in MESSAGE_TEMPLATES:
+            raise ValueError(f"Unknown action {action}, should be one of {list(MESSAGE_TEMPLATES)}")
+        weights[action] = float(weight)
+    return weights
+
+
+class Scenario:
+    '''
+    generates the messages of the load test, deterministic for a given seed so that runs can be replayed
+    '''
+
+    def __init__(self, mix: Dict[str, float] = None, seed: int = 42):
+        self.mix = mix or DEFAULT_MIX
+        self.random = random.Random(seed)
+        self.team_names: List[str] = []
+
+    def next_message(self) -> Tuple[str, str]:
+        '''
+        returns (action, text) of the next message
+        '''
+        action = self.random.choices(list(self.mix), weights=list(self.mix.values()))[0]
+        if action == "join_team" and not self.team_names:
+            action = "create_team"
+        if action == "create_team":
+            team = f"{self.random.choice(TEAM_WORDS)} {self.random.choice(TEAM_WORDS)} {len(self.team_names)}"
+            self.team_names.append(team)
+        elif action == "join_team":
+            team = self.random.choice(self.team_names)
+        else:
+            team = ""
+        return action, MESSAGE_TEMPLATES[action].format(team=team)
+
+
+def intent_for(prompt: str) -> Tuple[str, Optional[str]]:
+    '''
+    returns the (action, team_name) the LLM is expected to answer for a prompt sent by OpenAILLM
+    '''
+    said = _USER_SAID.findall(prompt)
+    text = _MENTION.sub("", said[-1].strip() if said else prompt.strip())
+    for action, pattern in _PATTERNS:
+        match = pattern.fullmatch(text)
+        if match:
+            return action, match.groupdict().get("team")
+    return "clarify", None
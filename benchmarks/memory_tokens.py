@@ -0,0 +1,101 @@
+'''
+This script reports the prompt tokens sent to the LLM on every turn of a long thread, for each conversation
+memory mode (see llm/memory.py). Tokens are counted with tiktoken for the conversation model.
+
+Turns are canned and saved straight into the memory, the LLM is never called. The summary mode needs the LLM
+to compact older turns, so it's left out unless --with-summary is passed (and a real OPENAI_API_KEY is set).
+
+Exits with status 1 if a token_window prompt is over --max-tokens plus its overhead, or if its prompts keep growing
+once the window is full, i.e by more than one exchange over the prompt of the turn it filled. The overhead is the
+prompt without history and the "User: "/"Bot: " prefixes of the history, the memory only counts the messages.
+'''
+
+import argparse
+import os
+import sys
+import tempfile
+
+from benchmarks.db_overhead import write_participants_csv
+from benchmarks.slack_handlers import BenchmarkLLM
+from core.sqlite.hackathon_sqlite import HackathonSQLite
+
+USER_MESSAGE = "Turn {turn}: we are the spaghetti coders, can you show me who is in my team and what our idea is?"
+BOT_MESSAGE = '{{"action": "list_my_team", "team_name": "", "message": "Mamma mia, here is your team for turn {turn}!"}}'
+
+
+def prompt_tokens_per_turn(llm: BenchmarkLLM, turns: int) -> dict:
+    '''
+    the prompt tokens of every turn, the most tokens of overhead and of an exchange, and the first turn whose
+    history was pruned (None if the history was never pruned)
+    '''
+    chain = llm.get_conversation_chain()
+    tokens = []
+    overhead, exchange, window_full_at = 0, 0, None
+    for turn in range(turns):
+        user_input = USER_MESSAGE.format(turn=turn)
+        bot_message = BOT_MESSAGE.format(turn=turn)
+        history = chain.memory.load_memory_variables({})["history"]
+        if window_full_at is None and len(chain.memory.chat_memory.messages) < 2 * turn:
+            window_full_at = turn
+        tokens.append(chain.llm.get_num_tokens(chain.prompt.format(history=history, input=user_input)))
+        prefixes = chain.llm.get_num_tokens(history) - chain.llm.get_num_tokens_from_messages(chain.memory.chat_memory.messages)
+        overhead = max(overhead, chain.llm.get_num_tokens(chain.prompt.format(history="", input=user_input)) + max(0, prefixes))
+        exchange = max(exchange, chain.llm.get_num_tokens(f"User: {user_input}\nBot: {bot_message}"))
+        chain.memory.save_context({"input": user_input}, {"response": bot_message})
+    return {"tokens": tokens, "overhead": overhead, "exchange": exchange, "window_full_at": window_full_at}
+
+
+def token_window_regressions(result: dict, max_tokens: int) -> list:
+    tokens = result["tokens"]
+    regressions = []
+    if max(tokens) > max_tokens + result["overhead"]:
+        regressions.append(f"max {max(tokens)} prompt tokens per turn, over {max_tokens} + {result['overhead']} "
+                           f"tokens of overhead")
+    window_full_at = result["window_full_at"]
+    if window_full_at is not None and max(tokens[window_full_at:]) > tokens[window_full_at] + result["exchange"]:
+        regressions.append(f"prompts grew from {tokens[window_full_at]} to {max(tokens[window_full_at:])} tokens "
+                           f"after the window filled at turn {window_full_at + 1}")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--turns", type=int, default=50)
+    parser.add_argument("--max-tokens", type=int, default=1500, help="CONVERSATION_MEMORY_MAX_TOKENS")
+    parser.add_argument("--with-summary", action="store_true", help="also run the summary mode, calls the LLM")
+    args = parser.parse_args()
+
+    modes = ["buffer", "token_window"] + (["summary"] if args.with_summary else [])
+    os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        db_filepath = os.path.join(tmpdir, "hackathon_data.db")
+        csv_filepath = os.path.join(tmpdir, "participants.csv")
+        write_participants_csv(csv_filepath, 10)
+        db = HackathonSQLite(db_filepath, csv_filepath)
+
+        results = {}
+        for mode in modes:
+            llm = BenchmarkLLM(db, memory_mode=mode, memory_max_tokens=args.max_tokens)
+            results[mode] = prompt_tokens_per_turn(llm, args.turns)
+        db.close()
+
+    print(f"turns={args.turns} memory max tokens={args.max_tokens}")
+    print("turn " + "".join(f"{mode:>14}" for mode in modes))
+    for turn in range(args.turns):
+        if turn % 5 == 0 or turn == args.turns - 1:
+            print(f"{turn + 1:>4} " + "".join(f"{results[mode]['tokens'][turn]:>14}" for mode in modes))
+    for mode in modes:
+        tokens = results[mode]["tokens"]
+        print(f"{mode:>12}: {sum(tokens)} prompt tokens in total, {max(tokens)} max per turn")
+
+    regressions = token_window_regressions(results["token_window"], args.max_tokens)
+    if regressions:
+        print(f"token_window: {', '.join(regressions)}")
+        sys.exit(1)
+    print(f"token_window prompts stay within {args.max_tokens} tokens of history")
+
+
+'''
+USAGE
+    python -m benchmarks.memory_tokens --turns 50 --max-tokens 1500
+'''
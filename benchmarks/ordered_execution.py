@@ -0,0 +1,117 @@
+'''
+This script stress tests the keyed BoundedWorkerPool used by slackbot.py: messages of many conversations are
+submitted interleaved from several producer threads, each one handled through the ConversationStore with a
+fixed stub LLM latency.
+
+It checks that every conversation's history (in memory and persisted in SQLite) is in the order its messages
+were submitted, and that no conversation ever had two messages processed at the same time. The same load is
+also run without keys, i.e the old behaviour, to show the ordering violations and compare throughput.
+'''
+
+import argparse
+import os
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+from benchmarks.db_overhead import write_participants_csv
+from benchmarks.slack_handlers import BenchmarkLLM
+from core.sqlite.hackathon_sqlite import HackathonSQLite
+from core.worker_pool import BoundedWorkerPool
+from llm.conversation_store import ConversationStore
+
+
+def run(llm: BenchmarkLLM, keyed: bool, conversations: int, messages: int, producers: int, workers: int, latency: float) -> dict:
+    store = ConversationStore(llm.get_conversation_chain, llm.db)
+    pool = BoundedWorkerPool(max_workers=workers, max_queue_size=conversations * messages, name="stress")
+    prefix = "keyed" if keyed else "unkeyed"
+
+    in_flight = defaultdict(int)
+    overlaps = 0
+    lock = threading.Lock()
+
+    def process(conversation_id: str, seq: int):
+        nonlocal overlaps
+        with lock:
+            in_flight[conversation_id] += 1
+            overlaps += in_flight[conversation_id] > 1
+        try:
+            with store.conversation(conversation_id) as chain:
+                time.sleep(latency)  # stub LLM call
+                chain.memory.save_context({"input": f"message {seq}"}, {"response": f"reply {seq}"})
+        finally:
+            with lock:
+                in_flight[conversation_id] -= 1
+
+    def produce(producer: int):
+        # each conversation belongs to one producer, which submits its messages in order, interleaved with the
+        # messages of its other conversations
+        own = [f"{prefix}:C{i}" for i in range(producer, conversations, producers)]
+        for seq in range(messages):
+            for conversation_id in own:
+                pool.submit(process, conversation_id, seq, key=conversation_id if keyed else None)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=produce, args=(i,)) for i in range(producers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    pool.close()
+    elapsed = time.perf_counter() - start
+
+    expected = [f"message {seq}" for seq in range(messages)]
+    out_of_order = 0
+    for i in range(conversations):
+        conversation_id = f"{prefix}:C{i}"
+        with store.conversation(conversation_id) as chain:
+            in_memory = [message.content for message in chain.memory.chat_memory.messages if message.type == "human"]
+        persisted = [content for message_type, content in llm.db.get_conversation_messages(conversation_id) if message_type == "human"]
+        out_of_order += in_memory != expected or persisted != expected
+
+    return {
+        "elapsed": elapsed,
+        "messages_per_second": conversations * messages / elapsed,
+        "overlaps": overlaps,
+        "out_of_order": out_of_order,
+        "stats": pool.stats(),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--conversations", type=int, default=50)
+    parser.add_argument("--messages", type=int, default=10, help="messages per conversation")
+    parser.add_argument("--producers", type=int, default=8)
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--llm-latency", type=float, default=0.02, help="stub LLM latency in seconds")
+    args = parser.parse_args()
+
+    os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        db_filepath = os.path.join(tmpdir, "hackathon_data.db")
+        csv_filepath = os.path.join(tmpdir, "participants.csv")
+        write_participants_csv(csv_filepath, 10)
+        llm = BenchmarkLLM(HackathonSQLite(db_filepath, csv_filepath))
+
+        print(f"conversations={args.conversations} messages each={args.messages} producers={args.producers} "
+              f"workers={args.workers} stub LLM latency={args.llm_latency}s")
+        results = {}
+        for keyed in (False, True):
+            result = results[keyed] = run(llm, keyed, args.conversations, args.messages, args.producers, args.workers, args.llm_latency)
+            print(f"{'keyed' if keyed else 'unkeyed':>8}: {result['messages_per_second']:.0f} messages/s, "
+                  f"{result['overlaps']} concurrent turns in one conversation, "
+                  f"{result['out_of_order']}/{args.conversations} conversations out of order, "
+                  f"queue wait p95 {result['stats']['wait_ms_p95']} ms")
+        llm.db.close()
+
+    assert results[True]["overlaps"] == 0, "a conversation had two messages processed at the same time"
+    assert results[True]["out_of_order"] == 0, "a conversation history is out of order"
+    print("keyed: all conversation histories are in submission order")
+
+
+'''
+USAGE
+    python -m benchmarks.ordered_execution --conversations 50 --messages 10 --workers 16
+'''
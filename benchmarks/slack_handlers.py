@@ -0,0 +1,115 @@
+'''
+This script compares how many concurrent mentions per second the threaded slack handler (slackbot.py) and the
+asyncio handler (slackbot_async.py) get through, with the LLM replaced by a local stub with fixed latency.
+
+Both run the same OpenAILLM conversation code against a temporary DB. The threaded handler is capped by
+slack_bolt's listener thread pool (10 workers by default), the async one by MAX_CONCURRENT_MENTIONS.
+'''
+
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain.chains import ConversationChain
+from langchain.chat_models.base import BaseChatModel
+from langchain.schema import AIMessage, ChatGeneration, ChatResult
+
+from benchmarks.db_overhead import write_participants_csv
+from core.sqlite.hackathon_sqlite import HackathonSQLite
+from llm.openai import OpenAILLM
+
+STUB_RESPONSE = json.dumps({"action": "list_teams", "team_name": "", "message": "Here are the teams"})
+
+
+class StubChatModel(BaseChatModel):
+    '''
+    stands in for ChatOpenAI, answers after a fixed latency
+    '''
+    latency: float = 1.0
+    model_name: str = "stub"
+
+    @property
+    def _llm_type(self) -> str:
+        return "stub"
+
+    def _result(self) -> ChatResult:
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=STUB_RESPONSE))],
+                          llm_output={"token_usage": {"prompt_tokens": 100, "completion_tokens": 20}})
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        time.sleep(self.latency)
+        return self._result()
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        await asyncio.sleep(self.latency)
+        return self._result()
+
+
+def stub_chain(latency: float) -> ConversationChain:
+    return ConversationChain(llm=StubChatModel(latency=latency))
+
+
+class BenchmarkLLM(OpenAILLM):
+    def __init__(self, db: HackathonSQLite, **kwargs):
+        super().__init__(**kwargs)
+        self.db = db
+        # "list teams" would be answered locally, every mention should wait for the stub LLM
+        self.intent_classifier = None
+
+    def get_hackathon_database_connection(self) -> HackathonSQLite:
+        return self.db
+
+
+def run_threaded(llm: OpenAILLM, chain: ConversationChain, mentions: int, workers: int) -> float:
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(llm.get_conversation, chain, "list teams", f"user{i}") for i in range(mentions)]
+        for future in futures:
+            future.result()
+    return time.perf_counter() - start
+
+
+async def run_async(llm: OpenAILLM, chain: ConversationChain, mentions: int, concurrency: int) -> float:
+    slots = asyncio.Semaphore(concurrency)
+
+    async def handle(i):
+        async with slots:
+            return await llm.aget_conversation(chain, "list teams", f"user{i}")
+
+    start = time.perf_counter()
+    await asyncio.gather(*(handle(i) for i in range(mentions)))
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mentions", type=int, default=200)
+    parser.add_argument("--llm-latency", type=float, default=1.0, help="stub LLM latency in seconds")
+    parser.add_argument("--threads", type=int, default=10, help="slack_bolt listener thread pool size")
+    parser.add_argument("--concurrency", type=int, default=50, help="MAX_CONCURRENT_MENTIONS of the async handler")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        db_filepath = os.path.join(tmpdir, "hackathon_data.db")
+        csv_filepath = os.path.join(tmpdir, "participants.csv")
+        write_participants_csv(csv_filepath, args.mentions)
+        llm = BenchmarkLLM(HackathonSQLite(db_filepath, csv_filepath))
+        chain = stub_chain(args.llm_latency)
+
+        threaded = run_threaded(llm, chain, args.mentions, args.threads)
+        concurrent = asyncio.run(run_async(llm, chain, args.mentions, args.concurrency))
+        llm.db.close()
+
+    print(f"mentions={args.mentions} stub LLM latency={args.llm_latency}s")
+    print(f"threaded ({args.threads} threads): {args.mentions / threaded:.1f} mentions/s, {threaded:.2f}s total")
+    print(f"asyncio (limit {args.concurrency}): {args.mentions / concurrent:.1f} mentions/s, {concurrent:.2f}s total")
+
+
+'''
+USAGE
+    python -m benchmarks.slack_handlers --mentions 200 --llm-latency 1.0 --concurrency 50
+'''
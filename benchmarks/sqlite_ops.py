@@ -0,0 +1,217 @@
+'''
+This script times every public HackathonSQLite operation against synthetic databases of increasing size, plus
+the constructor (cold: migrations and participants import into a new DB, warm: reopening a seeded DB).
+
+For every scale, participants are loaded from a generated participants.csv, then teams (captain + 2 members
+each, at most --max-teams) and one idea per team are seeded directly in SQL. The rest of the participants are
+unassigned. Cached reads are timed both served from the read cache and recomputed (cache invalidated first).
+
+Results are written as JSON with --output, and --compare prints the ratio to a previous results file, so that
+regressions between commits can be spotted. With --max-regression the script exits with status 1 if any
+operation got slower than that ratio.
+'''
+
+import argparse
+import json
+import logging
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from typing import Callable, Dict, List
+
+from benchmarks.db_overhead import write_participants_csv
+from core.hackathon_base import HackathonError
+from core.sqlite.hackathon_sqlite import HackathonSQLite
+
+TEAM_WORDS = ["rockets", "llamas", "pointers", "wizards", "ninjas", "avengers", "coders", "vectors"]
+MEMBERS_PER_TEAM = 3
+
+
+def team_name(i: int) -> str:
+    return f"Team {i:05d} {TEAM_WORDS[i % len(TEAM_WORDS)]}"
+
+
+def typo(name: str) -> str:
+    '''
+    the name with two letters of its last word swapped, e.g "Team 00012 rockets" -> "Team 00012 rokcets"
+    '''
+    i = len(name) - 5
+    return name[:i] + name[i + 1] + name[i] + name[i + 2:]
+
+
+def seed(db_filepath: str, num_teams: int):
+    '''
+    team i has user{3i} as captain and user{3i+1}, user{3i+2} as members, and one idea
+    '''
+    conn = sqlite3.connect(db_filepath)
+    with conn:
+        team_ids = [str(uuid.uuid4()) for _ in range(num_teams)]
+        conn.executemany("INSERT INTO teams (team_id, team_name, captain_username) VALUES (?, ?, ?)",
+                         [(team_ids[i], team_name(i), f"user{MEMBERS_PER_TEAM * i}") for i in range(num_teams)])
+        conn.executemany("UPDATE participants SET team_id = ? WHERE username = ?",
+                         [(team_ids[i], f"user{MEMBERS_PER_TEAM * i + j}") for i in range(num_teams) for j in range(MEMBERS_PER_TEAM)])
+        conn.executemany("INSERT INTO ideas (idea_id, team_id, idea_text, created_by) VALUES (?, ?, ?, ?)",
+                         [(str(uuid.uuid4()), team_ids[i], f"idea of team {i}", f"user{MEMBERS_PER_TEAM * i}") for i in range(num_teams)])
+    conn.close()
+
+
+def summarise(timings: List[float]) -> Dict[str, float]:
+    timings = sorted(timing * 1000 for timing in timings)
+    return {
+        "n": len(timings),
+        "mean_ms": round(statistics.mean(timings), 4),
+        "p50_ms": round(timings[len(timings) // 2], 4),
+        "p95_ms": round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 4),
+        "max_ms": round(timings[-1], 4),
+    }
+
+
+def time_calls(calls: List[Callable], before: Callable = None, expect_error: bool = False) -> List[float]:
+    timings = []
+    for call in calls:
+        if before:
+            before()
+        start = time.perf_counter()
+        try:
+            call()
+            if expect_error:
+                raise AssertionError("expected a HackathonError")
+        except HackathonError:
+            if not expect_error:
+                raise
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def bench_scale(tmpdir: str, participants: int, max_teams: int, repeat: int, slow_repeat: int) -> Dict[str, dict]:
+    num_teams = min(max_teams, participants // 5)
+    db_filepath = os.path.join(tmpdir, f"hackathon_{participants}.db")
+    csv_filepath = os.path.join(tmpdir, f"participants_{participants}.csv")
+    write_participants_csv(csv_filepath, participants)
+    results = {}
+
+    start = time.perf_counter()
+    HackathonSQLite(db_filepath, csv_filepath).close()
+    results["startup_cold"] = summarise([time.perf_counter() - start])
+    seed(db_filepath, num_teams)
+
+    startups = []
+    for _ in range(slow_repeat):
+        start = time.perf_counter()
+        db = HackathonSQLite(db_filepath, csv_filepath)
+        startups.append(time.perf_counter() - start)
+        db.close()
+    results["startup_warm"] = summarise(startups)
+
+    db = HackathonSQLite(db_filepath, csv_filepath)
+    teams = [i * num_teams // repeat for i in range(repeat)]  # spread over all teams
+    members = [f"user{MEMBERS_PER_TEAM * team + 1}" for team in teams]
+    unassigned = [f"user{MEMBERS_PER_TEAM * num_teams + i}" for i in range(min(repeat, participants - MEMBERS_PER_TEAM * num_teams))]
+    invalidate = db.read_cache.bump_version
+
+    results["get_participant_details"] = summarise(time_calls([lambda u=u: db.get_participant_details(u) for u in members]))
+
+    db.list_teams()
+    results["list_teams_cached"] = summarise(time_calls([db.list_teams] * repeat))
+    results["list_teams"] = summarise(time_calls([db.list_teams] * slow_repeat, before=invalidate))
+    results["list_my_team_cached"] = summarise(time_calls([lambda u=u: db.list_my_team(u) for u in members] * 2)[len(members):])
+    results["list_my_team"] = summarise(time_calls([lambda u=u: db.list_my_team(u) for u in members], before=invalidate))
+    db.get_unassigned_participants()
+    results["get_unassigned_participants_cached"] = summarise(time_calls([db.get_unassigned_participants] * repeat))
+    results["get_unassigned_participants"] = summarise(time_calls([db.get_unassigned_participants] * slow_repeat, before=invalidate))
+    results["list_team_ideas"] = summarise(time_calls([lambda u=u: db.list_team_ideas(u) for u in members]))
+
+    # every join is undone by a leave, so that teams keep room
+    joiners = list(zip(unassigned, teams))
+    results["join_team_exact"] = summarise(time_calls([lambda u=u, t=t: db.join_team(team_name(t), u) for u, t in joiners]))
+    results["leave_current_team"] = summarise(time_calls([lambda u=u: db.leave_current_team(u) for u, _ in joiners]))
+    results["join_team_partial"] = summarise(time_calls([lambda u=u, t=t: db.join_team(team_name(t)[5:13], u) for u, t in joiners]))
+    for u, _ in joiners:
+        db.leave_current_team(u)
+    results["join_team_ambiguous"] = summarise(time_calls([lambda u=u: db.join_team("Team 0", u) for u in unassigned], expect_error=True))
+    results["team_names_resolve"] = summarise(time_calls([lambda t=t: db.team_names.resolve(typo(team_name(t))) for t in teams] * 5))
+
+    # every created team is deleted again
+    results["create_team"] = summarise(time_calls([lambda u=u: db.create_team(f"new team of {u}", u) for u in unassigned]))
+    results["rename_my_team"] = summarise(time_calls([lambda u=u: db.rename_my_team(f"renamed team of {u}", u) for u in unassigned]))
+    results["delete_my_team"] = summarise(time_calls([lambda u=u: db.delete_my_team(u) for u in unassigned]))
+
+    results["add_idea_to_team"] = summarise(time_calls([lambda u=u: db.add_idea_to_team(u, "an idea") for u in members]))
+    idea_ids = [db.cursor.execute("SELECT idea_id FROM ideas WHERE created_by = ?", (u,)).fetchone()[0] for u in members]
+    results["edit_idea"] = summarise(time_calls([lambda u=u, i=i: db.edit_idea(u, i, "a better idea") for u, i in zip(members, idea_ids)]))
+    db.close()
+
+    for op in results.values():
+        op.update(participants=participants, teams=num_teams)
+    return results
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def compare(results: Dict[str, Dict[str, dict]], baseline: Dict[str, Dict[str, dict]], max_regression: float) -> bool:
+    '''
+    prints the p50 ratio to the baseline per operation, returns False if any is above max_regression
+    '''
+    ok = True
+    print(f"\ncompared to baseline commit {baseline['meta'].get('commit') or '?'} (p50 ratio, >1 is slower)")
+    for scale, ops in results["results"].items():
+        for op, result in ops.items():
+            base = baseline["results"].get(scale, {}).get(op)
+            if not base or not base["p50_ms"]:
+                continue
+            ratio = result["p50_ms"] / base["p50_ms"]
+            regressed = max_regression and ratio > max_regression
+            ok = ok and not regressed
+            print(f"  {scale:>7} {op:<36} {base['p50_ms']:>10.3f} -> {result['p50_ms']:>10.3f} ms  x{ratio:.2f}{'  REGRESSION' if regressed else ''}")
+    return ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--participants", default="1000,10000,100000", help="comma separated scales")
+    parser.add_argument("--max-teams", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=200, help="calls per operation")
+    parser.add_argument("--slow-repeat", type=int, default=5, help="calls for startup and uncached list operations")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="a previous results JSON file to compare with")
+    parser.add_argument("--max-regression", type=float, default=0, help="fail if any p50 is this many times the baseline")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(os.environ.get("LOG_LEVEL", "WARNING"))
+    results = {
+        "meta": {"commit": git_commit(), "python": platform.python_version(), "sqlite": sqlite3.sqlite_version,
+                 "platform": platform.platform(), "time": time.strftime("%Y-%m-%dT%H:%M:%S"), "repeat": args.repeat},
+        "results": {},
+    }
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for participants in (int(scale) for scale in args.participants.split(",")):
+            ops = results["results"][str(participants)] = bench_scale(tmpdir, participants, args.max_teams, args.repeat, args.slow_repeat)
+            print(f"participants={participants} teams={next(iter(ops.values()))['teams']}")
+            for op, result in ops.items():
+                print(f"  {op:<36} p50 {result['p50_ms']:>10.3f} ms  p95 {result['p95_ms']:>10.3f} ms  n={result['n']}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            if not compare(results, json.load(f), args.max_regression):
+                sys.exit(1)
+
+
+'''
+USAGE
+    python -m benchmarks.sqlite_ops --participants 1000,10000,100000 --output bench_sqlite.json
+    python -m benchmarks.sqlite_ops --compare bench_sqlite.json --max-regression 1.5
+'''
@@ -0,0 +1,109 @@
+'''
+This script measures the team state part of the streamlit_app2 prompt as the number of teams grows: the whole
+list_teams() text it used to embed against the TeamContextBuilder context (llm/team_context.py), in tokens, and the
+time to build the latter. For every number of teams the same messages are sent by the same kinds of users (a member
+asking for their team, an unassigned participant joining a team with a typo, asking what teams exist, creating a
+team). The context must stay within --max-tokens whatever the number of teams, exits with status 1 otherwise.
+
+Tokens are counted with tiktoken for --model, or estimated as 4 characters per token when its encoding can't be
+downloaded (offline).
+'''
+
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Tuple
+
+from benchmarks.db_overhead import write_participants_csv
+from benchmarks.sqlite_ops import MEMBERS_PER_TEAM, seed, summarise, team_name, typo
+from core.sqlite.hackathon_sqlite import HackathonSQLite
+from llm.team_context import TeamContextBuilder, tiktoken_counter
+
+UNASSIGNED = 200
+
+
+def token_counter(model_name: str) -> Callable[[str], int]:
+    try:
+        return tiktoken_counter(model_name)
+    except Exception as e:
+        print(f"tiktoken unavailable ({type(e).__name__}), estimating 4 characters per token")
+        return lambda text: len(text) // 4
+
+
+def messages(num_teams: int) -> List[Tuple[str, str, str]]:
+    '''
+    (name, username, message), the teams named are spread over all the teams
+    '''
+    member = f"user{MEMBERS_PER_TEAM * (num_teams // 3) + 1}"
+    unassigned = f"user{MEMBERS_PER_TEAM * num_teams}"
+    return [
+        ("my team", member, "show me my team"),
+        ("join with a typo", unassigned, f"I want to join {typo(team_name(num_teams // 2))}"),
+        ("what teams", unassigned, "what teams are there?"),
+        ("create", unassigned, "create a team called the llama wranglers"),
+    ]
+
+
+def bench(tmpdir: str, num_teams: int, count_tokens: Callable[[str], int], max_tokens: int,
+          repeat: int) -> Dict[str, dict]:
+    db_filepath = os.path.join(tmpdir, f"hackathon_{num_teams}.db")
+    csv_filepath = os.path.join(tmpdir, f"participants_{num_teams}.csv")
+    write_participants_csv(csv_filepath, MEMBERS_PER_TEAM * num_teams + UNASSIGNED)
+    HackathonSQLite(db_filepath, csv_filepath).close()
+    seed(db_filepath, num_teams)
+
+    db = HackathonSQLite(db_filepath, csv_filepath)
+    builder = TeamContextBuilder(db, count_tokens, max_tokens=max_tokens)
+    full_tokens = count_tokens(db.list_teams())
+    results = {}
+    for name, username, message in messages(num_teams):
+        context = builder.build(message, username)
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            builder.build(message, username)
+            timings.append(time.perf_counter() - start)
+        results[name] = {"full_tokens": full_tokens, "context_tokens": count_tokens(context), "context": context,
+                         "build": summarise(timings)}
+    db.close()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--teams", default="10,100,1000,5000", help="comma separated numbers of teams")
+    parser.add_argument("--max-tokens", type=int, default=300)
+    parser.add_argument("--model", default="gpt-4o")
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--show", action="store_true", help="print the contexts of the largest number of teams")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(os.environ.get("LOG_LEVEL", "CRITICAL"))
+    count_tokens = token_counter(args.model)
+    over_budget = 0
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for num_teams in (int(n) for n in args.teams.split(",")):
+            results = bench(tmpdir, num_teams, count_tokens, args.max_tokens, args.repeat)
+            print(f"{num_teams} teams: list_teams() is {next(iter(results.values()))['full_tokens']} tokens")
+            for name, result in results.items():
+                over_budget += result["context_tokens"] > args.max_tokens
+                print(f"  {name:<18} context {result['context_tokens']:>4} tokens  "
+                      f"build p50 {result['build']['p50_ms']:>7.3f} ms  p95 {result['build']['p95_ms']:>7.3f} ms")
+        if args.show:
+            for name, result in results.items():
+                print(f"\n--- {name}\n{result['context']}")
+
+    if over_budget:
+        print(f"{over_budget} context(s) over {args.max_tokens} tokens")
+        sys.exit(1)
+    print(f"All contexts within {args.max_tokens} tokens")
+
+
+'''
+USAGE
+    python -m benchmarks.team_context_tokens
+    python -m benchmarks.team_context_tokens --teams 10,5000 --max-tokens 200 --show
+'''
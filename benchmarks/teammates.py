@@ -0,0 +1,138 @@
+'''
+This script measures teammate recommendations (HackathonSQLite.recommend_teammates, see core/teammate_index.py)
+at several roster sizes: building the index at startup, a recommendation for a team captain, a team member and an
+unassigned participant, and the index updates done when someone joins or leaves a team or a bio changes.
+
+Bios are made of role and skill words with a few rare ones per bio, picked with a Zipf like distribution, so that
+some skills are common and most are rare, as in a slack workspace. A third of the participants are in teams of
+MEMBERS_PER_TEAM. Exits with status 1 if a recommendation p95 is above --max-ms.
+'''
+
+import argparse
+import csv
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from typing import Dict
+
+from benchmarks.sqlite_ops import MEMBERS_PER_TEAM, seed, summarise
+from core.sqlite.hackathon_sqlite import HackathonSQLite
+
+ROLES = ["backend", "frontend", "fullstack", "mobile", "data", "ml", "devops", "security", "product", "ux", "ui",
+         "qa", "embedded", "cloud", "platform", "research"]
+SKILLS = ["python", "java", "go", "rust", "c++", "c#", "javascript", "typescript", "react", "vue", "angular",
+          "node.js", "django", "flask", "spring", "kotlin", "swift", "flutter", "sql", "postgres", "mongodb", "redis",
+          "kafka", "spark", "pandas", "pytorch", "tensorflow", "llm", "nlp", "vision", "kubernetes", "docker",
+          "terraform", "aws", "gcp", "azure", "figma", "sketch", "illustrator", "design", "research", "analytics",
+          "excel", "tableau", "marketing", "sales", "finance", "writing", "video", "unity", "blender", "arduino"]
+TITLES = ["engineer", "developer", "designer", "scientist", "analyst", "manager", "intern", "architect", "lead"]
+
+
+def bio(rng: random.Random) -> str:
+    skills = rng.choices(SKILLS, weights=[1 / (i + 1) for i in range(len(SKILLS))], k=rng.randint(1, 6))
+    rare = [f"tool{int(rng.paretovariate(1.2))}" for _ in range(rng.randint(0, 3))]
+    return f"{rng.choice(ROLES)} {rng.choice(TITLES)}, {', '.join(skills + rare)}"
+
+
+def write_participants_csv(filepath: str, num_participants: int, rng: random.Random):
+    with open(filepath, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=["username", "full_name", "bio"])
+        writer.writeheader()
+        for i in range(num_participants):
+            writer.writerow({"username": f"user{i}", "full_name": f"User {i}", "bio": bio(rng)})
+
+
+def bench(tmpdir: str, num_participants: int, k: int, repeat: int, seed_value: int) -> Dict[str, dict]:
+    rng = random.Random(seed_value)
+    db_filepath = os.path.join(tmpdir, f"hackathon_{num_participants}.db")
+    csv_filepath = os.path.join(tmpdir, f"participants_{num_participants}.csv")
+    write_participants_csv(csv_filepath, num_participants, rng)
+    HackathonSQLite(db_filepath, csv_filepath).close()
+    num_teams = num_participants // (3 * MEMBERS_PER_TEAM)
+    seed(db_filepath, num_teams)
+
+    # the index is loaded from the participants table at startup
+    start = time.perf_counter()
+    db = HackathonSQLite(db_filepath, csv_filepath)
+    results = {"startup": summarise([time.perf_counter() - start])}
+    index = db.teammates
+
+    start = time.perf_counter()
+    index.rebuild([(username, details['bio'], None) for username, details in db.participants_map.items()])
+    results["index_rebuild"] = summarise([time.perf_counter() - start])
+    db.reload_participants(full_reload=True)
+
+    teams = [rng.randrange(num_teams) for _ in range(repeat)]
+    users = {
+        "recommend_captain": [f"user{MEMBERS_PER_TEAM * team}" for team in teams],
+        "recommend_member": [f"user{MEMBERS_PER_TEAM * team + 1}" for team in teams],
+        "recommend_unassigned": [f"user{rng.randrange(MEMBERS_PER_TEAM * num_teams, num_participants)}"
+                                 for _ in range(repeat)],
+    }
+    for name, usernames in users.items():
+        timings = []
+        for username in usernames:
+            call_start = time.perf_counter()
+            db.recommend_teammates(username, k)
+            timings.append(time.perf_counter() - call_start)
+        results[name] = summarise(timings)
+
+    # what _join_team, _leave_current_team and a roster sync do to the index
+    unassigned = users["recommend_unassigned"]
+    timings = []
+    for username, team in zip(unassigned, teams):
+        call_start = time.perf_counter()
+        index.set_team(username, f"team{team}")
+        index.set_team(username, None)
+        timings.append((time.perf_counter() - call_start) / 2)
+    results["index_join_or_leave"] = summarise(timings)
+    timings = []
+    for username in unassigned:
+        new_bio = bio(rng)
+        call_start = time.perf_counter()
+        index.upsert(username, new_bio)
+        timings.append(time.perf_counter() - call_start)
+    results["index_bio_change"] = summarise(timings)
+
+    results["example"] = {"username": users["recommend_member"][0],
+                          "recommendations": db.recommend_teammates(users["recommend_member"][0], k)}
+    db.close()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--participants", default="1000,10000,50000", help="comma separated roster sizes")
+    parser.add_argument("--k", type=int, default=5, help="recommendations per call")
+    parser.add_argument("--repeat", type=int, default=100)
+    parser.add_argument("--max-ms", type=float, default=50.0, help="fail if a recommendation p95 is above this")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(os.environ.get("LOG_LEVEL", "CRITICAL"))
+    too_slow = []
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for num_participants in (int(n) for n in args.participants.split(",")):
+            results = bench(tmpdir, num_participants, args.k, args.repeat, args.seed)
+            example = results.pop("example")
+            print(f"{num_participants} participants")
+            for name, result in results.items():
+                print(f"  {name:<24} p50 {result['p50_ms']:>9.3f} ms  p95 {result['p95_ms']:>9.3f} ms  n={result['n']}")
+                if name.startswith("recommend") and result["p95_ms"] > args.max_ms:
+                    too_slow.append(f"{name} at {num_participants} participants")
+            print(f"  e.g for {example['username']}: {example['recommendations']}")
+
+    if too_slow:
+        print(f"p95 above {args.max_ms} ms: {', '.join(too_slow)}")
+        sys.exit(1)
+    print(f"All recommendations p95 within {args.max_ms} ms")
+
+
+'''
+USAGE
+    python -m benchmarks.teammates
+    python -m benchmarks.teammates --participants 50000 --k 10 --max-ms 50
+'''
@@ -0,0 +1,29 @@
+'''
+Registry of the HackathonBase implementations, so that tools can run the same checks and workloads against each of
+them (see scripts/check_backend_conformance.py and benchmarks/backends.py).
+
+Usage:
+    db = create_backend("journal", data_dirpath, "data/participants.csv", max_team_size=5)
+'''
+
+import os
+from typing import Callable, Dict
+
+from core.hackathon_base import HackathonBase
+from core.journal.hackathon_journal import HackathonJournal
+from core.sqlite.hackathon_sqlite import HackathonSQLite
+
+# name -> factory(data_dirpath, participants_csv_filepath, **kwargs), the backend keeps its files in data_dirpath
+BACKENDS: Dict[str, Callable[..., HackathonBase]] = {
+    "sqlite": lambda data_dirpath, participants_csv_filepath, **kwargs: HackathonSQLite(
+        os.path.join(data_dirpath, "hackathon_data.db"), participants_csv_filepath, **kwargs),
+    "journal": lambda data_dirpath, participants_csv_filepath, **kwargs: HackathonJournal(
+        os.path.join(data_dirpath, "hackathon_journal"), participants_csv_filepath, **kwargs),
+}
+
+
+def create_backend(name: str, data_dirpath: str, participants_csv_filepath: str, **kwargs) -> HackathonBase:
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown backend {name}, one of {', '.join(BACKENDS)}")
+    os.makedirs(data_dirpath, exist_ok=True)
+    return BACKENDS[name](data_dirpath, participants_csv_filepath, **kwargs)
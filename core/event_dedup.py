@@ -0,0 +1,62 @@
+import logging
+import os
+import threading
+from typing import List
+
+from core.hackathon_base import HackathonError
+from core.sqlite.hackathon_sqlite import HackathonSQLite
+
+logging.basicConfig()
+logging.getLogger().setLevel(os.environ.get("LOG_LEVEL", "INFO"))
+
+logger = logging.getLogger(__name__)
+
+
+def get_event_keys(body: dict, event: dict) -> List[str]:
+    '''
+    idempotency keys of a slack event. A retry has the same event_id, the same message delivered as another
+    event has the same client_msg_id
+    '''
+    keys = []
+    if body.get("event_id"):
+        keys.append(f"event:{body['event_id']}")
+    if event.get("client_msg_id"):
+        keys.append(f"msg:{event['client_msg_id']}")
+    return keys
+
+
+class SlackEventDeduplicator:
+    '''
+    Drops slack events which were already received, e.g redelivered because they were not acked in time.
+    Keys are recorded in the DB for ttl_seconds, so they also survive a restart of the bot.
+    '''
+
+    def __init__(self, db: HackathonSQLite, ttl_seconds: float = 60 * 60):
+        self.db = db
+        self.ttl_seconds = ttl_seconds
+        self.duplicates = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, db: HackathonSQLite) -> "SlackEventDeduplicator":
+        return cls(db, ttl_seconds=float(os.environ.get("SLACK_EVENT_DEDUP_TTL_SECONDS", str(60 * 60))))
+
+    def is_duplicate(self, body: dict, event: dict) -> bool:
+        event_keys = get_event_keys(body, event)
+        if not event_keys:
+            return False
+        try:
+            claimed = self.db.claim_slack_event(event_keys, self.ttl_seconds)
+        except HackathonError as e:
+            # better to risk handling a retry than to drop a message
+            logger.error('Could not record slack event %s: %s', event_keys, e.message)
+            return False
+        if not claimed:
+            with self._lock:
+                self.duplicates += 1
+            logger.info('Dropped duplicate slack event %s', event_keys)
+        return not claimed
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"duplicates_dropped": self.duplicates}
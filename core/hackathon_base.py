@@ -1,7 +1,6 @@
 
-
 from abc import ABC, abstractmethod
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
 
 
 class HackathonError(Exception):
@@ -10,31 +9,80 @@ class HackathonError(Exception):
 
 
 class HackathonBase(ABC):
+    '''
+    Teams, participants and ideas of the hackathon. Every backend raises HackathonError, with a message which can be
+    shown to the user, when an action is not allowed, see scripts/check_backend_conformance.py
+    '''
+
+    @abstractmethod
+    def get_participant_details(self, username: str) -> Tuple[bool, str, str]:
+        '''
+        Returns a tuple of (is_participant, full_name, bio) of the user with the given username'''
+        pass
 
     @abstractmethod
-    def create_team(team_name: str, captain_username: str) -> Tuple[str, str]:
+    def create_team(self, team_name: str, captain_username: str) -> Tuple[str, str]:
         '''
-        Create a new team with the given team name and given captain username 
+        Create a new team with the given team name and given captain username
         and return a tuple of the team name and team id'''
         pass
-    
+
+    @abstractmethod
+    def rename_my_team(self, new_team_name: str, username: str) -> Tuple[str, str]:
+        '''
+        Rename the team of which the user with the given username is captain
+        and return a tuple of the new team name and team id'''
+        pass
+
     @abstractmethod
-    def join_team(team_name: str, username: str) -> bool:
+    def join_team(self, team_name: str, username: str) -> str:
         '''
         User with the given username should join the the team with given team name
-        Returns True if the user is successfully added to the team, False otherwise'''
+        Returns the name of the team joined, the given name may only be close to it (case, typos)'''
+        pass
+
+    @abstractmethod
+    def list_my_team(self, username: str) -> str:
+        '''
+        Text listing the team of the user with the given username, with its captain and members'''
+        pass
+
+    @abstractmethod
+    def get_teams(self) -> List[Dict]:
+        '''
+        All the teams as dicts of team_name, captain and members'''
         pass
 
     @abstractmethod
-    def list_teams(data) -> List[Dict]:
+    def get_team(self, team_id: str) -> Optional[Dict]:
         '''
-        List all the teams along with their captain and their members'''
+        The team with the given id as a dict of team_name, captain and members, None if there is no such team'''
         pass
 
     @abstractmethod
-    def get_unassigned_participants() -> List[str]:
+    def list_teams(self) -> str:
         '''
-        List username of all participants who are not in any team'''
+        Text listing all the teams along with their captain and their members'''
+        pass
+
+    @abstractmethod
+    def get_unassigned_participants(self) -> List[str]:
+        '''
+        List full name of all participants who are not in any team'''
+        pass
+
+    @abstractmethod
+    def count_unassigned_participants(self) -> int:
+        '''
+        Number of participants who are not in any team'''
+        pass
+
+    @abstractmethod
+    def recommend_teammates(self, username: str, k: int = 5) -> List[Tuple[str, List[str]]]:
+        '''
+        (full_name, skills) of up to k unassigned participants whose bios add the most to the bios of the team of the
+        user with the given username, or to the user's bio if they have no team. skills are words of their bio the
+        team doesn't have yet'''
         pass
 
     @abstractmethod
@@ -47,4 +95,28 @@ class HackathonBase(ABC):
     def delete_my_team(self, username: str) -> bool:
         '''
         Delete the team of the user with the given username'''
-        pass
\ No newline at end of file
+        pass
+
+    @abstractmethod
+    def add_idea_to_team(self, username: str, idea_text: str) -> str:
+        '''
+        Add an idea to the team of the user with the given username'''
+        pass
+
+    @abstractmethod
+    def edit_idea(self, username: str, idea_id: str, new_idea_text: str) -> str:
+        '''
+        Change the text of an idea of the team of the user with the given username'''
+        pass
+
+    @abstractmethod
+    def list_team_ideas(self, username: str) -> str:
+        '''
+        Text listing the ideas of the team of the user with the given username, newest first'''
+        pass
+
+    @abstractmethod
+    def close(self):
+        '''
+        Release the connections, files and threads of the backend'''
+        pass
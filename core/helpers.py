@@ -0,0 +1,31 @@
+from typing import Dict, List
+
+
+def format_teams(teams: List[Dict], my_team: bool) -> str:
+    '''
+    slack text of teams given as dicts of team_name, captain and members
+    '''
+    if not teams:
+        return "No teams found."
+    parts = ["Here are the details of all the teams that have been registered:\n\n" if not my_team else "Here is the detail of your team:\n\n"]
+    for i, team in enumerate(teams, 1):
+        parts.append(f"{i}. Team: {team['team_name']}\n \n")
+        parts.append(f"   Captain: {team['captain']}\n \n")
+
+        if team['members']:
+            parts.append("   Members:\n")
+            parts.extend(f"     {j}. {member}\n" for j, member in enumerate(team['members'], 1))
+        else:
+            parts.append("   No additional members.\n")
+
+        parts.append("\n\n")  # Add an extra newline for spacing between teams
+
+    return "".join(parts).strip()  # Remove trailing newline
+
+
+def one_of(team_names: List[str]) -> str:
+    '''
+    '"a"', '"a" or "b"', '"a", "b" or "c"'
+    '''
+    quoted = [f'"{team_name}"' for team_name in team_names]
+    return quoted[0] if len(quoted) == 1 else f'{", ".join(quoted[:-1])} or {quoted[-1]}'
@@ -0,0 +1,541 @@
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from core.hackathon_base import HackathonBase, HackathonError
+from core.helpers import format_teams, one_of
+from core.journal.journal import Journal
+from core.sqlite.read_cache import VersionedReadCache
+from core.sqlite.roster_sync import ParticipantRosterSync, RosterFingerprint
+from core.team_name_index import TeamNameIndex
+from core.teammate_index import TeammateIndex
+from core.tracing import traced, tracer
+
+logging.basicConfig()
+logging.getLogger().setLevel(os.environ.get("LOG_LEVEL", "INFO"))
+
+logger = logging.getLogger(__name__)
+
+
+def by_full_name(full_name: Optional[str]) -> Tuple[bool, str]:
+    '''
+    sort key of participant names, lists are in the order of HackathonSQLite's full_name indexes (NULL first)
+    '''
+    return full_name is not None, full_name or ""
+
+
+class HackathonJournal(HackathonBase):
+    '''
+    Teams, participants and ideas held in memory, in hash indexes by team id, team name, captain and username,
+    so that every operation is O(1) (or O(team size)) instead of a scan. Every mutation is appended to a
+    Journal (see core/journal/journal.py) and replayed from the last snapshot at startup.
+
+    Behaves like HackathonSQLite, same checks in the same order and the same error messages. Conversation
+    history, slack event keys and the token ledger are not part of it, they stay in HackathonSQLite.
+
+    A mutation is visible to readers once applied and durable once its method returns, so with fsync_interval 0
+    a reader can see a mutation which a crash right after would lose, like readers of a SQLite WAL commit
+    which is not synced yet.
+    '''
+
+    def __init__(self, data_dirpath: str = "data/hackathon_journal", participants_csv_filepath: str = "data/participants.csv",
+                 max_team_size: Optional[int] = None, fsync_interval: float = 0.0, compact_after: int = 10000,
+                 read_cache_max_entries: int = 1024):
+        self.data_dirpath = data_dirpath
+        self.participants_csv_filepath = participants_csv_filepath
+
+        # username -> [full_name, bio, team_id]
+        self._participants: Dict[str, List] = {}
+        # usernames without a team
+        self._unassigned: Set[str] = set()
+        # team_id -> {"team_name", "captain_username", "members": {username: None}}, members include the captain
+        self._teams: Dict[str, Dict] = {}
+        self._team_by_name: Dict[str, str] = {}
+        self._team_by_captain: Dict[str, str] = {}
+        # lowercase (normalised) names and close names, see resolve
+        self.team_names = TeamNameIndex()
+        # bios of participants and who is unassigned, for recommend_teammates
+        self.teammates = TeammateIndex()
+        # idea_id -> [team_id, idea_text, created_by, created_at]
+        self._ideas: Dict[str, List] = {}
+        self._team_ideas: Dict[str, Dict[str, None]] = defaultdict(dict)
+        self._ideas_by_author: Dict[str, int] = defaultdict(int)
+        self._settings: Dict[str, str] = {'max_team_size': '5'}
+        self._roster_fingerprint: Optional[RosterFingerprint] = None
+
+        # orders mutations (and their journal records) and guards the indexes
+        self._lock = threading.Lock()
+        self.read_cache = VersionedReadCache(max_entries=read_cache_max_entries)
+        self._compaction: Optional[threading.Thread] = None
+        self._roster_lock = threading.Lock()
+        self._roster_watcher_stop = threading.Event()
+
+        self.journal = Journal(data_dirpath, fsync_interval=fsync_interval, compact_after=compact_after)
+        state, records = self.journal.load()
+        if state is not None:
+            self._restore(state)
+        for op, *args in records:
+            self._apply(op, *args)
+
+        if max_team_size is None and os.environ.get("MAX_TEAM_SIZE"):
+            max_team_size = int(os.environ["MAX_TEAM_SIZE"])
+        if max_team_size is not None and self._settings['max_team_size'] != str(max_team_size):
+            self._mutate('set_setting', 'max_team_size', str(max_team_size))
+        self.max_team_size = int(self._settings['max_team_size'])
+
+        if not os.path.exists(self.participants_csv_filepath) or os.path.getsize(self.participants_csv_filepath) == 0:
+            logger.error("Filepaths provided are either empty or does not exist.")
+            sys.exit(1)
+
+        self.roster_sync = ParticipantRosterSync(self.participants_csv_filepath)
+        self.reload_participants()
+
+    @classmethod
+    def from_env(cls) -> "HackathonJournal":
+        return cls(
+            data_dirpath=os.environ.get("JOURNAL_DIR", "data/hackathon_journal"),
+            fsync_interval=float(os.environ.get("JOURNAL_FSYNC_INTERVAL_SECONDS", "0")),
+            compact_after=int(os.environ.get("JOURNAL_COMPACT_AFTER", "10000")),
+        )
+
+    def _restore(self, state: Dict[str, Any]):
+        self._settings.update(state["settings"])
+        fingerprint = state["roster_fingerprint"]
+        self._roster_fingerprint = RosterFingerprint(*fingerprint) if fingerprint else None
+        for username, full_name, bio, team_id in state["participants"]:
+            self._participants[username] = [full_name, bio, team_id]
+            if team_id is None:
+                self._unassigned.add(username)
+        for team_id, team_name, captain_username, members in state["teams"]:
+            self._teams[team_id] = {"team_name": team_name, "captain_username": captain_username,
+                                    "members": dict.fromkeys(members)}
+            self._team_by_name[team_name] = team_id
+            self._team_by_captain[captain_username] = team_id
+        self.team_names.rebuild((team_id, team["team_name"]) for team_id, team in self._teams.items())
+        self.teammates.rebuild((username, bio, team_id) for username, (_, bio, team_id) in self._participants.items())
+        for idea_id, team_id, idea_text, created_by, created_at in state["ideas"]:
+            self._ideas[idea_id] = [team_id, idea_text, created_by, created_at]
+            self._team_ideas[team_id][idea_id] = None
+            self._ideas_by_author[created_by] += 1
+
+    def _dump_state(self) -> Dict[str, Any]:
+        '''
+        a copy of the state for the snapshot, called under the lock
+        '''
+        return {
+            "settings": dict(self._settings),
+            "roster_fingerprint": list(self._roster_fingerprint) if self._roster_fingerprint else None,
+            "participants": [[username, *participant] for username, participant in self._participants.items()],
+            "teams": [[team_id, team["team_name"], team["captain_username"], list(team["members"])]
+                      for team_id, team in self._teams.items()],
+            "ideas": [[idea_id, *idea] for idea_id, idea in self._ideas.items()],
+        }
+
+    def _mutate(self, op: str, *args):
+        '''
+        applies a mutation, checked by the caller, and journals it. Returns once the record is durable
+        '''
+        with self._lock:
+            seq = self._commit(op, *args)
+        self._after_commit(seq)
+
+    def _commit(self, op: str, *args) -> int:
+        '''
+        called under the lock, the record is appended in the order mutations are applied
+        '''
+        self._apply(op, *args)
+        self.read_cache.bump_version()
+        return self.journal.append(op, *args)
+
+    def _after_commit(self, seq: int):
+        self.journal.wait_durable(seq)
+        if self.journal.should_compact():
+            with self._lock:
+                snapshot_seq = self.journal.start_compaction()
+                state = self._dump_state() if snapshot_seq is not None else None
+            if snapshot_seq is not None:
+                # the snapshot is written in the background, mutations go on in the new log meanwhile
+                self._compaction = threading.Thread(target=self.journal.write_snapshot, args=(state, snapshot_seq),
+                                                    name="journal-compaction", daemon=True)
+                self._compaction.start()
+
+    def _apply(self, op: str, *args):
+        getattr(self, f"_apply_{op}")(*args)
+
+    def _apply_set_setting(self, key: str, value: str):
+        self._settings[key] = value
+
+    def _apply_sync_roster(self, inserts: List[List[str]], updates: List[List[str]], deletes: List[str], fingerprint: List):
+        for username, full_name, bio in inserts:
+            self._participants[username] = [full_name, bio, None]
+            self._unassigned.add(username)
+            self.teammates.upsert(username, bio)
+        for full_name, bio, username in updates:
+            self._participants[username][:2] = [full_name, bio]
+            self.teammates.upsert(username, bio)
+        for username in deletes:
+            del self._participants[username]
+            self._unassigned.discard(username)
+            self.teammates.remove(username)
+        self._roster_fingerprint = RosterFingerprint(*fingerprint)
+
+    def _set_team(self, username: str, team_id: Optional[str]):
+        participant = self._participants.get(username)
+        if participant is None:
+            return
+        if participant[2] is not None:
+            self._teams[participant[2]]["members"].pop(username, None)
+        participant[2] = team_id
+        self.teammates.set_team(username, team_id)
+        if team_id is None:
+            self._unassigned.add(username)
+        else:
+            self._unassigned.discard(username)
+            self._teams[team_id]["members"][username] = None
+
+    def _apply_create_team(self, team_id: str, team_name: str, captain_username: str):
+        self._teams[team_id] = {"team_name": team_name, "captain_username": captain_username, "members": {}}
+        self._team_by_name[team_name] = team_id
+        self._team_by_captain[captain_username] = team_id
+        self.team_names.add(team_id, team_name)
+        self._set_team(captain_username, team_id)
+
+    def _apply_rename_team(self, team_id: str, team_name: str):
+        team = self._teams[team_id]
+        del self._team_by_name[team["team_name"]]
+        team["team_name"] = team_name
+        self._team_by_name[team_name] = team_id
+        self.team_names.add(team_id, team_name)
+
+    def _apply_join_team(self, team_id: str, username: str):
+        self._set_team(username, team_id)
+
+    def _apply_leave_team(self, username: str):
+        self._set_team(username, None)
+
+    def _apply_delete_team(self, team_id: str):
+        for username in list(self._teams[team_id]["members"]):
+            self._set_team(username, None)
+        team = self._teams.pop(team_id)
+        del self._team_by_name[team["team_name"]]
+        del self._team_by_captain[team["captain_username"]]
+        self.team_names.remove(team_id)
+
+    def _apply_add_idea(self, idea_id: str, team_id: str, idea_text: str, created_by: str, created_at: str):
+        self._ideas[idea_id] = [team_id, idea_text, created_by, created_at]
+        self._team_ideas[team_id][idea_id] = None
+        self._ideas_by_author[created_by] += 1
+
+    def _apply_edit_idea(self, idea_id: str, idea_text: str):
+        self._ideas[idea_id][1] = idea_text
+
+    @property
+    def data_version(self) -> int:
+        '''
+        increases with every mutation
+        '''
+        return self.read_cache.version
+
+    def get_setting(self, key: str) -> Optional[str]:
+        return self._settings.get(key)
+
+    @traced()
+    def reload_participants(self, full_reload: bool = False) -> bool:
+        '''
+        applies the changes of the CSV since the last sync to the participants, the CSV is only read when its
+        fingerprint changed. returns True if anything has changed
+        '''
+        with self._roster_lock:
+            fingerprint = self.roster_sync.fingerprint(previous=self._roster_fingerprint)
+            if not full_reload and self._roster_fingerprint and self._roster_fingerprint.sha256 == fingerprint.sha256:
+                if self._roster_fingerprint != fingerprint:
+                    # file was touched but content is the same, remember new mtime to skip hashing next time
+                    self._mutate('sync_roster', [], [], [], list(fingerprint))
+                return False
+
+            roster = self.roster_sync.read_csv()
+            with self._lock:
+                inserts, updates, deletes = [], [], []
+                for username, (full_name, bio) in roster.items():
+                    participant = self._participants.get(username)
+                    if participant is None:
+                        inserts.append([username, full_name, bio])
+                    elif participant[:2] != [full_name, bio]:
+                        updates.append([full_name, bio, username])
+                for username, participant in self._participants.items():
+                    if username in roster:
+                        continue
+                    # participants who are part of a team or have added ideas are referenced, keep them
+                    in_team, has_ideas = participant[2] is not None, bool(self._ideas_by_author.get(username))
+                    if not in_team and not has_ideas:
+                        deletes.append(username)
+                    else:
+                        reasons = (["is part of a team"] if in_team else []) + (["has added ideas"] if has_ideas else [])
+                        logger.warning("Participant %s is no longer in the CSV but %s, keeping it", username,
+                                       " and ".join(reasons))
+                seq = self._commit('sync_roster', inserts, updates, deletes, list(fingerprint))
+            self._after_commit(seq)
+
+            logger.info("Participants synced from %s : %d inserted, %d updated, %d deleted",
+                        self.participants_csv_filepath, len(inserts), len(updates), len(deletes))
+            return bool(inserts or updates or deletes)
+
+    def watch_participants(self, interval_seconds: float):
+        '''
+        starts a daemon thread which reloads participants whenever the CSV changes, so that
+        names and bios can be updated without restarting the bot
+        '''
+        def watch():
+            while not self._roster_watcher_stop.wait(interval_seconds):
+                try:
+                    self.reload_participants()
+                except Exception as e:
+                    logger.error('participants reload failed: %s', e)
+
+        threading.Thread(target=watch, name="participants-watcher", daemon=True).start()
+
+    @traced()
+    def get_participant_details(self, username: str) -> Tuple[bool, str, str]:
+        '''
+        returns a tuple of (bool, str, str) which signifies user attributes is_participant, full_name, bio
+        '''
+        participant = self._participants.get(username)
+        if participant is None:
+            return False, "", ""
+        return True, participant[0], participant[1]
+
+    @traced()
+    def create_team(self, team_name: str, captain_username: str) -> Tuple[str, str]:
+        if len(team_name) > 100:
+            raise HackathonError("Team name must be 100 characters or less.")
+
+        with self._lock:
+            if captain_username in self._team_by_captain:
+                raise HackathonError("User can only create one team. Delete the old team first.")
+            if team_name in self._team_by_name:
+                raise HackathonError("Team name already exists.")
+            if captain_username not in self._participants:
+                # the captain must be a participant, a foreign key in HackathonSQLite
+                raise HackathonError('Some error occured, pls try later')
+
+            team_id = str(uuid.uuid4())
+            seq = self._commit('create_team', team_id, team_name, captain_username)
+        self._after_commit(seq)
+        return team_name, team_id
+
+    @traced()
+    def rename_my_team(self, new_team_name: str, username: str) -> Tuple[str, str]:
+        if len(new_team_name) > 100:
+            raise HackathonError("New team name must be 100 characters or less.")
+
+        with self._lock:
+            team_id = self._team_by_captain.get(username)
+            if team_id is None:
+                raise HackathonError("You are not a captain of any team. Only team captain can rename team")
+            if self._team_by_name.get(new_team_name, team_id) != team_id:
+                # team names are unique, a constraint in HackathonSQLite
+                raise HackathonError('Some error occured, pls try again.')
+
+            seq = self._commit('rename_team', team_id, new_team_name)
+        self._after_commit(seq)
+        return new_team_name, team_id
+
+    @traced()
+    def list_my_team(self, username: str) -> str:
+        with self._lock:
+            participant = self._participants.get(username)
+            if participant is None or participant[2] is None:
+                return "You are not in any team."
+
+            team = self._teams[participant[2]]
+            captain = self._full_name(team["captain_username"])
+            members = self._member_names(team)
+        tracer.current_span().set_attribute("db.rows", len(members))
+        team_info = [{
+            "team_name": team["team_name"],
+            "captain": captain,
+            "members": [member for member in members if member != captain],
+        }]
+        return format_teams(team_info, my_team=True)
+
+    def _member_names(self, team: Dict) -> List[Optional[str]]:
+        return sorted((self._participants[member][0] for member in team["members"]), key=by_full_name)
+
+    def _full_name(self, username: str) -> Optional[str]:
+        participant = self._participants.get(username)
+        return participant[0] if participant else None
+
+    @traced()
+    def join_team(self, team_name: str, username: str) -> str:
+        '''
+        returns the name of the team joined, which can differ from team_name in case, punctuation or a typo
+        '''
+        with self._lock:
+            # exact name first, then the only name containing it, then the only close enough name
+            match, suggestions = self.team_names.resolve(team_name)
+            tracer.current_span().set_attribute("hackathon.team_name_matched", match is not None)
+            if match is None:
+                self._raise_if_in_team(username)
+                if suggestions:
+                    raise HackathonError(f"No team named {team_name}, did you mean {one_of(suggestions)}?")
+                raise HackathonError("No matching team found.")
+
+            team_id, matched_team_name = match
+            participant = self._participants.get(username)
+            if participant is None:
+                raise HackathonError("You are not a registered participant of the hackathon.")
+            if participant[2] is not None or len(self._teams[team_id]["members"]) >= self.max_team_size:
+                self._raise_if_in_team(username)
+                raise HackathonError(f"Team already has the maximum of {self.max_team_size} members.")
+
+            seq = self._commit('join_team', team_id, username)
+        self._after_commit(seq)
+        return matched_team_name
+
+    def _raise_if_in_team(self, username: str):
+        participant = self._participants.get(username)
+        if participant is not None and participant[2] is not None:
+            raise HackathonError("You are already in a team. Either leave/delete your team first.")
+
+    @traced()
+    def get_teams(self) -> List[Dict]:
+        '''
+        returns all teams as dicts of team_name, captain and members. The list is shared with the read cache, don't modify it
+        '''
+        return self.read_cache.get_or_compute(('list_teams',), self._list_teams)[0]
+
+    @traced()
+    def get_team(self, team_id: str) -> Optional[Dict]:
+        with self._lock:
+            team = self._teams.get(team_id)
+            if team is None:
+                return None
+            captain = self._full_name(team["captain_username"])
+            members = self._member_names(team)
+        return {"team_name": team["team_name"], "captain": captain,
+                "members": [member for member in members if member and member != captain]}
+
+    @traced()
+    def list_teams(self) -> str:
+        return self.read_cache.get_or_compute(('list_teams',), self._list_teams)[1]
+
+    def _list_teams(self) -> Tuple[List[Dict], str]:
+        with self._lock:
+            team_list = []
+            for team in self._teams.values():
+                captain = self._full_name(team["captain_username"])
+                members = self._member_names(team)
+                team_list.append({"team_name": team["team_name"], "captain": captain,
+                                  "members": [member for member in members if member and member != captain]})
+        tracer.current_span().set_attribute("db.rows", len(team_list))
+        return team_list, format_teams(team_list, my_team=False)
+
+    @traced()
+    def get_unassigned_participants(self) -> List[str]:
+        return list(self.read_cache.get_or_compute(('get_unassigned_participants',), self._get_unassigned_participants))
+
+    def _get_unassigned_participants(self) -> Tuple[str, ...]:
+        with self._lock:
+            full_names = [self._participants[username][0] for username in self._unassigned]
+        return tuple(sorted(full_names, key=by_full_name))
+
+    @traced()
+    def count_unassigned_participants(self) -> int:
+        with self._lock:
+            return len(self._unassigned)
+
+    @traced()
+    def recommend_teammates(self, username: str, k: int = 5) -> List[Tuple[str, List[str]]]:
+        recommendations = self.teammates.recommend(username, k)
+        with self._lock:
+            return [(self._full_name(recommendation.username) or recommendation.username, recommendation.terms)
+                    for recommendation in recommendations]
+
+    @traced()
+    def leave_current_team(self, username: str) -> bool:
+        with self._lock:
+            participant = self._participants.get(username)
+            if participant is None or participant[2] is None:
+                raise HackathonError("You are not a member in any team.")
+            if self._teams[participant[2]]["captain_username"] == username:
+                raise HackathonError("Team captain cannot leave the team. Delete your team instead.")
+
+            seq = self._commit('leave_team', username)
+        self._after_commit(seq)
+        return True
+
+    @traced()
+    def delete_my_team(self, username: str) -> bool:
+        with self._lock:
+            team_id = self._team_by_captain.get(username)
+            if team_id is None:
+                raise HackathonError("Your team does not exist i.e you are not a captain of any team. If you're member in any team, you can opt to leave your current team instead.")
+            if self._team_ideas.get(team_id):
+                # ideas reference their team, a foreign key in HackathonSQLite
+                raise HackathonError('Some error occured, pls try later')
+
+            seq = self._commit('delete_team', team_id)
+        self._after_commit(seq)
+        return True
+
+    @traced()
+    def add_idea_to_team(self, username: str, idea_text: str) -> str:
+        with self._lock:
+            participant = self._participants.get(username)
+            if participant is None or participant[2] is None:
+                raise HackathonError("You must be in a team to add an idea. Hury and join a team soon!")
+
+            created_at = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime())
+            seq = self._commit('add_idea', str(uuid.uuid4()), participant[2], idea_text, username, created_at)
+        self._after_commit(seq)
+        return f"Your Idea {idea_text} is successfully added"
+
+    @traced()
+    def edit_idea(self, username: str, idea_id: str, new_idea_text: str) -> str:
+        with self._lock:
+            participant = self._participants.get(username)
+            idea = self._ideas.get(idea_id)
+            if participant is None or idea is None:
+                raise HackathonError("You don't have any idea kiddo to change, sad.")
+            if idea[0] != participant[2]:
+                raise HackathonError("You can only edit ideas for your own team. Got it?")
+
+            seq = self._commit('edit_idea', idea_id, new_idea_text)
+        self._after_commit(seq)
+        return "Idea updated successfully"
+
+    @traced()
+    def list_team_ideas(self, username: str) -> str:
+        with self._lock:
+            participant = self._participants.get(username)
+            team_id = participant[2] if participant else None
+            # newest first, and the last added first among ideas added within the same second
+            ideas = [self._ideas[idea_id] for idea_id in reversed(self._team_ideas.get(team_id, {}))]
+        ideas.sort(key=lambda idea: idea[3], reverse=True)
+        tracer.current_span().set_attribute("db.rows", len(ideas))
+        if not ideas:
+            return "Your team doesn't have any ideas yet. Get going!"
+
+        idea_list = "Your team's ideas:\n\n"
+        for idea in ideas:
+            idea_list += f"Idea: {idea[1]}\n\n"
+            idea_list += f"Created by: {idea[2]}\n\n"
+
+        return idea_list.strip()
+
+    def stats(self) -> dict:
+        return {"teams": len(self._teams), "participants": len(self._participants), "ideas": len(self._ideas),
+                "journal": self.journal.stats()}
+
+    def close(self):
+        if not hasattr(self, 'journal'):
+            return
+        self._roster_watcher_stop.set()
+        if self._compaction is not None:
+            self._compaction.join()
+        self.journal.close()
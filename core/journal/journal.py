@@ -0,0 +1,239 @@
+'''
+Append-only journal of JSON records next to a JSON snapshot, the persistence of an in-memory store.
+
+Every mutation is appended to journal.log as one JSON line [seq, op, args...]. Appends are batched into fsyncs:
+with fsync_interval 0 an append is durable once wait_durable(seq) returns, and all the appends written while an
+fsync was running share the next one (group commit). With fsync_interval > 0 appends don't wait, a background
+thread fsyncs every fsync_interval seconds and a crash loses at most that much.
+
+Once compact_after records were appended since the last snapshot, the store's state is written to snapshot.json
+and the log starts over. Startup loads the snapshot and replays the records after it.
+
+Usage:
+    journal = Journal("data/hackathon_journal")
+    state, records = journal.load()
+    seq = journal.append("join_team", team_id, username)
+    journal.wait_durable(seq)
+    if journal.should_compact():
+        seq = journal.start_compaction()  # under the lock ordering mutations, with a copy of the state
+        journal.write_snapshot(state_copy, seq)
+'''
+
+import json
+import logging
+import os
+import threading
+from typing import Any, List, Optional, Tuple
+
+logging.basicConfig()
+logging.getLogger().setLevel(os.environ.get("LOG_LEVEL", "INFO"))
+
+logger = logging.getLogger(__name__)
+
+
+class JournalCorruptedError(Exception):
+    '''
+    a record in the middle of the journal can't be read, a torn last record (crash while appending) is dropped instead
+    '''
+
+
+class Journal:
+    SNAPSHOT = "snapshot.json"
+    LOG = "journal.log"
+    # log being compacted into the snapshot, replayed after a crash in the middle of a compaction
+    COMPACTING_LOG = "journal.log.compacting"
+
+    def __init__(self, directory: str, fsync_interval: float = 0.0, compact_after: int = 10000):
+        self.directory = directory
+        self.fsync_interval = fsync_interval
+        self.compact_after = compact_after
+
+        self.seq = 0
+        self.records_since_snapshot = 0
+        self.fsyncs = 0
+        self.compactions = 0
+
+        self._synced_seq = 0
+        self._syncing = False
+        self._compacting = False
+        self._file = None
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def load(self) -> Tuple[Optional[Any], List[list]]:
+        '''
+        returns the snapshot state (None if there is none yet) and the records appended after it, as [op, args...].
+        The journal is open for appends afterwards
+        '''
+        state, snapshot_seq = None, 0
+        if os.path.exists(self._path(self.SNAPSHOT)):
+            with open(self._path(self.SNAPSHOT), 'r', encoding='utf-8') as f:
+                snapshot = json.load(f)
+            state, snapshot_seq = snapshot["state"], snapshot["seq"]
+
+        records = []
+        self.seq = snapshot_seq
+        for name in (self.COMPACTING_LOG, self.LOG):
+            for record in self._read_log(self._path(name)):
+                seq = record[0]
+                if seq > snapshot_seq:
+                    records.append(record[1:])
+                    self.seq = seq
+        logger.info("Journal %s loaded: snapshot at seq %d, %d records replayed", self.directory, snapshot_seq, len(records))
+
+        self._synced_seq = self.seq
+        self.records_since_snapshot = len(records)
+        self._file = open(self._path(self.LOG), 'a', encoding='utf-8')
+        if self.fsync_interval > 0:
+            threading.Thread(target=self._sync_periodically, name="journal-fsync", daemon=True).start()
+        return state, records
+
+    def _read_log(self, path: str) -> List[list]:
+        if not os.path.exists(path):
+            return []
+        records = []
+        with open(path, 'r+', encoding='utf-8') as f:
+            offset = 0
+            lines = f.readlines()
+            for i, line in enumerate(lines):
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    if i < len(lines) - 1:
+                        raise JournalCorruptedError(f"{path} line {i + 1} can't be read")
+                    logger.warning("Dropping the torn last record of %s", path)
+                    f.truncate(offset)
+                    break
+                offset += len(line.encode('utf-8'))
+        return records
+
+    def append(self, op: str, *args) -> int:
+        '''
+        writes a record and returns its seq. Records are replayed in the order they are appended, the caller
+        appends under the lock which orders its mutations
+        '''
+        with self._cond:
+            self.seq += 1
+            self.records_since_snapshot += 1
+            self._file.write(json.dumps([self.seq, op, *args], separators=(',', ':')) + "\n")
+            return self.seq
+
+    def wait_durable(self, seq: int):
+        '''
+        blocks until the record is fsynced, a no-op when fsyncs are periodic. The first waiter fsyncs for everyone
+        waiting, the ones coming in while it runs are covered by the next fsync
+        '''
+        if self.fsync_interval > 0:
+            return
+        with self._cond:
+            while self._synced_seq < seq:
+                if self._syncing:
+                    self._cond.wait()
+                else:
+                    self._sync_locked()
+
+    def _sync_locked(self):
+        self._syncing = True
+        try:
+            self._file.flush()
+            target, fd = self.seq, self._file.fileno()
+            self._cond.release()
+            try:
+                os.fsync(fd)
+            finally:
+                self._cond.acquire()
+            self._synced_seq = max(self._synced_seq, target)
+            self.fsyncs += 1
+        finally:
+            self._syncing = False
+            self._cond.notify_all()
+
+    def _sync_periodically(self):
+        while not self._stop.wait(self.fsync_interval):
+            with self._cond:
+                if self._file is None:
+                    return
+                if self._synced_seq < self.seq and not self._syncing:
+                    self._sync_locked()
+
+    def should_compact(self) -> bool:
+        return self.records_since_snapshot >= self.compact_after and not self._compacting
+
+    def start_compaction(self) -> Optional[int]:
+        '''
+        starts a new log and returns the seq the snapshot must be taken at, None if a compaction is running.
+        The caller holds the lock ordering its mutations, and takes a copy of its state before releasing it
+        '''
+        with self._cond:
+            if self._compacting:
+                return None
+            self._compacting = True
+            while self._syncing:
+                self._cond.wait()
+            # the current log is kept until the snapshot covering it is durable
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._synced_seq = self.seq
+            self._cond.notify_all()
+            self._file.close()
+            if os.path.exists(self._path(self.COMPACTING_LOG)):
+                # a previous compaction failed, its records aren't in a snapshot yet
+                with open(self._path(self.LOG), 'r', encoding='utf-8') as log, \
+                        open(self._path(self.COMPACTING_LOG), 'a', encoding='utf-8') as compacting:
+                    compacting.write(log.read())
+                    compacting.flush()
+                    os.fsync(compacting.fileno())
+                os.remove(self._path(self.LOG))
+            else:
+                os.replace(self._path(self.LOG), self._path(self.COMPACTING_LOG))
+            self._file = open(self._path(self.LOG), 'a', encoding='utf-8')
+            self.records_since_snapshot = 0
+            return self.seq
+
+    def write_snapshot(self, state: Any, seq: int):
+        '''
+        writes the state as of seq (see start_compaction), appends can go on meanwhile
+        '''
+        try:
+            tmp_path = self._path(self.SNAPSHOT + ".tmp")
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({"seq": seq, "state": state}, f, separators=(',', ':'))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self._path(self.SNAPSHOT))
+            self._fsync_directory()
+            os.remove(self._path(self.COMPACTING_LOG))
+            self.compactions += 1
+            logger.info("Journal %s compacted into a snapshot at seq %d", self.directory, seq)
+        except OSError as e:
+            logger.error("Journal %s compaction failed, it's retried later: %s", self.directory, e)
+        finally:
+            self._compacting = False
+
+    def _fsync_directory(self):
+        fd = os.open(self.directory, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def stats(self) -> dict:
+        return {"seq": self.seq, "records_since_snapshot": self.records_since_snapshot, "fsyncs": self.fsyncs,
+                "compactions": self.compactions}
+
+    def close(self):
+        self._stop.set()
+        with self._cond:
+            if self._file is None:
+                return
+            while self._syncing:
+                self._cond.wait()
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._synced_seq = self.seq
+            self._file.close()
+            self._file = None
@@ -0,0 +1,172 @@
+'''
+Prometheus metrics of the bot process. Metrics are always recorded (an observation costs about a microsecond),
+the /metrics endpoint is only served when METRICS_PORT is set.
+
+Counters and gauges which other components already keep (read cache and conversation store hits, worker
+queue depth...) are not duplicated, StatsCollector reads their stats() at scrape time.
+
+Usage:
+    with observe_mention(received_at):
+        ... record_action("join_team") ...
+
+    @timed(SQLITE_METHOD_SECONDS, method="create_team")
+    def create_team(...):
+        ...
+'''
+
+import contextvars
+import functools
+import logging
+import os
+import re
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional
+
+from prometheus_client import REGISTRY, Counter, Histogram, start_http_server
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+logging.basicConfig()
+logging.getLogger().setLevel(os.environ.get("LOG_LEVEL", "INFO"))
+
+logger = logging.getLogger(__name__)
+
+MENTION_SECONDS = Histogram(
+    "mrgorlomi_mention_seconds", "Time from receiving a mention to posting the reply, per action",
+    ["action"], buckets=(0.1, 0.25, 0.5, 1, 2, 3, 5, 8, 13, 20, 30, 60))
+LLM_REQUEST_SECONDS = Histogram(
+    "mrgorlomi_llm_request_seconds", "Latency of LLM requests",
+    ["model"], buckets=(0.25, 0.5, 1, 2, 3, 5, 8, 13, 20, 30, 60))
+LLM_TOKENS = Histogram(
+    "mrgorlomi_llm_tokens", "Tokens per LLM request, as reported by the API",
+    ["model", "kind"], buckets=(10, 50, 100, 250, 500, 1000, 2000, 4000, 8000, 16000))
+LLM_JSON_PARSE_FAILURES = Counter(
+    "mrgorlomi_llm_json_parse_failures", "LLM responses which were not valid JSON", ["model"])
+SQLITE_METHOD_SECONDS = Histogram(
+    "mrgorlomi_sqlite_method_seconds", "Latency of HackathonSQLite methods, including waiting for the writer thread",
+    ["method"], buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1))
+HACKATHON_ERRORS = Counter(
+    "mrgorlomi_hackathon_errors", "HackathonErrors returned to users, per action and error", ["action", "error"])
+
+_mention_action: "contextvars.ContextVar[Optional[list]]" = contextvars.ContextVar("mention_action", default=None)
+
+
+@contextmanager
+def observe_mention(received_at: float) -> Iterator[None]:
+    '''
+    records the time from received_at (time.monotonic()) until the with block is done in MENTION_SECONDS,
+    labelled with the action recorded meanwhile by record_action
+    '''
+    # a list, so that record_action can set it from a copy of the context, e.g in an executor thread
+    action = ["unknown"]
+    token = _mention_action.set(action)
+    try:
+        yield
+    finally:
+        _mention_action.reset(token)
+        MENTION_SECONDS.labels(action[0]).observe(time.monotonic() - received_at)
+
+
+def record_action(action: str):
+    mention_action = _mention_action.get()
+    if mention_action is not None:
+        mention_action[0] = action
+
+
+def error_label(message: str) -> str:
+    '''
+    HackathonError messages are fixed strings, except for numbers like the max team size
+    '''
+    return re.sub(r"\d+", "N", message)[:80]
+
+
+def timed(histogram: Histogram, **labels) -> Callable:
+    '''
+    decorator recording the duration of every call in the histogram
+    '''
+    def decorator(fn: Callable) -> Callable:
+        child = histogram.labels(**labels)
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                child.observe(time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+class StatsCollector:
+    '''
+    exposes the stats() of the bot's components at scrape time
+    '''
+
+    def __init__(self, conversations=None, read_cache=None, worker_pool=None, slack_events=None, llm_caller=None):
+        self.conversations = conversations
+        self.read_cache = read_cache
+        self.worker_pool = worker_pool
+        self.slack_events = slack_events
+        self.llm_caller = llm_caller
+
+    def collect(self):
+        if self.conversations is not None:
+            stats = self.conversations.stats()
+            yield GaugeMetricFamily("mrgorlomi_active_conversations", "Conversations held in memory", value=stats["entries"])
+            yield GaugeMetricFamily("mrgorlomi_conversation_store_bytes", "Approximate size of the conversations in memory",
+                                    value=stats["bytes"])
+            lookups = CounterMetricFamily("mrgorlomi_conversation_lookups", "Conversation lookups, hit if it was in memory",
+                                          labels=["result"])
+            lookups.add_metric(["hit"], stats["hits"])
+            lookups.add_metric(["miss"], stats["misses"])
+            yield lookups
+            yield CounterMetricFamily("mrgorlomi_conversation_evictions", "Conversations evicted from memory",
+                                      value=stats["evictions"])
+
+        if self.read_cache is not None:
+            stats = self.read_cache.stats()
+            lookups = CounterMetricFamily("mrgorlomi_read_cache_lookups", "DB read cache lookups", labels=["result"])
+            lookups.add_metric(["hit"], stats["hits"])
+            lookups.add_metric(["miss"], stats["misses"])
+            yield lookups
+
+        if self.worker_pool is not None:
+            stats = self.worker_pool.stats()
+            yield GaugeMetricFamily("mrgorlomi_worker_queue_depth", "Mentions waiting for a worker", value=stats["queue_depth"])
+            yield GaugeMetricFamily("mrgorlomi_worker_in_progress", "Mentions being processed", value=stats["in_progress"])
+            yield CounterMetricFamily("mrgorlomi_worker_rejected", "Mentions rejected because the queue was full",
+                                      value=stats["rejected"])
+
+        if self.slack_events is not None:
+            yield CounterMetricFamily("mrgorlomi_slack_duplicate_events", "Redelivered slack events dropped",
+                                      value=self.slack_events.stats()["duplicates_dropped"])
+
+        if self.llm_caller is not None:
+            stats = self.llm_caller.stats()
+            yield CounterMetricFamily("mrgorlomi_llm_attempts", "LLM request attempts, retries included", value=stats["attempts"])
+            yield CounterMetricFamily("mrgorlomi_llm_retries", "LLM attempts retried after a failure", value=stats["retries"])
+            yield CounterMetricFamily("mrgorlomi_llm_timeouts", "LLM attempts past their deadline", value=stats["timeouts"])
+            hedges = CounterMetricFamily("mrgorlomi_llm_hedges", "Hedged LLM attempts, won if the hedge answered first",
+                                         labels=["result"])
+            hedges.add_metric(["won"], stats["hedge_wins"])
+            hedges.add_metric(["lost"], stats["hedged"] - stats["hedge_wins"])
+            yield hedges
+            yield GaugeMetricFamily("mrgorlomi_llm_circuit_open", "1 while LLM calls are short circuited",
+                                    value=int(stats["circuit"]["state"] != "closed"))
+            yield CounterMetricFamily("mrgorlomi_llm_circuit_rejected", "LLM calls rejected by the open circuit",
+                                      value=stats["circuit"]["rejected"])
+
+
+def start_metrics_server_from_env(**stats_sources) -> bool:
+    '''
+    serves /metrics on METRICS_PORT, if set, along with the stats of the given components (see StatsCollector).
+    Returns whether the server was started
+    '''
+    port = os.environ.get("METRICS_PORT")
+    if not port:
+        return False
+    REGISTRY.register(StatsCollector(**stats_sources))
+    start_http_server(int(port), addr=os.environ.get("METRICS_ADDR", "0.0.0.0"))
+    logger.info('Serving metrics on port %s', port)
+    return True
@@ -0,0 +1,93 @@
+import logging
+import os
+import threading
+import time
+from typing import Optional
+
+from slack_sdk import WebClient
+from slack_sdk.errors import SlackApiError
+
+from core.tracing import tracer
+
+logging.basicConfig()
+logging.getLogger().setLevel(os.environ.get("LOG_LEVEL", "INFO"))
+
+logger = logging.getLogger(__name__)
+
+# appended to the reply while it's still being written, the final text never ends with it
+TYPING_INDICATOR = " :writing_hand:"
+
+
+class StreamingReply:
+    '''
+    A bot reply in a slack thread which is posted right away as a placeholder and then updated in place while
+    the LLM streams its message, at most once per min_update_interval (chat.update is rate limited per
+    channel). finish() replaces it with the final text, updates arriving after it are ignored.
+
+    Usage:
+        reply = StreamingReply(client, channel_id, thread_ts, prefix=f"<@{user_id}> ")
+        reply.start()
+        ... reply.update(message_so_far) ...
+        reply.finish(final_text)
+    '''
+
+    def __init__(self, client: WebClient, channel: str, thread_ts: str, prefix: str = "",
+                 placeholder: str = "Mamma mia, let me think", min_update_interval: float = 1.0):
+        self.client = client
+        self.channel = channel
+        self.thread_ts = thread_ts
+        self.prefix = prefix
+        self.placeholder = placeholder
+        self.min_update_interval = min_update_interval
+
+        self.ts: Optional[str] = None
+        self.updates = 0
+        self._last_update_at = 0.0
+        self._finished = False
+        # held while the message is updated, so that a partial text can't land after the final one
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, client: WebClient, channel: str, thread_ts: str, prefix: str = "") -> "StreamingReply":
+        return cls(client, channel, thread_ts, prefix,
+                   min_update_interval=float(os.environ.get("SLACK_STREAM_UPDATE_INTERVAL_SECONDS", "1.0")))
+
+    def start(self):
+        try:
+            with tracer.span("slack.chat_postMessage"):
+                response = self.client.chat_postMessage(channel=self.channel, thread_ts=self.thread_ts,
+                                                        text=f"{self.prefix}{self.placeholder}{TYPING_INDICATOR}")
+            self.ts = response["ts"]
+            self._last_update_at = time.monotonic()
+        except SlackApiError as e:
+            # the final text is posted as a new message instead
+            logger.error('Could not post placeholder reply: %s', e)
+
+    def update(self, text: str):
+        '''
+        shows the partial text, unless the message was updated less than min_update_interval ago
+        '''
+        with self._lock:
+            if self.ts is None or self._finished:
+                return
+            if time.monotonic() - self._last_update_at < self.min_update_interval:
+                return  # the next update or finish() shows it
+            self._last_update_at = time.monotonic()
+            self._update(f"{self.prefix}{text}{TYPING_INDICATOR}")
+
+    def finish(self, text: str):
+        with self._lock:
+            self._finished = True
+            if self.ts is None:
+                with tracer.span("slack.chat_postMessage"):
+                    self.client.chat_postMessage(channel=self.channel, thread_ts=self.thread_ts, text=f"{self.prefix}{text}")
+            else:
+                self._update(f"{self.prefix}{text}")
+
+    def _update(self, text: str):
+        try:
+            with tracer.span("slack.chat_update"):
+                self.client.chat_update(channel=self.channel, ts=self.ts, text=text)
+            self.updates += 1
+        except SlackApiError as e:
+            logger.error('Could not update reply %s: %s', self.ts, e)
@@ -1,101 +1,215 @@
 import sqlite3
-from typing import Dict, List, Tuple
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import pathlib
+import threading
+import time
 import uuid
 from core.hackathon_base import HackathonBase, HackathonError
+from core.helpers import format_teams, one_of
+from core.sqlite.migrations import migrate
+from core.sqlite.read_cache import VersionedReadCache
+from core.sqlite.roster_sync import ParticipantRosterSync
+from core.sqlite.writer import SQLiteWriter
+from core.team_name_index import TeamNameIndex
+from core.teammate_index import TeammateIndex
+from core.metrics import SQLITE_METHOD_SECONDS, timed
+from core.tracing import traced, tracer
 import logging
 import os
 import sys
-import csv
 
 logging.basicConfig()
 logging.getLogger().setLevel(os.environ.get("LOG_LEVEL", "INFO"))
 
 logger = logging.getLogger(__name__)
 
-init_script = """
-CREATE TABLE if not exists teams (
-    team_id TEXT PRIMARY KEY,
-    team_name TEXT UNIQUE NOT NULL CHECK(length(team_name) <= 100),
-    captain_username TEXT UNIQUE NOT NULL,
-    FOREIGN KEY (captain_username) REFERENCES participants(username)
-);
-
-CREATE TABLE IF NOT EXISTS ideas (
-    idea_id TEXT PRIMARY KEY,
-    team_id TEXT NOT NULL,
-    idea_text TEXT NOT NULL,
-    created_by TEXT NOT NULL,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    FOREIGN KEY (team_id) REFERENCES teams(team_id),
-    FOREIGN KEY (created_by) REFERENCES participants(username)
-);
-
-CREATE TABLE if not exists participants (
-    username TEXT PRIMARY KEY,
-    full_name TEXT,
-    bio TEXT,
-    team_id TEXT,
-    FOREIGN KEY (team_id) REFERENCES teams(team_id)
-);
-
--- Create a view to count team members
-CREATE VIEW if not exists team_member_count AS
-SELECT team_id, COUNT(*) as member_count
-FROM participants
-WHERE team_id IS NOT NULL
-GROUP BY team_id;
-
--- Create a trigger to enforce the 5-member limit
-CREATE TRIGGER if not exists enforce_team_size
-BEFORE INSERT ON participants
-FOR EACH ROW
-WHEN NEW.team_id IS NOT NULL
-BEGIN
-    SELECT RAISE(ABORT, 'Team already has the maximum of 5 members')
-    WHERE (
-        SELECT member_count 
-        FROM team_member_count 
-        WHERE team_id = NEW.team_id
-    ) >= 5;
-END;
-"""
+
+def usage_day() -> str:
+    '''
+    the UTC day token usage is accounted under, e.g "2024-09-12"
+    '''
+    return time.strftime("%Y-%m-%d", time.gmtime())
+
+
+def instrumented(fn: Callable) -> Callable:
+    '''
+    traces every call of a HackathonSQLite method and records its latency
+    '''
+    return traced()(timed(SQLITE_METHOD_SECONDS, method=fn.__name__)(fn))
 
 
 class HackathonSQLite(HackathonBase):
-    def __init__(self):
+    def __init__(self, sqlite_db_filepath: str = "data/hackathon_data.db", participants_csv_filepath: str = "data/participants.csv",
+                 writer_batch_size: int = 32, max_team_size: Optional[int] = None, read_cache_max_entries: int = 1024):
+
+        self.sqlite_db_filepath = sqlite_db_filepath
+        self.participants_csv_filepath = participants_csv_filepath
 
-        self.sqlite_db_filepath = "data/hackathon_data.db"
-        self.participants_csv_filepath = "data/participants.csv"
+        # all writes go through a single writer connection owned by the writer thread, in WAL mode
+        # readers don't block on it. Reads use read-only connections, one per thread (sqlite3 connections
+        # can't be shared across threads), all of them are tracked so that they can be closed together
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
 
         # ensure DB schema is setup
-        self.conn = sqlite3.connect(self.sqlite_db_filepath)
-        self.conn.execute("PRAGMA foreign_keys = ON")
-        self.conn.executescript(init_script)
-        self.cursor = self.conn.cursor()
+        writer_conn = sqlite3.connect(self.sqlite_db_filepath, check_same_thread=False)
+        writer_conn.execute("PRAGMA journal_mode = WAL")
+        writer_conn.execute("PRAGMA synchronous = NORMAL")
+        writer_conn.execute("PRAGMA foreign_keys = ON")
+        migrate(writer_conn)
+        # reads are cached until the next committed mutation
+        self.read_cache = VersionedReadCache(max_entries=read_cache_max_entries)
+        # team names a user asks for are resolved with this index, it's updated by the commands changing team names
+        self.team_names = TeamNameIndex()
+        self._load_team_names(writer_conn.cursor())
+        # bios of participants and who is unassigned, for recommend_teammates. Loaded with the participants below
+        self.teammates = TeammateIndex()
+        # both indexes are updated by the commands on the writer thread, before their group commit, so that a later
+        # command of the same batch resolves a team created by an earlier one. Readers can see a change a few ms
+        # before it's committed, and if the commit fails on_rollback reloads both indexes from the DB
+        self.writer = SQLiteWriter(writer_conn, max_batch_size=writer_batch_size, on_commit=self.read_cache.bump_version,
+                                   on_rollback=self._load_indexes)
+
+        # team size limit is a setting of the hackathon stored in the DB, it can be overridden at startup
+        if max_team_size is None and os.environ.get("MAX_TEAM_SIZE"):
+            max_team_size = int(os.environ["MAX_TEAM_SIZE"])
+        if max_team_size is not None:
+            self._write(self._set_setting, 'max_team_size', str(max_team_size))
+        self.max_team_size = int(self.get_setting('max_team_size'))
 
         if os.path.getsize(self.sqlite_db_filepath) == 0 or  os.path.getsize(self.participants_csv_filepath) == 0:
             logger.error("Filepaths provided are either empty or does not exist.")
             sys.exit(1)
 
-        with open(self.participants_csv_filepath, 'r', newline='', encoding='utf-8') as csvfile :
-            csvreader = csv.DictReader(csvfile)
-            to_insert = []
-            
-            p_map = {}
-            # loop and prepare data
-            for i, row in enumerate(csvreader):
-                to_insert.append((row['username'], row['full_name'], row['bio']))
-                p_map[row['username']] = {'full_name': row['full_name'], 'bio': row['bio']}
-            
-            # insert if not already present
-            self.conn.executemany("""
-                INSERT OR IGNORE INTO participants (username, full_name, bio) VALUES (?, ?, ?)
-                """, to_insert)
-            self.conn.commit()
+        # load participants, the CSV is only diffed against the DB when it has changed since last sync
+        self.roster_sync = ParticipantRosterSync(self.participants_csv_filepath)
+        self._roster_lock = threading.Lock()
+        self._roster_watcher_stop = threading.Event()
+        self.participants_map: Dict[str, Dict] = {}
+        self.reload_participants(full_reload=True)
+
+    def _connect(self) -> sqlite3.Connection:
+        # check_same_thread is off only so that close() can be called from any thread,
+        # each connection is still used by the thread which opened it
+        db_uri = pathlib.Path(self.sqlite_db_filepath).absolute().as_uri() + "?mode=ro"
+        conn = sqlite3.connect(db_uri, uri=True, check_same_thread=False)
+        with self._connections_lock:
+            self._connections.append(conn)
+        return conn
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        '''
+        read-only connection of the current thread
+        '''
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    @property
+    def cursor(self) -> sqlite3.Cursor:
+        cursor = getattr(self._local, 'cursor', None)
+        if cursor is None:
+            cursor = self._local.cursor = self.conn.cursor()
+        return cursor
+
+    def _write(self, command: Callable[..., Any], *args, notify: bool = True) -> Any:
+        '''
+        runs the command (a function taking a cursor) on the writer thread and returns its result once committed.
+        Unless notify is off, its changes bump the data version
+        '''
+        try:
+            return self.writer.execute(command, *args, notify=notify)
+        except sqlite3.Error as e:
+            logger.error(e)
+            raise HackathonError('Some error occured, pls try later')
+
+    def _load_team_names(self, cursor: sqlite3.Cursor):
+        cursor.execute("SELECT team_id, team_name FROM teams")
+        self.team_names.rebuild(cursor.fetchall())
+
+    def _load_indexes(self, cursor: sqlite3.Cursor):
+        # the commands of a rolled back batch may have updated the indexes already
+        self._load_team_names(cursor)
+        self._load_teammates(cursor)
 
-            # set the participants map in memory
-            self.participants_map = p_map 
+    def _load_teammates(self, cursor: sqlite3.Cursor):
+        cursor.execute("SELECT username, bio, team_id FROM participants")
+        self.teammates.rebuild(cursor.fetchall())
 
+    @property
+    def data_version(self) -> int:
+        '''
+        increases with every committed mutation
+        '''
+        return self.read_cache.version
+
+    def get_setting(self, key: str) -> Optional[str]:
+        self.cursor.execute("SELECT value FROM hackathon_settings WHERE key = ?", (key,))
+        setting = self.cursor.fetchone()
+        return setting[0] if setting else None
+
+    def _set_setting(self, cursor: sqlite3.Cursor, key: str, value: str):
+        cursor.execute("INSERT OR REPLACE INTO hackathon_settings (key, value) VALUES (?, ?)", (key, value))
+
+    @instrumented
+    def reload_participants(self, full_reload: bool = False) -> bool:
+        '''
+        syncs the participants table with the CSV and swaps the in-memory participants map.
+        returns True if anything has changed
+        '''
+        with self._roster_lock:
+            diff = self._write(self._sync_roster, full_reload)
+            if full_reload:
+                p_map = {
+                    username: {'full_name': full_name, 'bio': bio}
+                    for username, full_name, bio in self.cursor.execute("SELECT username, full_name, bio FROM participants")
+                }
+            elif diff is None or diff.is_empty():
+                return False
+            else:
+                p_map = dict(self.participants_map)
+                for username, full_name, bio in diff.inserts:
+                    p_map[username] = {'full_name': full_name, 'bio': bio}
+                for full_name, bio, username in diff.updates:
+                    p_map[username] = {'full_name': full_name, 'bio': bio}
+                for username in diff.deletes:
+                    p_map.pop(username, None)
+
+            # readers keep using the old map until this single assignment swaps it
+            self.participants_map = p_map
+            return True
+
+    def _sync_roster(self, cursor: sqlite3.Cursor, full_reload: bool):
+        diff = self.roster_sync.sync(cursor)
+        if full_reload:
+            self._load_teammates(cursor)
+        elif diff is not None:
+            for username, _, bio in diff.inserts:
+                self.teammates.upsert(username, bio)
+            for _, bio, username in diff.updates:
+                self.teammates.upsert(username, bio)
+            for username in diff.deletes:
+                self.teammates.remove(username)
+        return diff
+
+    def watch_participants(self, interval_seconds: float):
+        '''
+        starts a daemon thread which reloads participants whenever the CSV changes, so that
+        names and bios can be updated without restarting the bot
+        '''
+        def watch():
+            while not self._roster_watcher_stop.wait(interval_seconds):
+                try:
+                    self.reload_participants()
+                except Exception as e:
+                    logger.error('participants reload failed: %s', e)
+
+        threading.Thread(target=watch, name="participants-watcher", daemon=True).start()
+
+    @instrumented
     def get_participant_details(self, username: str) -> Tuple[bool, str, str]:
         '''
         returns a tuple of (bool, str, str) which signifies user attributes is_participant, full_name, bio
@@ -104,26 +218,30 @@ class HackathonSQLite(HackathonBase):
             return False, "", ""
         return True, self.participants_map[username].get('full_name'), self.participants_map[username].get('bio')
 
+    @instrumented
     def create_team(self, team_name: str, captain_username: str) -> Tuple[str, str]:
         if len(team_name) > 100:
             raise HackathonError("Team name must be 100 characters or less.")
 
+        return self._write(self._create_team, team_name, captain_username)
+
+    def _create_team(self, cursor: sqlite3.Cursor, team_name: str, captain_username: str) -> Tuple[str, str]:
         try:
             # Check if the captain already has a team
-            self.cursor.execute("SELECT team_id FROM teams WHERE captain_username = ?", (captain_username,))
-            existing_team = self.cursor.fetchone()
+            cursor.execute("SELECT team_id FROM teams WHERE captain_username = ?", (captain_username,))
+            existing_team = cursor.fetchone()
             if existing_team:
                 raise HackathonError("User can only create one team. Delete the old team first.")
 
             team_id = str(uuid.uuid4())
-            self.cursor.execute("INSERT INTO teams (team_id, team_name, captain_username) VALUES (?, ?, ?)",
-                                (team_id, team_name, captain_username))
-            self.cursor.execute("UPDATE participants SET team_id = ? WHERE username = ?",
-                                (team_id, captain_username))
-            self.conn.commit()
+            cursor.execute("INSERT INTO teams (team_id, team_name, captain_username) VALUES (?, ?, ?)",
+                           (team_id, team_name, captain_username))
+            cursor.execute("UPDATE participants SET team_id = ? WHERE username = ?",
+                           (team_id, captain_username))
+            self.team_names.add(team_id, team_name)
+            self.teammates.set_team(captain_username, team_id)
             return team_name, team_id
         except sqlite3.IntegrityError as e:
-            self.conn.rollback()
             if "UNIQUE constraint failed: teams.team_name" in str(e):
                 raise HackathonError("Team name already exists.")
             elif "UNIQUE constraint failed: teams.captain_username" in str(e):
@@ -131,21 +249,24 @@ class HackathonSQLite(HackathonBase):
             else:
                 raise HackathonError('Some error occured, pls try later')
         except sqlite3.Error as e:
-            self.conn.rollback()
             raise HackathonError('Some error occured, pls try later')
 
+    @instrumented
     def rename_my_team(self, new_team_name: str, username: str, ) -> Tuple[str, str]:
         if len(new_team_name) > 100:
             raise HackathonError("New team name must be 100 characters or less.")
 
+        return self._write(self._rename_my_team, new_team_name, username)
+
+    def _rename_my_team(self, cursor: sqlite3.Cursor, new_team_name: str, username: str) -> Tuple[str, str]:
         try:
             # First, find the team where the user is the captain
-            self.cursor.execute("""
+            cursor.execute("""
                 SELECT team_id, team_name FROM teams 
                 WHERE captain_username = ?
             """, (username,))
             
-            team = self.cursor.fetchone()
+            team = cursor.fetchone()
             
             if not team:
                 raise HackathonError("You are not a captain of any team. Only team captain can rename team")
@@ -153,15 +274,18 @@ class HackathonSQLite(HackathonBase):
             team_id, old_team_name = team
 
             # Rename the team
-            self.cursor.execute("UPDATE teams SET team_name = ? WHERE team_id = ?", (new_team_name, team_id))
-            self.conn.commit()
+            cursor.execute("UPDATE teams SET team_name = ? WHERE team_id = ?", (new_team_name, team_id))
+            self.team_names.add(team_id, new_team_name)
             return new_team_name, team_id
         except sqlite3.Error as e:
-            self.conn.rollback()
             logger.error(e)
             raise HackathonError('Some error occured, pls try again.')
 
+    @instrumented
     def list_my_team(self, username: str) -> str:
+        return self.read_cache.get_or_compute(('list_my_team', username), lambda: self._list_my_team(username))
+
+    def _list_my_team(self, username: str) -> str:
         try:
             self.cursor.execute("""
                 SELECT
@@ -173,6 +297,7 @@ class HackathonSQLite(HackathonBase):
                 WHERE t.team_id = (SELECT team_id FROM participants WHERE username = ?)
             """, (username,))
             rows = self.cursor.fetchall()
+            tracer.current_span().set_attribute("db.rows", len(rows))
             
             if not rows:
                 return "You are not in any team."
@@ -187,70 +312,96 @@ class HackathonSQLite(HackathonBase):
                 "members": members
             }]
 
-            return self.__get_formatted_list_team_text(team_info, my_team=True)
+            return format_teams(team_info, my_team=True)
         except sqlite3.Error as e:
             raise HackathonError('Some error occurred, please try later')
 
-    def join_team(self, team_name: str, username: str) -> bool:
+    @instrumented
+    def join_team(self, team_name: str, username: str) -> str:
+        '''
+        returns the name of the team joined, which can differ from team_name in case, punctuation or a typo
+        '''
+        return self._write(self._join_team, team_name, username)
+
+    def _join_team(self, cursor: sqlite3.Cursor, team_name: str, username: str) -> str:
         try:
+            # exact name first, then the only name containing it, then the only close enough name
+            match, suggestions = self.team_names.resolve(team_name)
+            tracer.current_span().set_attribute("hackathon.team_name_matched", match is not None)
+            if match is None:
+                self._raise_if_in_team(cursor, username)
+                if suggestions:
+                    raise HackathonError(f"No team named {team_name}, did you mean {one_of(suggestions)}?")
+                raise HackathonError("No matching team found.")
 
-            # Check if the user is already in a team
-            self.cursor.execute("SELECT team_id FROM participants WHERE username = ?", (username,))
-            existing_team = self.cursor.fetchone()
-            if existing_team and existing_team[0] is not None:
-                raise HackathonError("You are already in a team. Either leave/delete your team first.")
+            team_id, matched_team_name = match
+
+            # join only if user is not in any team and the team has room, in one statement.
+            # member_count is maintained by triggers on participants
+            cursor.execute("""
+                UPDATE participants SET team_id = ?
+                WHERE username = ?
+                    AND team_id IS NULL
+                    AND (SELECT member_count FROM teams WHERE team_id = ?) < ?
+            """, (team_id, username, team_id, self.max_team_size))
+
+            if cursor.rowcount == 0:
+                # not updated: not a participant, already in a team, or the team is full
+                cursor.execute("SELECT 1 FROM participants WHERE username = ?", (username,))
+                if cursor.fetchone() is None:
+                    raise HackathonError("You are not a registered participant of the hackathon.")
+                self._raise_if_in_team(cursor, username)
+                raise HackathonError(f"Team already has the maximum of {self.max_team_size} members.")
+
+            self.teammates.set_team(username, team_id)
+            return matched_team_name
+        except sqlite3.Error as e:
+            raise HackathonError('Some error occured, pls try later')
 
-            # Use LOWER and LIKE for case-insensitive, partial matching of team name
-            self.cursor.execute("""
-                SELECT team_id FROM teams 
-                WHERE LOWER(team_name) LIKE LOWER(?)
-            """, (f"%{team_name}%",))
-            
-            team_results = self.cursor.fetchall()
-            if not team_results:
-                raise HackathonError("No matching team found.")
-            elif len(team_results) > 1:
-                raise HackathonError("Multiple matching teams found. Please provide a more specific team name.")
+    def _raise_if_in_team(self, cursor: sqlite3.Cursor, username: str):
+        cursor.execute("SELECT team_id FROM participants WHERE username = ?", (username,))
+        existing_team = cursor.fetchone()
+        if existing_team and existing_team[0] is not None:
+            raise HackathonError("You are already in a team. Either leave/delete your team first.")
 
-            team_id = team_results[0][0]
+    @instrumented
+    def get_teams(self) -> List[Dict]:
+        '''
+        returns all teams as dicts of team_name, captain and members. The list is shared with the read cache, don't modify it
+        '''
+        return self.read_cache.get_or_compute(('list_teams',), self._list_teams)[0]
 
-            # Check if the team has less than 5 members
-            if self._get_team_size(team_id) >= 5:
-                raise HackathonError("Team already has the maximum of 5 members.")
+    @instrumented
+    def get_team(self, team_id: str) -> Optional[Dict]:
+        return self.read_cache.get_or_compute(('get_team', team_id), lambda: self._get_team(team_id))
 
-            self.cursor.execute("UPDATE participants SET team_id = ? WHERE username = ?",
-                                (team_id, username))
+    def _get_team(self, team_id: str) -> Optional[Dict]:
+        try:
+            self.cursor.execute("""
+                SELECT
+                    t.team_name,
+                    (SELECT full_name FROM participants WHERE username = t.captain_username) as captain,
+                    p.full_name
+                FROM teams t
+                LEFT JOIN participants p ON t.team_id = p.team_id
+                WHERE t.team_id = ?
+            """, (team_id,))
+            rows = self.cursor.fetchall()
+            tracer.current_span().set_attribute("db.rows", len(rows))
+            if not rows:
+                return None
 
-            self.conn.commit()
-            return True
+            team_name, captain = rows[0][0], rows[0][1]
+            return {"team_name": team_name, "captain": captain,
+                    "members": [row[2] for row in rows if row[2] and row[2] != captain]}
         except sqlite3.Error as e:
-            self.conn.rollback()
             raise HackathonError('Some error occured, pls try later')
 
-    def _get_team_size(self, team_id: str) -> int:
-        self.cursor.execute("SELECT COUNT(*) FROM participants WHERE team_id = ?", (team_id,))
-        return self.cursor.fetchone()[0]
-
-    def __get_formatted_list_team_text(self, teams: List[Dict], my_team: bool) -> str:
-        if not teams:
-            return "No teams found."
-        message = "Here are the details of all the teams that have been registered:\n\n" if not my_team else "Here is the detail of your team:\n\n"
-        for i, team in enumerate(teams, 1):
-            message += f"{i}. Team: {team['team_name']}\n \n"
-            message += f"   Captain: {team['captain']}\n \n"
-            
-            if team['members']:
-                message += "   Members:\n"
-                for j, member in enumerate(team['members'], 1):
-                    message += f"     {j}. {member}\n"
-            else:
-                message += "   No additional members.\n"
-            
-            message += "\n\n"  # Add an extra newline for spacing between teams
-
-        return message.strip()  # Remove trailing newline
-
+    @instrumented
     def list_teams(self) -> str:
+        return self.read_cache.get_or_compute(('list_teams',), self._list_teams)[1]
+
+    def _list_teams(self) -> Tuple[List[Dict], str]:
         try:
             self.cursor.execute("""
                 SELECT
@@ -261,6 +412,7 @@ class HackathonSQLite(HackathonBase):
                 LEFT JOIN participants p ON t.team_id = p.team_id
             """)
             rows = self.cursor.fetchall()
+            tracer.current_span().set_attribute("db.rows", len(rows))
             
             teams = {}
             for row in rows:
@@ -271,45 +423,77 @@ class HackathonSQLite(HackathonBase):
                     teams[team_name]["members"].append(member)
             
             team_list = [{"team_name": k, **v} for k, v in teams.items()]
-            return self.__get_formatted_list_team_text(team_list, my_team=False)
+            return team_list, format_teams(team_list, my_team=False)
         except sqlite3.Error as e:
             raise HackathonError('Some error occured, pls try later')
 
+    @instrumented
     def get_unassigned_participants(self) -> List[str]:
+        return list(self.read_cache.get_or_compute(('get_unassigned_participants',), self._get_unassigned_participants))
+
+    def _get_unassigned_participants(self) -> Tuple[str, ...]:
         try:
             self.cursor.execute("SELECT full_name FROM participants WHERE team_id IS NULL")
-            return [row[0] for row in self.cursor.fetchall()]
+            rows = self.cursor.fetchall()
+            tracer.current_span().set_attribute("db.rows", len(rows))
+            return tuple(row[0] for row in rows)
+        except sqlite3.Error as e:
+            raise HackathonError('Some error occured, pls try later')
+
+    @instrumented
+    def count_unassigned_participants(self) -> int:
+        return self.read_cache.get_or_compute(('count_unassigned_participants',), self._count_unassigned_participants)
+
+    def _count_unassigned_participants(self) -> int:
+        try:
+            self.cursor.execute("SELECT COUNT(*) FROM participants WHERE team_id IS NULL")
+            return self.cursor.fetchone()[0]
         except sqlite3.Error as e:
             raise HackathonError('Some error occured, pls try later')
 
+    @instrumented
+    def recommend_teammates(self, username: str, k: int = 5) -> List[Tuple[str, List[str]]]:
+        recommendations = self.teammates.recommend(username, k)
+        tracer.current_span().set_attribute("db.rows", len(recommendations))
+        participants_map = self.participants_map
+        return [(participants_map.get(recommendation.username, {}).get('full_name', recommendation.username),
+                 recommendation.terms) for recommendation in recommendations]
+
+    @instrumented
     def leave_current_team(self, username: str) -> bool:
+        return self._write(self._leave_current_team, username)
+
+    def _leave_current_team(self, cursor: sqlite3.Cursor, username: str) -> bool:
         try:
-            self.cursor.execute("SELECT team_id FROM participants WHERE username = ?", (username,))
-            team = self.cursor.fetchone()
+            cursor.execute("SELECT team_id FROM participants WHERE username = ?", (username,))
+            team = cursor.fetchone()
             if not team or team[0] is None:
                 raise HackathonError("You are not a member in any team.")
 
             team_id = team[0]
 
             # Check if the user is the team captain
-            self.cursor.execute("SELECT captain_username FROM teams WHERE team_id = ?", (team_id,))
-            captain = self.cursor.fetchone()
+            cursor.execute("SELECT captain_username FROM teams WHERE team_id = ?", (team_id,))
+            captain = cursor.fetchone()
             if captain and captain[0] == username:
                 raise HackathonError("Team captain cannot leave the team. Delete your team instead.")
 
             # Remove the user from the team
-            self.cursor.execute("UPDATE participants SET team_id = NULL WHERE username = ?", (username,))
-            
-            self.conn.commit()
+            cursor.execute("UPDATE participants SET team_id = NULL WHERE username = ?", (username,))
+            self.teammates.set_team(username, None)
+
             return True
         except sqlite3.Error as e:
-            self.conn.rollback()
             raise HackathonError('Some error occured, pls try later')
 
+    @instrumented
     def delete_my_team(self, username: str) -> bool:
+        return self._write(self._delete_my_team, username)
+
+    def _delete_my_team(self, cursor: sqlite3.Cursor, username: str) -> bool:
         try:
-            self.cursor.execute("SELECT team_id, captain_username FROM teams WHERE captain_username = ?", (username,))
-            team = self.cursor.fetchone()
+            cursor.execute("SELECT team_id, captain_username FROM teams WHERE captain_username = ?", (username,))
+            team = cursor.fetchone()
             if not team:
                 raise HackathonError("Your team does not exist i.e you are not a captain of any team. If you're member in any team, you can opt to leave your current team instead.")
             
@@ -319,50 +503,56 @@ class HackathonSQLite(HackathonBase):
                 raise HackathonError("Only the team captain can delete the team.")
 
             # Remove all members from the team
-            self.cursor.execute("UPDATE participants SET team_id = NULL WHERE team_id = ?", (team_id,))
+            cursor.execute("UPDATE participants SET team_id = NULL WHERE team_id = ?", (team_id,))
             
             # Delete the team
-            self.cursor.execute("DELETE FROM teams WHERE team_id = ?", (team_id,))
-            
-            self.conn.commit()
+            cursor.execute("DELETE FROM teams WHERE team_id = ?", (team_id,))
+            self.team_names.remove(team_id)
+            self.teammates.remove_team(team_id)
+
             return True
         except sqlite3.Error as e:
-            self.conn.rollback()
             raise HackathonError('Some error occured, pls try later')
 
+    @instrumented
     def add_idea_to_team(self, username: str, idea_text: str) -> str:
+        return self._write(self._add_idea_to_team, username, idea_text)
+
+    def _add_idea_to_team(self, cursor: sqlite3.Cursor, username: str, idea_text: str) -> str:
         try:
             # Check if the user is in a team
-            self.cursor.execute("SELECT team_id FROM participants WHERE username = ?", (username,))
-            user_team = self.cursor.fetchone()
+            cursor.execute("SELECT team_id FROM participants WHERE username = ?", (username,))
+            user_team = cursor.fetchone()
             if not user_team or user_team[0] is None:
                 raise HackathonError("You must be in a team to add an idea. Hury and join a team soon!")
 
             team_id = user_team[0]
             idea_id = str(uuid.uuid4())
 
-            self.cursor.execute("""
+            cursor.execute("""
                 INSERT INTO ideas (idea_id, team_id, idea_text, created_by)
                 VALUES (?, ?, ?, ?)
             """, (idea_id, team_id, idea_text, username))
 
-            self.conn.commit()
             return f"Your Idea {idea_text} is successfully added"
         except sqlite3.Error as e:
-            self.conn.rollback()
             raise HackathonError('Some error occured, pls try later')
 
+    @instrumented
     def edit_idea(self, username: str, idea_id: str, new_idea_text: str) -> str:
+        return self._write(self._edit_idea, username, idea_id, new_idea_text)
+
+    def _edit_idea(self, cursor: sqlite3.Cursor, username: str, idea_id: str, new_idea_text: str) -> str:
         try:
             # Check if the idea exists and belongs to the user's team
-            self.cursor.execute("""
+            cursor.execute("""
                 SELECT i.team_id, i.created_by, p.team_id
                 FROM ideas i
                 JOIN participants p ON p.username = ?
                 WHERE i.idea_id = ?
             """, (username, idea_id))
 
-            result = self.cursor.fetchone()
+            result = cursor.fetchone()
             if not result:
                 raise HackathonError("You don't have any idea kiddo to change, sad.")
 
@@ -370,18 +560,17 @@ class HackathonSQLite(HackathonBase):
             if idea_team_id != user_team_id:
                 raise HackathonError("You can only edit ideas for your own team. Got it?")
 
-            self.cursor.execute("""
+            cursor.execute("""
                 UPDATE ideas
                 SET idea_text = ?
                 WHERE idea_id = ?
             """, (new_idea_text, idea_id))
 
-            self.conn.commit()
             return "Idea updated successfully"
         except sqlite3.Error as e:
-            self.conn.rollback()
             raise HackathonError('Some error occured, pls try later')
 
+    @instrumented
     def list_team_ideas(self, username: str) -> str:
         try:
             self.cursor.execute("""
@@ -393,6 +582,7 @@ class HackathonSQLite(HackathonBase):
             """, (username,))
 
             ideas = self.cursor.fetchall()
+            tracer.current_span().set_attribute("db.rows", len(ideas))
             if not ideas:
                 return "Your team doesn't have any ideas yet. Get going!"
 
@@ -405,8 +595,151 @@ class HackathonSQLite(HackathonBase):
         except sqlite3.Error as e:
             raise HackathonError('Some error occured, pls try later')
 
-    def __del__(self):
+    @instrumented
+    def get_conversation_messages(self, conversation_id: str) -> List[Tuple[str, str]]:
+        '''
+        returns the persisted message history of a conversation as (message_type, content) tuples, oldest first
+        '''
         try:
-            self.cursor.close()
+            self.cursor.execute("""
+                SELECT message_type, content FROM conversation_messages
+                WHERE conversation_id = ?
+                ORDER BY seq
+            """, (conversation_id,))
+            messages = self.cursor.fetchall()
+            tracer.current_span().set_attribute("db.rows", len(messages))
+            return messages
         except sqlite3.Error as e:
-            logger.error(e)
+            raise HackathonError('Some error occured, pls try later')
+
+    @instrumented
+    def append_conversation_messages(self, conversation_id: str, start_seq: int, messages: List[Tuple[str, str]]):
+        '''
+        persists (message_type, content) messages of a conversation, numbered from start_seq onwards
+        '''
+        # conversation history is not part of the cached reads, no need to invalidate them
+        self._write(self._append_conversation_messages, conversation_id, start_seq, messages, notify=False)
+
+    def _append_conversation_messages(self, cursor: sqlite3.Cursor, conversation_id: str, start_seq: int, messages: List[Tuple[str, str]]):
+        cursor.executemany("""
+            INSERT OR REPLACE INTO conversation_messages (conversation_id, seq, message_type, content)
+            VALUES (?, ?, ?, ?)
+        """, [(conversation_id, start_seq + i, message_type, content) for i, (message_type, content) in enumerate(messages)])
+
+    @instrumented
+    def claim_slack_event(self, event_keys: List[str], ttl_seconds: float) -> bool:
+        '''
+        records the idempotency keys (event_id, client_msg_id) of a slack event.
+        Returns False if any of them was already recorded within the last ttl_seconds, i.e the event is a retry
+        '''
+        return self._write(self._claim_slack_event, event_keys, ttl_seconds, notify=False)
+
+    def _claim_slack_event(self, cursor: sqlite3.Cursor, event_keys: List[str], ttl_seconds: float) -> bool:
+        now = time.time()
+        cursor.execute("DELETE FROM processed_slack_events WHERE received_at < ?", (now - ttl_seconds,))
+        # the single writer thread runs this, nothing can record the same keys in between the check and the insert
+        placeholders = ", ".join("?" * len(event_keys))
+        cursor.execute(f"SELECT 1 FROM processed_slack_events WHERE event_key IN ({placeholders}) LIMIT 1", event_keys)
+        if cursor.fetchone() is not None:
+            return False
+        cursor.executemany("INSERT INTO processed_slack_events (event_key, received_at) VALUES (?, ?)",
+                           [(event_key, now) for event_key in event_keys])
+        return True
+
+    @instrumented
+    def record_token_usage(self, username: str, conversation_id: Optional[str], model: str, prompt_tokens: int,
+                           completion_tokens: int, estimated: bool = False):
+        '''
+        adds the tokens of an LLM call to the ledger, under the current UTC day
+        '''
+        # the ledger is not part of the cached reads, no need to invalidate them
+        self._write(self._record_token_usage, username, conversation_id, usage_day(), model, prompt_tokens,
+                    completion_tokens, estimated, notify=False)
+
+    def _record_token_usage(self, cursor: sqlite3.Cursor, username: str, conversation_id: Optional[str], day: str, model: str,
+                            prompt_tokens: int, completion_tokens: int, estimated: bool):
+        cursor.execute("""
+            INSERT INTO token_usage (username, conversation_id, day, model, prompt_tokens, completion_tokens, estimated)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, (username, conversation_id, day, model, prompt_tokens, completion_tokens, int(estimated)))
+
+    @instrumented
+    def get_user_token_usage(self, username: str, day: Optional[str] = None) -> Tuple[int, int]:
+        '''
+        returns the (prompt_tokens, completion_tokens) used by the user on a UTC day, today by default
+        '''
+        try:
+            self.cursor.execute("""
+                SELECT COALESCE(SUM(prompt_tokens), 0), COALESCE(SUM(completion_tokens), 0) FROM token_usage
+                WHERE day = ? AND username = ?
+            """, (day or usage_day(), username))
+            return self.cursor.fetchone()
+        except sqlite3.Error as e:
+            raise HackathonError('Some error occured, pls try later')
+
+    @instrumented
+    def get_conversation_token_usage(self, conversation_id: str) -> Tuple[int, int]:
+        '''
+        returns the (prompt_tokens, completion_tokens) used by a conversation so far
+        '''
+        try:
+            self.cursor.execute("""
+                SELECT COALESCE(SUM(prompt_tokens), 0), COALESCE(SUM(completion_tokens), 0) FROM token_usage
+                WHERE conversation_id = ?
+            """, (conversation_id,))
+            return self.cursor.fetchone()
+        except sqlite3.Error as e:
+            raise HackathonError('Some error occured, pls try later')
+
+    @instrumented
+    def list_token_usage(self, day: Optional[str] = None) -> List[Tuple[str, int, int, int]]:
+        '''
+        returns (username, prompt_tokens, completion_tokens, llm_calls) of every user on a UTC day, heaviest first
+        '''
+        try:
+            self.cursor.execute("""
+                SELECT username, SUM(prompt_tokens), SUM(completion_tokens), COUNT(*) FROM token_usage
+                WHERE day = ?
+                GROUP BY username
+                ORDER BY SUM(prompt_tokens) + SUM(completion_tokens) DESC
+            """, (day or usage_day(),))
+            rows = self.cursor.fetchall()
+            tracer.current_span().set_attribute("db.rows", len(rows))
+            return rows
+        except sqlite3.Error as e:
+            raise HackathonError('Some error occured, pls try later')
+
+    def close(self):
+        if not hasattr(self, '_connections_lock'):
+            return
+        if hasattr(self, '_roster_watcher_stop'):
+            self._roster_watcher_stop.set()
+        if hasattr(self, 'writer'):
+            self.writer.close()
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.Error as e:
+                logger.error(e)
+
+    def __del__(self):
+        self.close()
+
+
+_shared_instance: Optional[HackathonSQLite] = None
+_shared_instance_lock = threading.Lock()
+
+
+def get_hackathon_sqlite() -> HackathonSQLite:
+    '''
+    returns the process-wide HackathonSQLite instance, creating it on first use.
+    Schema setup and participants load happen only once per process this way.
+    '''
+    global _shared_instance
+    if _shared_instance is None:
+        with _shared_instance_lock:
+            if _shared_instance is None:
+                _shared_instance = HackathonSQLite()
+    return _shared_instance
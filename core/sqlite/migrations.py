@@ -0,0 +1,221 @@
+import logging
+import os
+import sqlite3
+from typing import List, NamedTuple
+
+logging.basicConfig()
+logging.getLogger().setLevel(os.environ.get("LOG_LEVEL", "INFO"))
+
+logger = logging.getLogger(__name__)
+
+
+class Migration(NamedTuple):
+    version: int
+    description: str
+    script: str
+
+
+# Migrations are applied in order, once each, and the DB's PRAGMA user_version records the last applied one.
+# Never edit a migration which has been released, add a new one instead.
+MIGRATIONS: List[Migration] = [
+    # DBs created before migrations existed have user_version 0 and already have (part of) this schema,
+    # hence all the IF NOT EXISTS
+    Migration(1, "initial schema", """
+CREATE TABLE if not exists teams (
+    team_id TEXT PRIMARY KEY,
+    team_name TEXT UNIQUE NOT NULL CHECK(length(team_name) <= 100),
+    captain_username TEXT UNIQUE NOT NULL,
+    FOREIGN KEY (captain_username) REFERENCES participants(username)
+);
+
+CREATE TABLE IF NOT EXISTS ideas (
+    idea_id TEXT PRIMARY KEY,
+    team_id TEXT NOT NULL,
+    idea_text TEXT NOT NULL,
+    created_by TEXT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (team_id) REFERENCES teams(team_id),
+    FOREIGN KEY (created_by) REFERENCES participants(username)
+);
+
+CREATE TABLE if not exists participants (
+    username TEXT PRIMARY KEY,
+    full_name TEXT,
+    bio TEXT,
+    team_id TEXT,
+    FOREIGN KEY (team_id) REFERENCES teams(team_id)
+);
+
+CREATE TABLE IF NOT EXISTS roster_sync_state (
+    csv_filepath TEXT PRIMARY KEY,
+    mtime REAL NOT NULL,
+    size INTEGER NOT NULL,
+    sha256 TEXT NOT NULL,
+    synced_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Create a view to count team members
+CREATE VIEW if not exists team_member_count AS
+SELECT team_id, COUNT(*) as member_count
+FROM participants
+WHERE team_id IS NOT NULL
+GROUP BY team_id;
+
+-- Create a trigger to enforce the 5-member limit
+CREATE TRIGGER if not exists enforce_team_size
+BEFORE INSERT ON participants
+FOR EACH ROW
+WHEN NEW.team_id IS NOT NULL
+BEGIN
+    SELECT RAISE(ABORT, 'Team already has the maximum of 5 members')
+    WHERE (
+        SELECT member_count 
+        FROM team_member_count 
+        WHERE team_id = NEW.team_id
+    ) >= 5;
+END;
+"""),
+
+    Migration(2, "indexes for team membership and ideas lookups", """
+-- team size, team members and the team_member_count view, covering so full_name is read from the index.
+-- unassigned participants are left out, they have their own index below
+CREATE INDEX IF NOT EXISTS idx_participants_team_id ON participants(team_id, full_name) WHERE team_id IS NOT NULL;
+
+-- unassigned participants
+CREATE INDEX IF NOT EXISTS idx_participants_unassigned ON participants(full_name, team_id) WHERE team_id IS NULL;
+
+-- team ideas, newest first
+CREATE INDEX IF NOT EXISTS idx_ideas_team_id_created_at ON ideas(team_id, created_at);
+
+-- foreign key and roster sync checks on idea authors
+CREATE INDEX IF NOT EXISTS idx_ideas_created_by ON ideas(created_by);
+"""),
+
+    Migration(3, "member_count maintained on teams, configurable max team size", """
+CREATE TABLE hackathon_settings (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+INSERT INTO hackathon_settings (key, value) VALUES ('max_team_size', '5');
+
+ALTER TABLE teams ADD COLUMN member_count INTEGER NOT NULL DEFAULT 0;
+UPDATE teams SET member_count = (SELECT COUNT(*) FROM participants WHERE team_id = teams.team_id);
+
+-- counts are read from teams now, old trigger only covered INSERT and re-aggregated on every row
+DROP TRIGGER enforce_team_size;
+DROP VIEW team_member_count;
+CREATE VIEW team_member_count AS
+SELECT team_id, member_count
+FROM teams
+WHERE member_count > 0;
+
+CREATE TRIGGER enforce_team_size_on_insert
+BEFORE INSERT ON participants
+FOR EACH ROW
+WHEN NEW.team_id IS NOT NULL
+BEGIN
+    SELECT RAISE(ABORT, 'Team already has the maximum number of members')
+    WHERE (SELECT member_count FROM teams WHERE team_id = NEW.team_id)
+        >= (SELECT CAST(value AS INTEGER) FROM hackathon_settings WHERE key = 'max_team_size');
+END;
+
+CREATE TRIGGER enforce_team_size_on_update
+BEFORE UPDATE OF team_id ON participants
+FOR EACH ROW
+WHEN NEW.team_id IS NOT NULL AND NEW.team_id IS NOT OLD.team_id
+BEGIN
+    SELECT RAISE(ABORT, 'Team already has the maximum number of members')
+    WHERE (SELECT member_count FROM teams WHERE team_id = NEW.team_id)
+        >= (SELECT CAST(value AS INTEGER) FROM hackathon_settings WHERE key = 'max_team_size');
+END;
+
+CREATE TRIGGER member_count_on_insert
+AFTER INSERT ON participants
+FOR EACH ROW
+WHEN NEW.team_id IS NOT NULL
+BEGIN
+    UPDATE teams SET member_count = member_count + 1 WHERE team_id = NEW.team_id;
+END;
+
+CREATE TRIGGER member_count_on_update
+AFTER UPDATE OF team_id ON participants
+FOR EACH ROW
+WHEN NEW.team_id IS NOT OLD.team_id
+BEGIN
+    UPDATE teams SET member_count = member_count - 1 WHERE team_id = OLD.team_id;
+    UPDATE teams SET member_count = member_count + 1 WHERE team_id = NEW.team_id;
+END;
+
+CREATE TRIGGER member_count_on_delete
+AFTER DELETE ON participants
+FOR EACH ROW
+WHEN OLD.team_id IS NOT NULL
+BEGIN
+    UPDATE teams SET member_count = member_count - 1 WHERE team_id = OLD.team_id;
+END;
+"""),
+
+    Migration(4, "conversation message history", """
+CREATE TABLE conversation_messages (
+    conversation_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    message_type TEXT NOT NULL,
+    content TEXT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (conversation_id, seq)
+) WITHOUT ROWID;
+"""),
+    Migration(5, "slack event idempotency keys", """
+CREATE TABLE processed_slack_events (
+    event_key TEXT PRIMARY KEY,
+    received_at REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX idx_processed_slack_events_received_at ON processed_slack_events(received_at);
+"""),
+    Migration(6, "token usage ledger", """
+CREATE TABLE token_usage (
+    id INTEGER PRIMARY KEY,
+    username TEXT NOT NULL,
+    conversation_id TEXT,
+    day TEXT NOT NULL,
+    model TEXT NOT NULL,
+    prompt_tokens INTEGER NOT NULL,
+    completion_tokens INTEGER NOT NULL,
+    estimated INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX idx_token_usage_day_username ON token_usage(day, username);
+CREATE INDEX idx_token_usage_conversation_id ON token_usage(conversation_id);
+"""),
+]
+
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn: sqlite3.Connection) -> int:
+    '''
+    applies the pending migrations, each one in its own transaction along with the user_version bump.
+    returns the schema version of the DB
+    '''
+    current_version = get_schema_version(conn)
+    for migration in MIGRATIONS:
+        if migration.version <= current_version:
+            continue
+
+        logger.info("Applying migration %d : %s", migration.version, migration.description)
+        try:
+            conn.executescript(f"""
+                BEGIN IMMEDIATE;
+                {migration.script}
+                PRAGMA user_version = {migration.version};
+                COMMIT;
+            """)
+        except sqlite3.Error:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        current_version = migration.version
+
+    return current_version
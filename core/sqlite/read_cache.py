@@ -0,0 +1,62 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+from core.tracing import tracer
+
+
+class VersionedReadCache:
+    '''
+    Bounded LRU cache of read results, tagged with the data version they were computed at.
+
+    The data version is bumped after every committed mutation, which makes all cached entries stale at once.
+    Stale entries are not served and get replaced on their next read or evicted once the cache is full.
+    '''
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._entries: "OrderedDict[Hashable, Tuple[int, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def bump_version(self):
+        with self._lock:
+            self.version += 1
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        with self._lock:
+            version = self.version
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                tracer.current_span().set_attribute("cache.hit", True)
+                return entry[1]
+            self.misses += 1
+        tracer.current_span().set_attribute("cache.hit", False)
+
+        value = compute()
+
+        with self._lock:
+            # a mutation committed while computing may or may not be part of the value, don't keep it then
+            if version == self.version:
+                self._entries[key] = (version, value)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+        return value
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "version": self.version,
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
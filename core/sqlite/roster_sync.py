@@ -0,0 +1,141 @@
+import csv
+import hashlib
+import logging
+import os
+import sqlite3
+import time
+from typing import Dict, List, NamedTuple, Optional, Tuple, Union
+
+logging.basicConfig()
+logging.getLogger().setLevel(os.environ.get("LOG_LEVEL", "INFO"))
+
+logger = logging.getLogger(__name__)
+
+# a file written again within this many seconds of being hashed can keep the same mtime (coarse mtime resolution)
+RACY_MTIME_SECONDS = 2.0
+
+
+class RosterFingerprint(NamedTuple):
+    mtime: float
+    size: int
+    sha256: str
+
+
+class RosterDiff(NamedTuple):
+    inserts: List[Tuple[str, str, str]]
+    updates: List[Tuple[str, str, str]]
+    deletes: List[str]
+
+    def is_empty(self) -> bool:
+        return not (self.inserts or self.updates or self.deletes)
+
+
+class ParticipantRosterSync:
+    '''
+    Keeps the participants table in sync with the participants CSV file.
+
+    The CSV is fingerprinted (mtime, size and sha256) and the fingerprint of the last applied sync is stored
+    in the roster_sync_state table, so an unchanged CSV is never parsed again. When the CSV did change,
+    a row level diff against the participants table is applied in a single transaction, i.e the writes are
+    O(changes) and not O(workspace).
+    '''
+
+    def __init__(self, participants_csv_filepath: str):
+        self.participants_csv_filepath = participants_csv_filepath
+
+    def fingerprint(self, previous: Optional[RosterFingerprint] = None) -> RosterFingerprint:
+        '''
+        returns the fingerprint of the CSV file, the file is only hashed when mtime or size differ from previous.
+        A file hashed less than RACY_MTIME_SECONDS after it was modified could be edited again without its mtime
+        or size changing, its fingerprint gets no mtime so that it's hashed again next time (as git does)
+        '''
+        stat = os.stat(self.participants_csv_filepath)
+        if previous and previous.mtime == stat.st_mtime and previous.size == stat.st_size:
+            return previous
+
+        sha256 = hashlib.sha256()
+        with open(self.participants_csv_filepath, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 16), b''):
+                sha256.update(chunk)
+        mtime = stat.st_mtime if time.time() - stat.st_mtime >= RACY_MTIME_SECONDS else 0.0
+        return RosterFingerprint(mtime, stat.st_size, sha256.hexdigest())
+
+    def get_synced_fingerprint(self, conn: Union[sqlite3.Connection, sqlite3.Cursor]) -> Optional[RosterFingerprint]:
+        row = conn.execute("""
+            SELECT mtime, size, sha256 FROM roster_sync_state WHERE csv_filepath = ?
+            """, (self.participants_csv_filepath,)).fetchone()
+        return RosterFingerprint(*row) if row else None
+
+    def read_csv(self) -> Dict[str, Tuple[str, str]]:
+        with open(self.participants_csv_filepath, 'r', newline='', encoding='utf-8') as csvfile:
+            return {row['username']: (row['full_name'], row['bio']) for row in csv.DictReader(csvfile)}
+
+    def compute_diff(self, conn: Union[sqlite3.Connection, sqlite3.Cursor], roster: Dict[str, Tuple[str, str]]) -> RosterDiff:
+        existing = {
+            username: (full_name, bio)
+            for username, full_name, bio in conn.execute("SELECT username, full_name, bio FROM participants")
+        }
+
+        inserts, updates = [], []
+        for username, details in roster.items():
+            if username not in existing:
+                inserts.append((username, *details))
+            elif existing[username] != details:
+                updates.append((*details, username))
+
+        deletes = [username for username in existing if username not in roster]
+        return RosterDiff(inserts, updates, deletes)
+
+    def sync(self, conn: Union[sqlite3.Connection, sqlite3.Cursor], force: bool = False) -> Optional[RosterDiff]:
+        '''
+        applies the CSV changes to the participants table, the caller owns the transaction so that all
+        changes are applied at once.
+        returns the applied diff, or None if the CSV has not changed since the last sync
+        '''
+        synced_fingerprint = self.get_synced_fingerprint(conn)
+        fingerprint = self.fingerprint(previous=synced_fingerprint)
+        if not force and synced_fingerprint and synced_fingerprint.sha256 == fingerprint.sha256:
+            if synced_fingerprint != fingerprint:
+                # file was touched but content is the same, remember new mtime to skip hashing next time
+                self._save_fingerprint(conn, fingerprint)
+            return None
+
+        diff = self.compute_diff(conn, self.read_csv())
+        if diff.inserts:
+            conn.executemany("INSERT INTO participants (username, full_name, bio) VALUES (?, ?, ?)", diff.inserts)
+        if diff.updates:
+            conn.executemany("UPDATE participants SET full_name = ?, bio = ? WHERE username = ?", diff.updates)
+        deleted = []
+        for username in diff.deletes:
+            # participants who are part of a team or have added ideas are referenced by other tables, keep them
+            cursor = conn.execute("""
+                DELETE FROM participants
+                WHERE username = ?
+                    AND team_id IS NULL
+                    AND NOT EXISTS (SELECT 1 FROM ideas WHERE created_by = participants.username)
+                """, (username,))
+            if cursor.rowcount:
+                deleted.append(username)
+            else:
+                logger.warning("Participant %s is no longer in the CSV but %s, keeping it", username,
+                               self._kept_reason(conn, username))
+        diff = diff._replace(deletes=deleted)
+        self._save_fingerprint(conn, fingerprint)
+
+        logger.info("Participants synced from %s : %d inserted, %d updated, %d deleted",
+                    self.participants_csv_filepath, len(diff.inserts), len(diff.updates), len(diff.deletes))
+        return diff
+
+    def _kept_reason(self, conn: Union[sqlite3.Connection, sqlite3.Cursor], username: str) -> str:
+        in_team, has_ideas = conn.execute("""
+            SELECT team_id IS NOT NULL, EXISTS (SELECT 1 FROM ideas WHERE created_by = participants.username)
+            FROM participants WHERE username = ?
+            """, (username,)).fetchone()
+        reasons = (["is part of a team"] if in_team else []) + (["has added ideas"] if has_ideas else [])
+        return " and ".join(reasons)
+
+    def _save_fingerprint(self, conn: Union[sqlite3.Connection, sqlite3.Cursor], fingerprint: RosterFingerprint):
+        conn.execute("""
+            INSERT OR REPLACE INTO roster_sync_state (csv_filepath, mtime, size, sha256, synced_at)
+            VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+            """, (self.participants_csv_filepath, *fingerprint))
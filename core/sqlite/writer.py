@@ -0,0 +1,167 @@
+import logging
+import os
+import queue
+import sqlite3
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, List, Tuple
+
+from core.tracing import tracer
+
+logging.basicConfig()
+logging.getLogger().setLevel(os.environ.get("LOG_LEVEL", "INFO"))
+
+logger = logging.getLogger(__name__)
+
+
+class SQLiteWriter:
+    '''
+    Owns the only write connection to the DB and applies mutations from a dedicated thread.
+
+    Mutations are queued as commands, i.e functions which take a cursor. The writer thread drains the queue
+    and runs up to max_batch_size commands in one transaction (group commit), each command inside its own
+    savepoint so a failing command is rolled back alone and its exception is raised to the caller only.
+    A batch failing in any other way, e.g its ROLLBACK or on_commit raising, fails the commands of the batch and
+    the thread goes on with the next one. Once the writer is closed, or its thread died anyway, commands fail
+    right away instead of waiting forever.
+    '''
+
+    def __init__(self, conn: sqlite3.Connection, max_batch_size: int = 32, on_commit: Callable[[], None] = None,
+                 on_rollback: Callable[[sqlite3.Cursor], None] = None):
+        # transactions are managed explicitly with BEGIN/SAVEPOINT/COMMIT
+        conn.isolation_level = None
+        self.conn = conn
+        self.max_batch_size = max_batch_size
+        # called on the writer thread after a commit in which a notifying command changed any row,
+        # before callers are notified
+        self.on_commit = on_commit
+        # called on the writer thread after a group commit failed and was rolled back, so that state kept
+        # outside the DB by the commands can be reloaded
+        self.on_rollback = on_rollback
+
+        self._queue: "queue.Queue[Tuple[Callable, tuple, Future, bool, Any]]" = queue.Queue()
+        self._stopped = False
+        # held while a command is queued and while the writer stops, so that no command is queued after the last drain
+        self._stop_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="sqlite-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, command: Callable[..., Any], *args, notify: bool = True) -> Future:
+        future = Future()
+        with self._stop_lock:
+            if self._stopped:
+                future.set_exception(sqlite3.OperationalError("the SQLite writer is stopped"))
+                return future
+            # the span of the caller gets the rows changed by the command and the size of its group commit
+            self._queue.put((command, args, future, notify, tracer.current_span()))
+        return future
+
+    def execute(self, command: Callable[..., Any], *args, notify: bool = True) -> Any:
+        '''
+        runs the command on the writer thread and waits until its transaction is committed.
+        on_commit is not called for the changes of commands with notify off
+        '''
+        return self.submit(command, *args, notify=notify).result()
+
+    def close(self):
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+
+    def _run(self):
+        try:
+            while True:
+                item = self._queue.get()
+                if item is None:
+                    break
+
+                batch = [item]
+                while len(batch) < self.max_batch_size:
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is None:
+                        self._queue.put(None)  # stop after this batch
+                        break
+                    batch.append(item)
+
+                self._run_batch(batch)
+        finally:
+            self._stop()
+            self.conn.close()
+
+    def _stop(self):
+        with self._stop_lock:
+            self._stopped = True
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None:
+                item[2].set_exception(sqlite3.OperationalError("the SQLite writer is stopped"))
+
+    def _run_batch(self, batch: List[Tuple[Callable, tuple, Future, bool, Any]]):
+        try:
+            self._commit_batch(batch)
+        except Exception as e:
+            logger.exception('group commit of %d commands failed', len(batch))
+            if self.conn.in_transaction:
+                try:
+                    self.conn.execute("ROLLBACK")
+                    if self.on_rollback:
+                        self.on_rollback(self.conn.cursor())
+                except Exception:
+                    logger.exception('could not roll back the failed group commit')
+            for _, _, future, _, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+
+    def _commit_batch(self, batch: List[Tuple[Callable, tuple, Future, bool, Any]]):
+        cursor = self.conn.cursor()
+        changed = False
+        results = []
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+        except sqlite3.Error as e:
+            for _, _, future, _, _ in batch:
+                future.set_exception(e)
+            return
+
+        for command, args, future, notify, span in batch:
+            if not future.set_running_or_notify_cancel():
+                continue
+            cursor.execute("SAVEPOINT command")
+            try:
+                total_changes = self.conn.total_changes
+                result = command(cursor, *args)
+                span.set_attributes({"db.rows_affected": self.conn.total_changes - total_changes,
+                                     "db.batch_size": len(batch)})
+                cursor.execute("RELEASE SAVEPOINT command")
+                changed = changed or (notify and self.conn.total_changes != total_changes)
+                results.append((future, result, None))
+            except Exception as e:
+                cursor.execute("ROLLBACK TO SAVEPOINT command")
+                cursor.execute("RELEASE SAVEPOINT command")
+                results.append((future, None, e))
+
+        try:
+            cursor.execute("COMMIT")
+        except sqlite3.Error as e:
+            logger.error('group commit of %d commands failed: %s', len(results), e)
+            cursor.execute("ROLLBACK")
+            if self.on_rollback:
+                self.on_rollback(cursor)
+            for future, _, _ in results:
+                future.set_exception(e)
+            return
+
+        if self.on_commit and changed:
+            self.on_commit()
+
+        for future, result, exception in results:
+            if exception is not None:
+                future.set_exception(exception)
+            else:
+                future.set_result(result)
@@ -0,0 +1,191 @@
+'''
+In-memory trigram index of team names, to resolve the team name a user typed (or the LLM extracted) to a team
+even with typos, case or punctuation differences, without scanning the teams table.
+
+Names are normalised (lowercase, punctuation dropped) and split into trigrams per word, the way pg_trgm does,
+and candidates are ranked by the Jaccard similarity of their trigram sets. The index is updated incrementally
+as teams are created, renamed and deleted.
+
+Usage:
+    index = TeamNameIndex()
+    index.add(team_id, "Spaghetti Coders")
+    resolution = index.resolve("spagetti coders")
+    resolution.match        # (team_id, "Spaghetti Coders"), or None
+    resolution.suggestions  # names to offer with "did you mean" when there is no match
+'''
+
+import re
+import threading
+from collections import defaultdict
+from itertools import islice
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+
+def normalise(name: str) -> str:
+    return " ".join(re.sub(r"[^\w]+", " ", name.lower()).split())
+
+
+def trigrams(normalised: str) -> Set[str]:
+    grams = set()
+    for word in normalised.split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class TeamCandidate(NamedTuple):
+    team_id: str
+    team_name: str
+    similarity: float
+    contains: bool  # the query is part of the name, e.g "avengers" of "the avengers"
+
+
+class Resolution(NamedTuple):
+    match: Optional[Tuple[str, str]]  # (team_id, team_name)
+    suggestions: List[str]
+
+
+class TeamNameIndex:
+    '''
+    Resolves a query in order of confidence:
+        1. the only team with the same normalised name
+        2. the only team whose name contains the query
+        3. the most similar team, if no name contains the query, it's at least min_similarity similar and ahead
+           of the next one by margin
+    otherwise there is no match, and the names of up to max_suggestions teams at least suggest_similarity
+    (or containing the query) are returned as suggestions.
+
+    Thread safe, it's updated from the DB writer thread and can be searched from any thread.
+    '''
+
+    def __init__(self, min_similarity: float = 0.45, margin: float = 0.15, suggest_similarity: float = 0.2,
+                 max_suggestions: int = 3, max_candidates: int = 64):
+        self.min_similarity = min_similarity
+        self.margin = margin
+        self.suggest_similarity = suggest_similarity
+        self.max_suggestions = max_suggestions
+        self.max_candidates = max_candidates
+
+        # team_id -> (team_name, normalised name, trigrams)
+        self._teams: Dict[str, Tuple[str, str, Set[str]]] = {}
+        self._postings: Dict[str, Set[str]] = defaultdict(set)
+        self._by_normalised: Dict[str, Set[str]] = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._teams)
+
+    def rebuild(self, teams: Iterable[Tuple[str, str]]):
+        '''
+        replaces the index content with the given (team_id, team_name)
+        '''
+        with self._lock:
+            self._teams.clear()
+            self._postings.clear()
+            self._by_normalised.clear()
+            for team_id, team_name in teams:
+                self._add(team_id, team_name)
+
+    def add(self, team_id: str, team_name: str):
+        with self._lock:
+            self._remove(team_id)
+            self._add(team_id, team_name)
+
+    def remove(self, team_id: str):
+        with self._lock:
+            self._remove(team_id)
+
+    def _add(self, team_id: str, team_name: str):
+        normalised = normalise(team_name)
+        grams = trigrams(normalised)
+        self._teams[team_id] = (team_name, normalised, grams)
+        self._by_normalised[normalised].add(team_id)
+        for gram in grams:
+            self._postings[gram].add(team_id)
+
+    def _remove(self, team_id: str):
+        team = self._teams.pop(team_id, None)
+        if team is None:
+            return
+        _, normalised, grams = team
+        self._discard(self._by_normalised, normalised, team_id)
+        for gram in grams:
+            self._discard(self._postings, gram, team_id)
+
+    @staticmethod
+    def _discard(index: Dict[str, Set[str]], key: str, team_id: str):
+        ids = index[key]
+        ids.discard(team_id)
+        if not ids:
+            del index[key]
+
+    def search(self, query: str, limit: int = 10) -> List[TeamCandidate]:
+        '''
+        returns the teams sharing trigrams with the query, most similar first
+        '''
+        return self._search(normalise(query))[:limit]
+
+    def _search(self, normalised: str) -> List[TeamCandidate]:
+        query_grams = trigrams(normalised)
+        if not query_grams:
+            return []
+        with self._lock:
+            # candidates come from the rarest trigrams first, common ones like "tea" of "team" are only used while
+            # there are few candidates, so that a search looks at max_candidates teams at most
+            postings = sorted((self._postings[gram] for gram in query_grams if gram in self._postings), key=len)
+            team_ids: Set[str] = set()
+            for ids in postings:
+                if len(team_ids) + len(ids) > self.max_candidates:
+                    if not team_ids:
+                        team_ids.update(islice(ids, self.max_candidates))
+                    # names containing the query are candidates whatever the cap, resolve() matches the only one first
+                    team_ids |= self._containing(normalised)
+                    break
+                team_ids |= ids
+            candidates = []
+            for team_id in team_ids:
+                team_name, team_normalised, team_grams = self._teams[team_id]
+                shared = len(query_grams & team_grams)
+                similarity = shared / (len(query_grams) + len(team_grams) - shared)
+                candidates.append(TeamCandidate(team_id, team_name, similarity, normalised in team_normalised))
+        candidates.sort(key=lambda candidate: (-candidate.similarity, candidate.team_name))
+        return candidates
+
+    def _containing(self, normalised: str) -> Set[str]:
+        '''
+        up to max_candidates teams whose name contains the query. Such a name has every trigram inside a word of
+        the query, those without padding, so only the teams of the rarest one are checked
+        '''
+        inner_grams = [gram for gram in trigrams(normalised) if " " not in gram]
+        if inner_grams:
+            team_ids = min((self._postings.get(gram, ()) for gram in inner_grams), key=len)
+        else:
+            # words of less than 3 letters only
+            team_ids = self._teams.keys()
+        containing = (team_id for team_id in team_ids if normalised in self._teams[team_id][1])
+        return set(islice(containing, self.max_candidates))
+
+    def resolve(self, query: str) -> Resolution:
+        normalised = normalise(query)
+        with self._lock:
+            exact = [(team_id, self._teams[team_id][0]) for team_id in self._by_normalised.get(normalised, ())]
+        if len(exact) == 1:
+            return Resolution(exact[0], [])
+
+        candidates = self._search(normalised)
+        containing = [candidate for candidate in candidates if candidate.contains]
+        if not exact and len(containing) == 1:
+            return Resolution((containing[0].team_id, containing[0].team_name), [])
+
+        # several names containing the query, or the same name, is ambiguous however similar the best one is
+        if not exact and not containing and candidates and candidates[0].similarity >= self.min_similarity and (
+                len(candidates) == 1 or candidates[0].similarity - candidates[1].similarity >= self.margin):
+            return Resolution((candidates[0].team_id, candidates[0].team_name), [])
+
+        suggestions = [candidate.team_name for candidate in candidates
+                       if candidate.contains or candidate.similarity >= self.suggest_similarity]
+        return Resolution(None, suggestions[:self.max_suggestions])
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"teams": len(self._teams), "trigrams": len(self._postings)}
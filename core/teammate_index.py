@@ -0,0 +1,258 @@
+'''
+In-memory TF-IDF index of participant bios, to suggest unassigned participants who would complement a team, without
+reading every bio on each request.
+
+Each participant is a row of up to max_terms term ids of their bio (0 pads), so the terms of every unassigned
+participant can be gathered with one NumPy fancy index. IDF is computed from document frequencies at query time,
+the rows don't change when other bios do. Joining or leaving a team only flips the participant's unassigned flag
+and team, a new or changed bio rewrites its row.
+
+A candidate's gain for a team is the L2 norm of the IDF weights of their terms which no team member has yet, i.e
+how much their bio adds to the team's. Suggestions are picked greedily, each pick's terms count as covered for the
+next ones, so that they complement each other too.
+
+Usage:
+    index = TeammateIndex()
+    index.rebuild([("user0", "backend developer, python", None), ("user1", "ux designer", None)])
+    index.set_team("user0", team_id)
+    index.recommend("user0", k=5)  # [TeammateRecommendation("user1", 2.3, ["designer", "ux"])]
+'''
+
+import heapq
+import re
+import threading
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+import numpy as np
+
+STOPWORDS = frozenset("""
+    a about all also am an and are as at be been but by can do for from have he her his i im in into is it its me
+    more my not of on or our she so some that the their them they this to too us was we were what when where which
+    who will with you your
+""".split())
+
+
+def terms(bio: Optional[str]) -> List[str]:
+    '''
+    distinct lowercase words of the bio, in order, keeping c++, c#, node.js
+    '''
+    words = re.findall(r"[a-z0-9][a-z0-9+#]*(?:\.[a-z0-9]+)*", (bio or "").lower())
+    return list(dict.fromkeys(word for word in words if word not in STOPWORDS and len(word) > 1))
+
+
+class TeammateRecommendation(NamedTuple):
+    username: str
+    gain: float
+    terms: List[str]  # terms of their bio the team didn't have, rarest first
+
+
+class TeammateIndex:
+    '''
+    Thread safe, it's updated by the backend's writes and queried from any thread.
+    '''
+
+    def __init__(self, max_terms: int = 32, max_explained_terms: int = 3, initial_capacity: int = 1024):
+        self.max_terms = max_terms
+        self.max_explained_terms = max_explained_terms
+
+        # row -> term ids of the bio, 0 pads
+        self._terms = np.zeros((initial_capacity, max_terms), dtype=np.int32)
+        self._unassigned = np.zeros(initial_capacity, dtype=bool)
+        self._usernames: List[Optional[str]] = []
+        self._teams: List[Optional[str]] = []
+        self._rows: Dict[str, int] = {}
+        self._free_rows: List[int] = []
+        # team_id -> rows of its members
+        self._members: Dict[str, Set[int]] = {}
+
+        # term id 0 is the padding, its document frequency is never read
+        self._vocabulary: Dict[str, int] = {"": 0}
+        self._vocabulary_terms: List[str] = [""]
+        self._df = np.zeros(1024, dtype=np.int64)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def rebuild(self, participants: Iterable[Tuple[str, Optional[str], Optional[str]]]):
+        '''
+        replaces the index content with the given (username, bio, team_id)
+        '''
+        with self._lock:
+            self._terms[:] = 0
+            self._unassigned[:] = False
+            self._usernames.clear()
+            self._teams.clear()
+            self._rows.clear()
+            self._free_rows.clear()
+            self._members.clear()
+            term_ids = []
+            for username, bio, team_id in participants:
+                row = self._append_row()
+                self._rows[username] = row
+                self._usernames[row] = username
+                term_ids.append([self._term_id(term) for term in terms(bio)[:self.max_terms]])
+                self._set_row_team(row, team_id)
+
+            # one fancy assignment instead of one per row
+            lengths = np.fromiter(map(len, term_ids), dtype=np.int64, count=len(term_ids))
+            flat = np.fromiter((term_id for row_ids in term_ids for term_id in row_ids), dtype=np.int32,
+                               count=int(lengths.sum()))
+            rows = np.repeat(np.arange(len(term_ids)), lengths)
+            columns = np.arange(len(flat)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+            self._terms[rows, columns] = flat
+            self._df = np.bincount(flat, minlength=len(self._df)).astype(np.int64)
+
+    def upsert(self, username: str, bio: Optional[str]):
+        '''
+        adds a participant without a team, or changes the bio of an existing one
+        '''
+        with self._lock:
+            self._upsert(username, bio)
+
+    def remove(self, username: str):
+        with self._lock:
+            row = self._rows.pop(username, None)
+            if row is None:
+                return
+            self._set_row_team(row, None)
+            self._set_row_terms(row, [])
+            self._unassigned[row] = False
+            self._usernames[row] = None
+            self._free_rows.append(row)
+
+    def set_team(self, username: str, team_id: Optional[str]):
+        '''
+        participants who are not in the index, e.g not in the participants CSV, are ignored
+        '''
+        with self._lock:
+            self._set_team(username, team_id)
+
+    def remove_team(self, team_id: str):
+        '''
+        its members have no team anymore
+        '''
+        with self._lock:
+            for row in list(self._members.get(team_id, ())):
+                self._set_row_team(row, None)
+
+    def _upsert(self, username: str, bio: Optional[str]):
+        row = self._rows.get(username)
+        if row is None:
+            row = self._free_rows.pop() if self._free_rows else self._append_row()
+            self._rows[username] = row
+            self._usernames[row] = username
+            self._unassigned[row] = True
+        self._set_row_terms(row, terms(bio)[:self.max_terms])
+
+    def _append_row(self) -> int:
+        row = len(self._usernames)
+        if row == len(self._terms):
+            self._terms = np.concatenate([self._terms, np.zeros_like(self._terms)])
+            self._unassigned = np.concatenate([self._unassigned, np.zeros_like(self._unassigned)])
+        self._usernames.append(None)
+        self._teams.append(None)
+        return row
+
+    def _set_row_terms(self, row: int, bio_terms: List[str]):
+        old_ids = self._terms[row][self._terms[row] > 0]
+        self._df[old_ids] -= 1
+        new_ids = [self._term_id(term) for term in bio_terms]
+        self._terms[row] = 0
+        self._terms[row, :len(new_ids)] = new_ids
+        self._df[new_ids] += 1
+
+    def _term_id(self, term: str) -> int:
+        term_id = self._vocabulary.get(term)
+        if term_id is None:
+            term_id = self._vocabulary[term] = len(self._vocabulary_terms)
+            self._vocabulary_terms.append(term)
+            if term_id == len(self._df):
+                self._df = np.concatenate([self._df, np.zeros_like(self._df)])
+        return term_id
+
+    def _set_team(self, username: str, team_id: Optional[str]):
+        row = self._rows.get(username)
+        if row is not None:
+            self._set_row_team(row, team_id)
+
+    def _set_row_team(self, row: int, team_id: Optional[str]):
+        old_team_id = self._teams[row]
+        if old_team_id is not None:
+            members = self._members[old_team_id]
+            members.discard(row)
+            if not members:
+                del self._members[old_team_id]
+        self._teams[row] = team_id
+        self._unassigned[row] = team_id is None
+        if team_id is not None:
+            self._members.setdefault(team_id, set()).add(row)
+
+    def recommend(self, username: Optional[str] = None, k: int = 5, team_id: Optional[str] = None,
+                  max_candidates: int = 256) -> List[TeammateRecommendation]:
+        '''
+        the k unassigned participants adding the most to the team of the user (or the user alone if they have no
+        team), or to the given team. Candidates whose bio adds nothing are left out.
+        Gains are computed for every unassigned participant at once, then only the best max_candidates are
+        re-scored as picks cover terms (gains only decrease), unless they run out
+        '''
+        with self._lock:
+            if team_id is None:
+                row = self._rows.get(username)
+                if row is None:
+                    return []
+                team_id = self._teams[row]
+                team_rows = list(self._members[team_id]) if team_id is not None else [row]
+            else:
+                team_rows = list(self._members.get(team_id, ()))
+
+            num_rows = len(self._usernames)
+            num_terms = len(self._vocabulary_terms)
+            idf = np.log((1 + len(self._rows)) / (1 + self._df[:num_terms])) + 1
+            weights = idf * idf
+            weights[0] = 0
+            weights[self._terms[team_rows].ravel()] = 0
+
+            candidates = np.flatnonzero(self._unassigned[:num_rows])
+            candidate_terms = self._terms[candidates]
+            recommendations = []
+            while len(recommendations) < k and len(candidates):
+                gains = weights[candidate_terms].sum(axis=1)
+                # the best max_candidates, the others can't gain more than the best of them once re-scored
+                if len(candidates) > max_candidates:
+                    best = np.argpartition(-gains, max_candidates)[:max_candidates]
+                    outside_bound = np.delete(gains, best).max()
+                else:
+                    best = np.arange(len(candidates))
+                    outside_bound = 0.0
+                # ties are broken by username, so that the result doesn't depend on the order rows were added in
+                heap = [(-gains[i], self._usernames[candidates[i]], int(i)) for i in best if gains[i] > 0]
+                heapq.heapify(heap)
+                picked = []
+                while heap and len(recommendations) < k:
+                    _, candidate, i = heapq.heappop(heap)
+                    gain = weights[candidate_terms[i]].sum()
+                    if gain <= 0:
+                        continue
+                    if heap and (-gain, candidate) > heap[0][:2]:
+                        heapq.heappush(heap, (-gain, candidate, i))
+                        continue
+                    if gain < outside_bound:
+                        break  # a candidate outside the best may gain more now, score them all again
+                    new_terms = [term_id for term_id in candidate_terms[i] if weights[term_id] > 0]
+                    new_terms.sort(key=lambda term_id: -weights[term_id])
+                    recommendations.append(TeammateRecommendation(
+                        candidate, round(float(np.sqrt(gain)), 4),
+                        [self._vocabulary_terms[term_id] for term_id in new_terms[:self.max_explained_terms]]))
+                    weights[candidate_terms[i]] = 0
+                    picked.append(i)
+                if len(recommendations) == k or outside_bound <= 0:
+                    break
+                candidates = np.delete(candidates, picked)
+                candidate_terms = np.delete(candidate_terms, picked, axis=0)
+            return recommendations
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"participants": len(self._rows), "unassigned": int(self._unassigned.sum()),
+                    "terms": len(self._vocabulary_terms) - 1, "teams": len(self._members)}
@@ -0,0 +1,348 @@
+'''
+Lightweight request tracing: a span per slack event with child spans for the work done on its behalf
+(conversation lookup, DB operations, LLM calls, slack posts), so that a slow reply can be attributed.
+
+Spans are exported in batches from a background thread, as JSON lines to a local file or to an OTLP/HTTP
+collector (Jaeger, Tempo, the OpenTelemetry collector...) using the OTLP JSON encoding. Tracing is off unless
+TRACING_EXPORTER is set, then span() and current_span() return a shared no-op span and traced functions
+are called straight away.
+
+The current span is kept in a context variable, which asyncio tasks inherit. Threads don't, work handed to
+another thread is traced under its parent with use_span(span) or bind_context(fn).
+
+Usage:
+    from core.tracing import tracer, traced
+
+    with tracer.span("llm.chat", {"llm.model": model_name}) as span:
+        ...
+        span.set_attribute("llm.prompt_tokens", num_tokens)
+
+    @traced()
+    def create_team(self, team_name, captain_username):
+        ...
+'''
+
+import atexit
+import contextvars
+import functools
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+import urllib.request
+from typing import Any, Callable, Dict, List, Optional
+
+logging.basicConfig()
+logging.getLogger().setLevel(os.environ.get("LOG_LEVEL", "INFO"))
+
+logger = logging.getLogger(__name__)
+
+EXPORTERS = ("", "file", "otlp")
+
+_current_span: "contextvars.ContextVar[Optional[Span]]" = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    __slots__ = ("tracer", "name", "trace_id", "span_id", "parent_id", "start_ns", "end_ns", "attributes", "error")
+
+    def __init__(self, tracer: "Tracer", name: str, trace_id: str, parent_id: Optional[str], attributes: Optional[dict]):
+        self.tracer = tracer
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.attributes = dict(attributes) if attributes else {}
+        self.error: Optional[str] = None
+        self.end_ns: Optional[int] = None
+        self.start_ns = time.time_ns()
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def set_attributes(self, attributes: Dict[str, Any]):
+        self.attributes.update(attributes)
+
+    def record_error(self, error: BaseException):
+        self.error = f"{type(error).__name__}: {error}"
+
+    def end(self):
+        if self.end_ns is None:
+            self.end_ns = time.time_ns()
+            self.tracer._on_end(self)
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_ns": self.start_ns,
+            "end_ns": self.end_ns,
+            "duration_ms": round((self.end_ns - self.start_ns) / 1e6, 3),
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+class _NoopSpan:
+    '''
+    returned while tracing is off, every method does nothing
+    '''
+
+    def set_attribute(self, key: str, value: Any):
+        pass
+
+    def set_attributes(self, attributes: Dict[str, Any]):
+        pass
+
+    def record_error(self, error: BaseException):
+        pass
+
+    def end(self):
+        pass
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class _SpanScope:
+    '''
+    makes the span current while the with block runs, and ends it afterwards if end_on_exit
+    '''
+    __slots__ = ("span", "end_on_exit", "_token")
+
+    def __init__(self, span: Span, end_on_exit: bool):
+        self.span = span
+        self.end_on_exit = end_on_exit
+
+    def __enter__(self) -> Span:
+        self._token = _current_span.set(self.span)
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb):
+        _current_span.reset(self._token)
+        if exc is not None:
+            self.span.record_error(exc)
+        if self.end_on_exit:
+            self.span.end()
+        return False
+
+
+class FileSpanExporter:
+    '''
+    appends spans as JSON lines, one span per line
+    '''
+
+    def __init__(self, filepath: str):
+        self.filepath = filepath
+
+    def export(self, spans: List[Span]):
+        with open(self.filepath, "a") as f:
+            f.writelines(json.dumps(span.to_dict(), default=str) + "\n" for span in spans)
+
+
+def _otlp_value(value: Any) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class OTLPSpanExporter:
+    '''
+    posts spans to an OTLP/HTTP collector, JSON encoded
+    '''
+
+    def __init__(self, endpoint: str = "http://localhost:4318", service_name: str = "mrgorlomi", timeout: float = 5.0):
+        self.url = f"{endpoint.rstrip('/')}/v1/traces"
+        self.service_name = service_name
+        self.timeout = timeout
+
+    def export(self, spans: List[Span]):
+        payload = {"resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": _otlp_value(self.service_name)}]},
+            "scopeSpans": [{"scope": {"name": __name__}, "spans": [self._otlp_span(span) for span in spans]}],
+        }]}
+        request = urllib.request.Request(self.url, data=json.dumps(payload).encode(),
+                                         headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            response.read()
+
+    def _otlp_span(self, span: Span) -> dict:
+        otlp_span = {
+            "traceId": span.trace_id,
+            "spanId": span.span_id,
+            "name": span.name,
+            # root spans are the server side of a slack event, the rest is internal work
+            "kind": 1 if span.parent_id else 2,
+            "startTimeUnixNano": str(span.start_ns),
+            "endTimeUnixNano": str(span.end_ns),
+            "attributes": [{"key": key, "value": _otlp_value(value)} for key, value in span.attributes.items()],
+            "status": {"code": 2, "message": span.error} if span.error else {"code": 1},
+        }
+        if span.parent_id:
+            otlp_span["parentSpanId"] = span.parent_id
+        return otlp_span
+
+
+class Tracer:
+    '''
+    Creates spans and exports the ended ones in batches from a background thread, at most max_batch_size spans
+    per export and at least every export_interval seconds. When the export queue is full spans are dropped
+    instead of slowing down the bot.
+
+    With no exporter the tracer is disabled and costs one attribute check per span.
+    '''
+
+    def __init__(self, exporter=None, max_queue_size: int = 4096, max_batch_size: int = 512, export_interval: float = 1.0):
+        self.max_batch_size = max_batch_size
+        self.export_interval = export_interval
+
+        self.exported = 0
+        self.dropped = 0
+        self.export_failures = 0
+        self._queue: "queue.Queue[Optional[Span]]" = queue.Queue(maxsize=max_queue_size)
+        self._thread: Optional[threading.Thread] = None
+        self.configure(exporter)
+        atexit.register(self.close)
+
+    @classmethod
+    def from_env(cls) -> "Tracer":
+        return cls(exporter_from_env(), export_interval=float(os.environ.get("TRACING_EXPORT_INTERVAL_SECONDS", "1.0")))
+
+    def configure(self, exporter):
+        '''
+        switches to another exporter, tracing is off with None. Spans ended so far are exported first
+        '''
+        self.close()
+        self.exporter = exporter
+        self.enabled = exporter is not None
+        if self.enabled:
+            self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+            self._thread.start()
+
+    def start_span(self, name: str, attributes: Optional[dict] = None, parent: Optional[Span] = None):
+        '''
+        starts a span which is not made current, it must be ended with end(). The parent defaults to the current span
+        '''
+        if not self.enabled:
+            return NOOP_SPAN
+        if parent is None:
+            parent = _current_span.get()
+        if parent is None:
+            return Span(self, name, f"{random.getrandbits(128):032x}", None, attributes)
+        return Span(self, name, parent.trace_id, parent.span_id, attributes)
+
+    def span(self, name: str, attributes: Optional[dict] = None):
+        '''
+        context manager of a new child of the current span, which is current while the with block runs
+        '''
+        if not self.enabled:
+            return NOOP_SPAN
+        return _SpanScope(self.start_span(name, attributes), end_on_exit=True)
+
+    def use_span(self, span, end_on_exit: bool = False):
+        '''
+        makes a span started elsewhere, e.g in another thread, current while the with block runs
+        '''
+        if not self.enabled or span is None or span is NOOP_SPAN:
+            return NOOP_SPAN
+        return _SpanScope(span, end_on_exit)
+
+    def current_span(self):
+        if not self.enabled:
+            return NOOP_SPAN
+        return _current_span.get() or NOOP_SPAN
+
+    def stats(self) -> dict:
+        return {"exported": self.exported, "dropped": self.dropped, "export_failures": self.export_failures,
+                "queued": self._queue.qsize()}
+
+    def close(self):
+        '''
+        exports the spans ended so far and stops the exporter thread
+        '''
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+
+    def _on_end(self, span: Span):
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch = []
+            deadline = time.monotonic() + self.export_interval
+            while len(batch) < self.max_batch_size:
+                try:
+                    span = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if span is None:
+                    stopping = True
+                    break
+                batch.append(span)
+            if not batch:
+                continue
+            try:
+                self.exporter.export(batch)
+                self.exported += len(batch)
+            except Exception as e:
+                self.export_failures += 1
+                logger.error('Could not export %d spans: %s', len(batch), e)
+
+
+def exporter_from_env():
+    exporter_name = os.environ.get("TRACING_EXPORTER", "")
+    if exporter_name not in EXPORTERS:
+        raise ValueError(f"Unknown tracing exporter {exporter_name}, should be one of {EXPORTERS}")
+    if exporter_name == "file":
+        return FileSpanExporter(os.environ.get("TRACING_FILE", "data/traces.jsonl"))
+    if exporter_name == "otlp":
+        return OTLPSpanExporter(os.environ.get("OTEL_EXPORTER_OTLP_ENDPOINT", "http://localhost:4318"),
+                                service_name=os.environ.get("OTEL_SERVICE_NAME", "mrgorlomi"))
+    return None
+
+
+def traced(name: str = None, attributes: Optional[dict] = None):
+    '''
+    decorator tracing every call of a function as a span, named after the function unless name is given
+    '''
+    def decorator(fn: Callable) -> Callable:
+        span_name = name or fn.__qualname__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not tracer.enabled:
+                return fn(*args, **kwargs)
+            with tracer.span(span_name, attributes):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def bind_context(fn: Callable) -> Callable:
+    '''
+    returns fn bound to the current context, so that spans it starts in another thread (e.g run_in_executor)
+    are children of the current span, and the actions it records are those of the current mention
+    '''
+    return functools.partial(contextvars.copy_context().run, fn)
+
+
+tracer = Tracer.from_env()
@@ -0,0 +1,148 @@
+import logging
+import os
+import queue
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Hashable, Tuple
+
+logging.basicConfig()
+logging.getLogger().setLevel(os.environ.get("LOG_LEVEL", "INFO"))
+
+logger = logging.getLogger(__name__)
+
+
+class BoundedWorkerPool:
+    '''
+    Fixed number of worker threads consuming a bounded queue of jobs.
+
+    Jobs can be submitted with a key, e.g a conversation id. Jobs with the same key run one at a time, in the
+    order they were submitted, while jobs with different keys run in parallel. A key only ever occupies one
+    worker, so a busy conversation can't starve the others.
+
+    submit never blocks: when the queue is full the job is rejected and the caller decides what to tell the user.
+    This keeps event handlers fast, they only enqueue the work and return.
+    '''
+
+    def __init__(self, max_workers: int = 10, max_queue_size: int = 100, name: str = "worker"):
+        self.max_workers = max_workers
+        self.max_queue_size = max_queue_size
+
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.in_progress = 0
+        self.max_queue_depth = 0
+        # queue wait of the most recent jobs, in seconds
+        self._waits = deque(maxlen=1000)
+        self._lock = threading.Lock()
+
+        # jobs not started yet, per key. A key is present as long as it has a job queued or running
+        self._pending: Dict[Hashable, Deque[Tuple[float, Callable, tuple]]] = {}
+        self._queued = 0
+        # keys with a job ready to run, a key is in here at most once
+        self._ready: "queue.Queue[Hashable]" = queue.Queue()
+        self._threads = [threading.Thread(target=self._run, name=f"{name}-{i}", daemon=True) for i in range(max_workers)]
+        for thread in self._threads:
+            thread.start()
+
+    @classmethod
+    def from_env(cls, name: str = "worker") -> "BoundedWorkerPool":
+        return cls(
+            max_workers=int(os.environ.get("WORKER_POOL_SIZE", "10")),
+            max_queue_size=int(os.environ.get("WORKER_QUEUE_SIZE", "100")),
+            name=name,
+        )
+
+    def submit(self, job: Callable[..., Any], *args, key: Hashable = None) -> bool:
+        '''
+        queues the job after the other jobs with the same key, returns False if the queue is full.
+        Jobs without a key are not ordered
+        '''
+        if key is None:
+            key = object()
+        with self._lock:
+            if self._queued >= self.max_queue_size:
+                self.rejected += 1
+                return False
+            self._queued += 1
+            self.submitted += 1
+            self.max_queue_depth = max(self.max_queue_depth, self._queued)
+
+            item = (time.monotonic(), job, args)
+            jobs = self._pending.get(key)
+            if jobs is not None:
+                # the worker running this key picks it up when it's done
+                jobs.append(item)
+                return True
+            self._pending[key] = deque([item])
+        self._ready.put(key)
+        return True
+
+    def queue_depth(self) -> int:
+        return self._queued
+
+    def stats(self) -> dict:
+        with self._lock:
+            waits = sorted(self._waits)
+            return {
+                "queue_depth": self._queued,
+                "max_queue_depth": self.max_queue_depth,
+                "active_keys": len(self._pending),
+                "in_progress": self.in_progress,
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+                "wait_ms_mean": round(sum(waits) / len(waits) * 1000, 1) if waits else 0.0,
+                "wait_ms_p95": round(waits[min(len(waits) - 1, int(len(waits) * 0.95))] * 1000, 1) if waits else 0.0,
+                "wait_ms_max": round(waits[-1] * 1000, 1) if waits else 0.0,
+            }
+
+    def close(self, wait: bool = True):
+        '''
+        stops the workers once the jobs queued so far are done
+        '''
+        self.join()
+        for _ in self._threads:
+            self._ready.put(None)
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+    def join(self, poll_interval: float = 0.01):
+        '''
+        waits until all queued and running jobs are done
+        '''
+        while True:
+            with self._lock:
+                if not self._pending:
+                    return
+            time.sleep(poll_interval)
+
+    def _run(self):
+        while True:
+            key = self._ready.get()
+            if key is None:
+                return
+            with self._lock:
+                enqueued_at, job, args = self._pending[key].popleft()
+                self._queued -= 1
+                self._waits.append(time.monotonic() - enqueued_at)
+                self.in_progress += 1
+            try:
+                job(*args)
+                failed = False
+            except Exception:
+                logger.exception('Job %s failed', getattr(job, '__name__', job))
+                failed = True
+            with self._lock:
+                self.in_progress -= 1
+                self.completed += not failed
+                self.failed += failed
+                if self._pending[key]:
+                    # back of the line, other keys get their turn first
+                    self._ready.put(key)
+                else:
+                    del self._pending[key]
@@ -0,0 +1,230 @@
+import logging
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Callable, Iterator, List
+
+from langchain.chains import ConversationChain
+from langchain.schema import AIMessage, BaseMessage, HumanMessage
+
+from core.sqlite.hackathon_sqlite import HackathonSQLite
+from core.tracing import traced, tracer
+
+logging.basicConfig()
+logging.getLogger().setLevel(os.environ.get("LOG_LEVEL", "INFO"))
+logger = logging.getLogger(__name__)
+
+MESSAGE_TYPES = {"human": HumanMessage, "ai": AIMessage}
+# rows of this type hold the running summary of the summary memory mode, as of the messages persisted before them
+SUMMARY_MESSAGE_TYPE = "system"
+
+
+class _Entry:
+    __slots__ = ("chain", "last_used", "size_bytes", "next_seq", "last_persisted", "persisted_summary", "in_use")
+
+    def __init__(self, chain: ConversationChain, next_seq: int):
+        self.chain = chain
+        self.last_used = time.monotonic()
+        self.size_bytes = 0
+        # token budgeted memories drop old messages, so new ones are found after the last persisted message
+        self.next_seq = next_seq
+        messages = chain.memory.chat_memory.messages
+        self.last_persisted = messages[-1] if messages else None
+        self.persisted_summary = getattr(chain.memory, "moving_summary_buffer", "")
+        # number of turns being processed, conversations in use are never evicted
+        self.in_use = 0
+
+
+class ConversationStore:
+    '''
+    Keeps the conversation chains of active threads in memory, bounded by number of entries, approximate size of
+    their message history and idle time. Least recently used conversations are evicted first.
+
+    Message history is written through to SQLite after every turn, so a conversation which was evicted, or
+    was active before a restart, is rehydrated from there the next time it is mentioned. In summary memory mode the
+    running summary is persisted too, whenever it changes, so rehydrating doesn't summarise the history again.
+
+    Usage, for every turn:
+        with conversation_store.conversation(conversation_id) as chain:
+            ...
+    '''
+
+    def __init__(self, create_chain: Callable[[], ConversationChain], db: HackathonSQLite,
+                 max_entries: int = 1000, max_bytes: int = 64 * 1024 * 1024, idle_ttl_seconds: float = 6 * 60 * 60):
+        self.create_chain = create_chain
+        self.db = db
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.idle_ttl_seconds = idle_ttl_seconds
+
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.rehydrations = 0
+
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, create_chain: Callable[[], ConversationChain], db: HackathonSQLite) -> "ConversationStore":
+        return cls(
+            create_chain, db,
+            max_entries=int(os.environ.get("CONVERSATION_STORE_MAX_ENTRIES", "1000")),
+            max_bytes=int(os.environ.get("CONVERSATION_STORE_MAX_BYTES", str(64 * 1024 * 1024))),
+            idle_ttl_seconds=float(os.environ.get("CONVERSATION_IDLE_TTL_SECONDS", str(6 * 60 * 60))),
+        )
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, conversation_id: str) -> bool:
+        return conversation_id in self._entries
+
+    @contextmanager
+    def conversation(self, conversation_id: str) -> Iterator[ConversationChain]:
+        chain = self.acquire(conversation_id)
+        try:
+            yield chain
+        finally:
+            self.release(conversation_id)
+
+    @traced("conversation.acquire")
+    def acquire(self, conversation_id: str) -> ConversationChain:
+        '''
+        returns the chain of the conversation, rehydrating its history from the DB if it's not in memory.
+        The conversation can't be evicted until it's released
+        '''
+        with self._lock:
+            entry = self._entries.get(conversation_id)
+            if entry is not None:
+                entry.in_use += 1
+                entry.last_used = time.monotonic()
+                self._entries.move_to_end(conversation_id)
+                self.hits += 1
+                tracer.current_span().set_attribute("cache.hit", True)
+                return entry.chain
+            self.misses += 1
+        tracer.current_span().set_attribute("cache.hit", False)
+
+        # built outside the lock, the DB read and chain creation are the slow part
+        chain = self.create_chain()
+        messages = self.db.get_conversation_messages(conversation_id)
+        summary = None
+        for message_type, content in messages:
+            if message_type == SUMMARY_MESSAGE_TYPE:
+                summary = content
+            else:
+                chain.memory.chat_memory.add_message(MESSAGE_TYPES[message_type](content=content))
+        if summary is not None and hasattr(chain.memory, "moving_summary_buffer"):
+            self._restore_summary(chain, summary)
+        if messages and hasattr(chain.memory, "prune"):
+            # bring rehydrated history within the memory's token budget
+            chain.memory.prune()
+        if messages:
+            logger.info('Rehydrated conversation %s with %d messages', conversation_id, len(messages))
+            tracer.current_span().set_attribute("conversation.rehydrated_messages", len(messages))
+
+        with self._lock:
+            # another thread may have loaded the same conversation meanwhile
+            entry = self._entries.get(conversation_id)
+            if entry is None:
+                entry = self._entries[conversation_id] = _Entry(chain, next_seq=len(messages))
+                self._resize(entry)
+                if messages:
+                    self.rehydrations += 1
+            entry.in_use += 1
+            entry.last_used = time.monotonic()
+            self._entries.move_to_end(conversation_id)
+            self._evict()
+            return entry.chain
+
+    @traced("conversation.release")
+    def release(self, conversation_id: str):
+        '''
+        persists the messages added to the conversation since it was acquired and re-applies the bounds
+        '''
+        with self._lock:
+            entry = self._entries[conversation_id]
+            messages = self._get_messages(entry.chain)
+            new_messages = messages[self._index_after(messages, entry.last_persisted):]
+            start_seq = entry.next_seq
+            if new_messages:
+                entry.last_persisted = new_messages[-1]
+                new_messages = [(message.type, message.content) for message in new_messages]
+            # persisted after the messages, so that on rehydration it covers every message pruned from the buffer
+            summary = getattr(entry.chain.memory, "moving_summary_buffer", "")
+            if summary != entry.persisted_summary:
+                entry.persisted_summary = summary
+                new_messages.append((SUMMARY_MESSAGE_TYPE, summary))
+            entry.next_seq += len(new_messages)
+            entry.last_used = time.monotonic()
+            self._resize(entry)
+
+        # written before the entry can be evicted, so that a rehydration always sees the full history
+        try:
+            if new_messages:
+                self.db.append_conversation_messages(conversation_id, start_seq, new_messages)
+        finally:
+            with self._lock:
+                entry.in_use -= 1
+                self._evict()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.total_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "rehydrations": self.rehydrations,
+            }
+
+    def _restore_summary(self, chain: ConversationChain, summary: str):
+        '''
+        restores the running summary and drops the oldest messages down to the token budget, without summarising them
+        again: the summary already covers every message which didn't fit in the buffer when it was persisted
+        '''
+        memory = chain.memory
+        memory.moving_summary_buffer = summary
+        buffer = memory.chat_memory.messages
+        while buffer and memory.llm.get_num_tokens_from_messages(buffer) > memory.max_token_limit:
+            buffer.pop(0)
+
+    def _get_messages(self, chain: ConversationChain) -> List[BaseMessage]:
+        return chain.memory.chat_memory.messages
+
+    def _index_after(self, messages: List[BaseMessage], message: BaseMessage) -> int:
+        for i in range(len(messages) - 1, -1, -1):
+            if messages[i] is message:
+                return i + 1
+        # not found, i.e it was pruned along with all the messages before it
+        return 0
+
+    def _resize(self, entry: _Entry):
+        size_bytes = sum(sys.getsizeof(message.content) for message in self._get_messages(entry.chain))
+        self.total_bytes += size_bytes - entry.size_bytes
+        entry.size_bytes = size_bytes
+
+    def _evict(self):
+        expired_before = time.monotonic() - self.idle_ttl_seconds
+        entries_left, bytes_left = len(self._entries), self.total_bytes
+        evicted = []
+        for conversation_id, entry in self._entries.items():
+            over_limit = entries_left > self.max_entries or bytes_left > self.max_bytes
+            if not over_limit and entry.last_used >= expired_before:
+                break  # entries are in LRU order, the rest are more recent
+            if entry.in_use:
+                continue
+            evicted.append(conversation_id)
+            entries_left -= 1
+            bytes_left -= entry.size_bytes
+
+        for conversation_id in evicted:
+            del self._entries[conversation_id]
+        self.total_bytes = bytes_left
+        self.evictions += len(evicted)
@@ -0,0 +1,137 @@
+import csv
+import math
+import os
+import re
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+INTENT_CORPUS_FILEPATH = os.path.join(os.path.dirname(__file__), "intent_corpus.csv")
+
+# actions which need no team name, i.e the whole answer comes from HackathonSQLite
+LOCAL_ACTIONS = ("list_teams", "list_my_team", "get_unassigned_participants", "recommend_teammates", "leave_current_team",
+                 "delete_my_team")
+# actions which change data, only ever taken on an exact rule match
+DESTRUCTIVE_ACTIONS = ("leave_current_team", "delete_my_team")
+
+_FILLER = r"(?:(?:hey|hi|hello|ok|okay|so|mr gorlomi|gorlomi|bot|please|pls|kindly|can you|could you|would you|just)\s+)*"
+_POLITE_END = r"(?:\s+(?:please|pls|thanks|thank you))?"
+
+# matched against the whole normalised message
+RULES: List[Tuple[str, str]] = [
+    ("list_teams", r"(?:list|show|display|give me|show me|get)(?: me)?(?: all| the| all the| every)? (?:teams|registered teams|team list|list of teams)(?: and (?:their )?members| with (?:their )?members)?"),
+    ("list_teams", r"(?:all )?teams"),
+    ("list_my_team", r"(?:list|show|display|show me|get)(?: me)? (?:my|our) team(?: members| details| info)?"),
+    ("list_my_team", r"(?:my|our) team(?: members| details| info)?"),
+    ("list_my_team", r"(?:which|what) team (?:am i in|am i part of|do i belong to)"),
+    ("list_my_team", r"who (?:is|else is|are) (?:in|on) my team"),
+    ("get_unassigned_participants", r"(?:list|show|display|show me|get)(?: me)?(?: all| the)? (?:unassigned|free) (?:participants|people|folks|members)"),
+    ("get_unassigned_participants", r"(?:unassigned|free) (?:participants|people|folks)"),
+    ("get_unassigned_participants", r"who (?:is|are) (?:unassigned|not in (?:a|any) team|without (?:a )?team)"),
+    ("recommend_teammates", r"(?:suggest|recommend|find)(?: me| us)?(?: some| a few)? (?:teammates|team mates|people)(?: for (?:my|our) team)?"),
+    ("leave_current_team", r"(?:i want to |i'd like to |i would like to )?(?:leave|exit|quit) (?:my|the|our|this)(?: current)? team"),
+    ("leave_current_team", r"leave(?: current)? team"),
+    ("leave_current_team", r"(?:remove|take) me (?:from|out of) (?:my|the|our|this)(?: current)? team"),
+    ("delete_my_team", r"(?:i want to |i'd like to |i would like to )?(?:delete|disband|dissolve) (?:my|our) team"),
+]
+_COMPILED_RULES = [(action, re.compile(_FILLER + pattern + _POLITE_END)) for action, pattern in RULES]
+
+
+class IntentPrediction(NamedTuple):
+    action: str
+    confidence: float
+    source: str  # rule or model
+
+
+def normalise(text: str) -> str:
+    text = text.lower().replace("’", "'")
+    text = re.sub(r"<@[a-z0-9]+>", " ", text)  # slack mentions
+    text = re.sub(r"[^a-z0-9' ]+", " ", text)
+    return " ".join(text.split())
+
+
+def tokenise(text: str) -> List[str]:
+    words = text.split()
+    return words + [f"{a}_{b}" for a, b in zip(words, words[1:])]
+
+
+def read_corpus(filepath: str = INTENT_CORPUS_FILEPATH) -> List[Tuple[str, str]]:
+    with open(filepath, "r", newline="") as f:
+        return [(row["text"], row["action"]) for row in csv.DictReader(f)]
+
+
+class NaiveBayesIntentModel:
+    '''
+    multinomial naive bayes over words and word bigrams, scores every known action
+    '''
+
+    def __init__(self, examples: Iterable[Tuple[str, str]]):
+        self.word_counts: Dict[str, Counter] = defaultdict(Counter)
+        action_counts = Counter()
+        for text, action in examples:
+            action_counts[action] += 1
+            self.word_counts[action].update(tokenise(normalise(text)))
+
+        total = sum(action_counts.values())
+        self.vocabulary = set(word for counts in self.word_counts.values() for word in counts)
+        self.log_priors = {action: math.log(count / total) for action, count in action_counts.items()}
+        self.totals = {action: sum(counts.values()) for action, counts in self.word_counts.items()}
+
+    def known_ratio(self, text: str) -> float:
+        words = normalise(text).split()
+        return sum(word in self.vocabulary for word in words) / len(words) if words else 0.0
+
+    def predict(self, text: str) -> Tuple[str, float]:
+        tokens = [token for token in tokenise(normalise(text)) if token in self.vocabulary]
+        vocabulary_size = len(self.vocabulary)
+        scores = {}
+        for action, log_prior in self.log_priors.items():
+            counts, denominator = self.word_counts[action], self.totals[action] + vocabulary_size
+            scores[action] = log_prior + sum(math.log((counts[token] + 1) / denominator) for token in tokens)
+
+        best = max(scores, key=scores.get)
+        # softmax of the log scores, i.e the posterior of the best action
+        confidence = 1 / sum(math.exp(score - scores[best]) for score in scores.values())
+        return best, confidence
+
+
+class IntentClassifier:
+    '''
+    deterministic classifier for the bot actions, used to answer unambiguous messages without calling the LLM.
+
+    Messages matching one of the RULES are taken as is. Otherwise the naive bayes model trained on the labelled
+    corpus decides, but only for read only actions, when it's confident and knows most of the message's words.
+    Anything needing a team name, clarification or a free form answer is left to the LLM.
+    '''
+
+    def __init__(self, examples: Iterable[Tuple[str, str]] = None, min_confidence: float = 0.9,
+                 max_words: int = 12, min_known_ratio: float = 0.75):
+        self.model = NaiveBayesIntentModel(read_corpus() if examples is None else examples)
+        self.min_confidence = min_confidence
+        self.max_words = max_words
+        self.min_known_ratio = min_known_ratio
+
+    @classmethod
+    def from_env(cls) -> "IntentClassifier":
+        return cls(min_confidence=float(os.environ.get("INTENT_FAST_PATH_MIN_CONFIDENCE", "0.9")))
+
+    def predict(self, text: str) -> IntentPrediction:
+        normalised = normalise(text)
+        for action, rule in _COMPILED_RULES:
+            if rule.fullmatch(normalised):
+                return IntentPrediction(action, 1.0, "rule")
+        action, confidence = self.model.predict(normalised)
+        return IntentPrediction(action, confidence, "model")
+
+    def local_action(self, text: str) -> Optional[IntentPrediction]:
+        '''
+        returns the prediction if the message can be answered locally, None if it should go to the LLM
+        '''
+        prediction = self.predict(text)
+        if prediction.source == "rule":
+            return prediction
+        if (prediction.action in LOCAL_ACTIONS and prediction.action not in DESTRUCTIVE_ACTIONS
+                and prediction.confidence >= self.min_confidence
+                and len(normalise(text).split()) <= self.max_words
+                and self.model.known_ratio(text) >= self.min_known_ratio):
+            return prediction
+        return None
@@ -0,0 +1,38 @@
+from langchain.chat_models import ChatOpenAI
+from langchain.memory import ConversationBufferMemory, ConversationSummaryBufferMemory, ConversationTokenBufferMemory
+from langchain.schema import BaseMemory
+
+# buffer : whole thread history is sent to the LLM on every turn
+# token_window : recent turns verbatim within the token budget, older ones are dropped
+# summary : recent turns verbatim within the token budget, older ones are compacted into a running summary
+MEMORY_MODES = ("buffer", "token_window", "summary")
+
+
+class TokenWindowMemory(ConversationTokenBufferMemory):
+    '''
+    ConversationTokenBufferMemory which can also be pruned on demand, e.g after its history is rehydrated
+    '''
+
+    def save_context(self, inputs, outputs) -> None:
+        super(ConversationTokenBufferMemory, self).save_context(inputs, outputs)
+        self.prune()
+
+    def prune(self) -> None:
+        buffer = self.chat_memory.messages
+        while buffer and self.llm.get_num_tokens_from_messages(buffer) > self.max_token_limit:
+            buffer.pop(0)
+
+
+def create_memory(mode: str, llm: ChatOpenAI, max_tokens: int, summary_model_name: str) -> BaseMemory:
+    '''
+    creates the conversation memory for the given mode, history is measured in tokens of the given llm (tiktoken)
+    '''
+    if mode == "buffer":
+        return ConversationBufferMemory(human_prefix="User", ai_prefix="Bot")
+    elif mode == "token_window":
+        return TokenWindowMemory(llm=llm, max_token_limit=max_tokens, human_prefix="User", ai_prefix="Bot")
+    elif mode == "summary":
+        # a separate llm, the conversation one is set to always answer in JSON
+        summary_llm = ChatOpenAI(model_name=summary_model_name, temperature=0)
+        return ConversationSummaryBufferMemory(llm=summary_llm, max_token_limit=max_tokens, human_prefix="User", ai_prefix="Bot")
+    raise ValueError(f"Unknown conversation memory mode {mode}, should be one of {MEMORY_MODES}")
@@ -1,25 +1,77 @@
 
 from langchain.chains import ConversationChain
-from langchain.memory import ConversationBufferMemory
 
 from langchain.chat_models import ChatOpenAI
 from langchain.prompts import PromptTemplate
-
-from core.sqlite.hackathon_sqlite import HackathonSQLite, HackathonError
+from langchain.prompts.base import StringPromptValue
+
+from core.metrics import HACKATHON_ERRORS, LLM_JSON_PARSE_FAILURES, LLM_REQUEST_SECONDS, LLM_TOKENS, error_label, record_action
+from core.sqlite.hackathon_sqlite import HackathonSQLite, HackathonError, get_hackathon_sqlite
+from core.tracing import bind_context, traced, tracer
+from llm.intent import DESTRUCTIVE_ACTIONS, LOCAL_ACTIONS, IntentClassifier
+from llm.memory import MEMORY_MODES, create_memory
+from llm.resilience import RETRYABLE_ERRORS, Attempt, AttemptCallbackHandler, CircuitOpenError, ResilientCaller
+from llm.streaming import JsonMessageStreamHandler
+from llm.token_usage import TokenUsageHandler
+from typing import Callable, Optional, Tuple
+import asyncio
 import json
 import logging
 import traceback
 import os
 
+import openai
+
 
 logging.basicConfig()
 logging.getLogger().setLevel(os.environ.get("LOG_LEVEL", "INFO"))
 logger = logging.getLogger(__name__)
 
+# actions the LLM is asked to pick from, anything else is handled as clarify
+ACTIONS = ("create_team", "list_teams", "join_team", "get_unassigned_participants", "recommend_teammates",
+           "leave_current_team", "delete_my_team", "rename_my_team", "list_my_team", "clarify")
+
+# appended to the prompt when the LLM response was not valid JSON
+JSON_REPROMPT = """
+
+        Your previous response was not valid JSON:
+        {response}
+
+        Respond again, only with a valid JSON object in the format above.
+        """
+
+# while OpenAI is unavailable, read only actions are answered from the fast path's best guess above this confidence
+DEGRADED_MIN_CONFIDENCE = 0.5
+DEGRADED_MESSAGE = ("Mamma mia, my brain is taking a little nap. I can still list teams, show your team or suggest "
+                    "unassigned folks, for anything else pls try again in a minute.")
+
 class OpenAILLM:
 
-    def __init__(self, model_name: str = "gpt-4o"):
+    def __init__(self, model_name: str = "gpt-4o", memory_mode: str = None, memory_max_tokens: int = None):
         self.model_name = model_name
+
+        # how much thread history is sent to the LLM, see llm/memory.py
+        self.memory_mode = memory_mode or os.environ.get("CONVERSATION_MEMORY", "buffer")
+        self.memory_max_tokens = memory_max_tokens or int(os.environ.get("CONVERSATION_MEMORY_MAX_TOKENS", "1500"))
+        self.summary_model_name = os.environ.get("CONVERSATION_SUMMARY_MODEL", "gpt-4o-mini")
+        if self.memory_mode not in MEMORY_MODES:
+            raise ValueError(f"Unknown conversation memory mode {self.memory_mode}, should be one of {MEMORY_MODES}")
+
+        # stream completions, so that the "message" of the response can be shown while it's being written
+        self.stream_replies = os.environ.get("STREAM_REPLIES", "0") == "1"
+
+        # unambiguous messages like "list teams" are answered without calling the LLM, see llm/intent.py
+        self.intent_classifier = IntentClassifier.from_env() if os.environ.get("INTENT_FAST_PATH", "1") == "1" else None
+
+        # tokens a user can spend per UTC day before their turns go to the cheaper model, 0 for no budget
+        self.token_budget_per_user_per_day = int(os.environ.get("TOKEN_BUDGET_PER_USER_PER_DAY", "0"))
+        self.budget_fallback_model_name = os.environ.get("TOKEN_BUDGET_FALLBACK_MODEL", "gpt-4o-mini")
+        self._budget_llm = None
+
+        # deadlines, retries, hedging and circuit breaking of the LLM calls, see llm/resilience.py
+        self.llm_caller = ResilientCaller.from_env()
+        self.json_reprompts = int(os.environ.get("LLM_JSON_REPROMPTS", "1"))
+
         self.prompt_template = """
         You are an friendly AI assistant and your job is to help users with their queries about hackathon. 
         You name is Mr. Gorlomi and you're from italy and you speak engilsh. Don't talk in italian ever. 
@@ -30,7 +82,7 @@ class OpenAILLM:
         - Can non-engineering folks participate in the hackathon : No, they cannot participate in the hackathon, but they can help the participants by suggesting and refining ideas.
         - About team formation : 
             - How many teams can a user create : A user can create only one team.
-            - How many members can a team have : A team can have a minimum of 2 members and a maximum of 5 members.
+            - How many members can a team have : A team can have a minimum of 2 members and a maximum of {max_team_size} members.
             - Can a user be part of multiple teams : No, a user can be part of only one team.
             - Can a user add other users to any team ? : No, users can only join or leave the team they wish to join. Any user cannot act on behalf of another user, for the purpose of joining or leaving team.
         - Where can the user find more information about the hackathon : https://www.notion.so/fyleuniverse/Fyle-Hackathon-ac6712db47db461da2f2fefdf5ef0819
@@ -50,7 +102,8 @@ class OpenAILLM:
         6. Delete user's team (delete_my_team)
         7. Rename team (rename_my_team)
         8. List my team or show details of my team (list_my_team)
-        9. Clarify the user's intent (clarify)
+        9. Suggest team mates for the user's team (recommend_teammates)
+        10. Clarify the user's intent (clarify)
 
         If the user wants to create a team, figure out the team name from their response or ask if team name is not provided.
         If the user wants to join a team, figure out the team name from their response or ask if team name is not provided. 
@@ -62,7 +115,7 @@ class OpenAILLM:
         If the user wants to rename their team or give a new name to their team or edit their team name or change their team name or overwrite their team name, figure out the new "team name" from their response or ask if the new "team name" is not provided. Only team captain can rename their team.
         If the user is inquiring anything about hackathon, answer from the "Context about the hackathon" section.
         If the user is asking about how you can help them, respond with how you can help them based on the actions you can take.
-        if the user is asking for suggestions for team mates who can join their team, list the unassigned participants.
+        if the user is asking for suggestions for team mates who can join their team, categorise the action as "recommend_teammates".
         If the user's intent is unclear, ask for clarification. 
 
         Be crisp in your response. Don't hallucinate or create information and asnwer strictly from the context provided.
@@ -70,23 +123,204 @@ class OpenAILLM:
 
         Respond in the following JSON format:
         {{
-            "action": "create_team" or "list_teams" or "join_team" or "get_unassigned_participants" or "leave_current_team" or "delete_my_team" or "clarify",
+            "action": "create_team" or "list_teams" or "join_team" or "get_unassigned_participants" or "recommend_teammates" or "leave_current_team" or "delete_my_team" or "clarify",
             "team_name": "extracted team name" (if applicable),
             "message": "a friendly message to the user based on their intent"
         }}
         """
 
     def get_hackathon_database_connection(self) -> HackathonSQLite:
-        return HackathonSQLite()
+        return get_hackathon_sqlite()
         
-    def get_conversation(self, chain: ConversationChain, prompt: str, username: str):
+    def get_conversation(self, chain: ConversationChain, prompt: str, username: str, on_message: Callable[[str], None] = None,
+                         conversation_id: str = None):
+        '''
+        on_message, if given, is called with the "message" of the LLM response decoded so far while it streams.
+        Actions are only taken once the whole response is received.
+        Returns the reply and the tokens the turn used, which are added to the user's token ledger
+        '''
+        is_participant, combined_input = self._prepare_input(chain, prompt, username)
+        local_response = self._answer_locally(chain, prompt, combined_input, is_participant)
+        if local_response is not None:
+            return self._handle_llm_response(local_response, username, is_participant, 0)
+
+        chain = self._budget_chain(chain, username)
+        usage = TokenUsageHandler(chain.llm)
+        try:
+            with tracer.span("llm.chat", self._span_attributes(chain)) as span, LLM_REQUEST_SECONDS.labels(chain.llm.model_name).time():
+                response_text = self._call_chain(chain, combined_input, usage, on_message)
+                self._observe_usage(span, usage)
+        except (CircuitOpenError,) + RETRYABLE_ERRORS as e:
+            logger.error('LLM unavailable, answering without it: %s', e)
+            response_text = self._degraded_response(prompt, is_participant)
+        except openai.error.OpenAIError as e:
+            # not retried and not counted by the circuit breaker, e.g a context too long or a bad API key
+            logger.error('LLM request failed, answering without it: %s', e)
+            response_text = self._degraded_response(prompt, is_participant)
+        finally:
+            self._record_usage(usage, username, conversation_id)
+        logger.info('LLM full response %s', response_text)
+        return self._handle_llm_response(response_text, username, is_participant, usage.total_tokens)
+
+    async def aget_conversation(self, chain: ConversationChain, prompt: str, username: str, on_message: Callable[[str], None] = None,
+                                conversation_id: str = None):
+        '''
+        same as get_conversation, but the LLM is called asynchronously and DB work runs in the default executor
+        '''
+        loop = asyncio.get_running_loop()
+        is_participant, combined_input = await loop.run_in_executor(None, bind_context(self._prepare_input), chain, prompt, username)
+        # saving the turn in a summary memory may call the LLM, synchronously
+        local_response = await loop.run_in_executor(None, bind_context(self._answer_locally), chain, prompt, combined_input, is_participant)
+        if local_response is not None:
+            return await loop.run_in_executor(None, bind_context(self._handle_llm_response), local_response, username, is_participant, 0)
+
+        chain = await loop.run_in_executor(None, bind_context(self._budget_chain), chain, username)
+        usage = TokenUsageHandler(chain.llm)
+        try:
+            with tracer.span("llm.chat", self._span_attributes(chain)) as span, LLM_REQUEST_SECONDS.labels(chain.llm.model_name).time():
+                response_text = await self._acall_chain(chain, combined_input, usage, on_message)
+                self._observe_usage(span, usage)
+        except (CircuitOpenError,) + RETRYABLE_ERRORS as e:
+            logger.error('LLM unavailable, answering without it: %s', e)
+            response_text = self._degraded_response(prompt, is_participant)
+        except openai.error.OpenAIError as e:
+            # not retried and not counted by the circuit breaker, e.g a context too long or a bad API key
+            logger.error('LLM request failed, answering without it: %s', e)
+            response_text = self._degraded_response(prompt, is_participant)
+        finally:
+            await loop.run_in_executor(None, bind_context(self._record_usage), usage, username, conversation_id)
+        logger.info('LLM full response %s', response_text)
+        return await loop.run_in_executor(None, bind_context(self._handle_llm_response), response_text, username, is_participant, usage.total_tokens)
+
+    def _call_chain(self, chain: ConversationChain, combined_input: str, usage: TokenUsageHandler,
+                    on_message: Optional[Callable[[str], None]]) -> str:
+        '''
+        runs the chain's LLM call through the resilient caller, re-prompting it while its response is not valid JSON.
+        Only a valid response is saved in the conversation memory, the last invalid one is returned otherwise
+        '''
+        inputs = chain.prep_inputs({"input": combined_input})
+        prompts, stop = chain.prep_prompts([inputs])
+        response_text = ""
+        for reprompt in range(self.json_reprompts + 1):
+            if reprompt:
+                prompts = self._reprompt(prompts, response_text)
+            result = self.llm_caller.call(lambda attempt: chain.llm.generate_prompt(
+                prompts, stop, callbacks=self._callbacks(attempt, on_message, usage), **chain.llm_kwargs))
+            response_text = chain.create_outputs(result)[0][chain.output_key]
+            if self._parse_response(response_text, chain.llm.model_name) is not None:
+                chain.prep_outputs(inputs, {chain.output_key: response_text})
+                break
+        return response_text
+
+    async def _acall_chain(self, chain: ConversationChain, combined_input: str, usage: TokenUsageHandler,
+                           on_message: Optional[Callable[[str], None]]) -> str:
+        '''
+        same as _call_chain, with the LLM called asynchronously. The response is saved in the memory in the default
+        executor, a summary memory calls the LLM synchronously to compact older turns
+        '''
+        loop = asyncio.get_running_loop()
+        inputs = chain.prep_inputs({"input": combined_input})
+        prompts, stop = await chain.aprep_prompts([inputs])
+        response_text = ""
+        for reprompt in range(self.json_reprompts + 1):
+            if reprompt:
+                prompts = self._reprompt(prompts, response_text)
+            result = await self.llm_caller.acall(lambda attempt: chain.llm.agenerate_prompt(
+                prompts, stop, callbacks=self._callbacks(attempt, on_message, usage), **chain.llm_kwargs))
+            response_text = chain.create_outputs(result)[0][chain.output_key]
+            if self._parse_response(response_text, chain.llm.model_name) is not None:
+                await loop.run_in_executor(None, bind_context(chain.prep_outputs), inputs, {chain.output_key: response_text})
+                break
+        return response_text
+
+    def _reprompt(self, prompts: list, response_text: str) -> list:
+        tracer.current_span().set_attribute("llm.json_reprompted", True)
+        return [StringPromptValue(text=prompts[0].to_string() + JSON_REPROMPT.format(response=response_text))]
+
+    def _parse_response(self, response_text: str, model_name: str) -> Optional[dict]:
+        '''
+        returns the decoded response, None if it's not a JSON object
+        '''
+        try:
+            llm_response = json.loads(response_text)
+        except json.JSONDecodeError:
+            llm_response = None
+        if not isinstance(llm_response, dict):
+            logger.warning('LLM response is not a JSON object: %s', response_text)
+            LLM_JSON_PARSE_FAILURES.labels(model_name).inc()
+            return None
+        return llm_response
+
+    def _degraded_response(self, prompt: str, is_participant: bool) -> str:
+        '''
+        the response when the LLM can't be reached: the fast path's best guess if it's a read only action, clarify otherwise
+        '''
+        tracer.current_span().set_attribute("llm.degraded", True)
+        if self.intent_classifier is not None:
+            prediction = self.intent_classifier.predict(prompt)
+            if (prediction.action in LOCAL_ACTIONS and prediction.action not in DESTRUCTIVE_ACTIONS
+                    and prediction.confidence >= DEGRADED_MIN_CONFIDENCE
+                    and (is_participant or prediction.action in ("list_teams", "get_unassigned_participants"))):
+                return json.dumps({"action": prediction.action, "team_name": "", "message": ""})
+        return json.dumps({"action": "clarify", "team_name": "", "message": DEGRADED_MESSAGE})
+
+    def _span_attributes(self, chain: ConversationChain) -> dict:
+        return {"llm.model": chain.llm.model_name, "llm.streaming": self.stream_replies, "llm.memory": self.memory_mode}
+
+    def _callbacks(self, attempt: Attempt, on_message: Optional[Callable[[str], None]], usage: TokenUsageHandler) -> list:
+        '''
+        a hedge doesn't stream. Nothing an abandoned attempt reports is used: its stream is dropped, the next
+        attempt or the final reply writes the message instead, and its tokens are left out of the turn's usage
+        though OpenAI may still bill them
+        '''
+        if on_message is None or not self.stream_replies or attempt.hedged:
+            return [AttemptCallbackHandler(attempt, [usage])]
+        return [AttemptCallbackHandler(attempt, [usage, JsonMessageStreamHandler(on_message)])]
+
+    def _observe_usage(self, span, usage: TokenUsageHandler):
+        span.set_attributes({"llm.prompt_tokens": usage.prompt_tokens, "llm.completion_tokens": usage.completion_tokens,
+                             "llm.tokens_estimated": usage.estimated})
+        LLM_TOKENS.labels(usage.model_name, "prompt").observe(usage.prompt_tokens)
+        LLM_TOKENS.labels(usage.model_name, "completion").observe(usage.completion_tokens)
+
+    def _record_usage(self, usage: TokenUsageHandler, username: str, conversation_id: Optional[str]):
+        if not usage.calls:
+            return
+        try:
+            self.get_hackathon_database_connection().record_token_usage(
+                username, conversation_id, usage.model_name, usage.prompt_tokens, usage.completion_tokens, usage.estimated)
+        except HackathonError as e:
+            # the reply matters more than the ledger
+            logger.error('Could not record token usage of %s: %s', username, e)
 
+    def _budget_chain(self, chain: ConversationChain, username: str) -> ConversationChain:
+        '''
+        returns the chain to answer the user with: the same chain on the cheaper model, sharing its memory,
+        once the user has used up their tokens of the day
+        '''
+        if not self.token_budget_per_user_per_day:
+            return chain
+        try:
+            prompt_tokens, completion_tokens = self.get_hackathon_database_connection().get_user_token_usage(username)
+        except HackathonError as e:
+            logger.error('Could not read token usage of %s: %s', username, e)
+            return chain
+        if prompt_tokens + completion_tokens < self.token_budget_per_user_per_day:
+            return chain
+
+        logger.info('%s is over the daily token budget (%d tokens), answering with %s', username,
+                    prompt_tokens + completion_tokens, self.budget_fallback_model_name)
+        tracer.current_span().set_attribute("llm.over_budget", True)
+        if self._budget_llm is None:
+            self._budget_llm = self._create_llm(self.budget_fallback_model_name)
+        return ConversationChain(prompt=chain.prompt, llm=self._budget_llm, memory=chain.memory, verbose=chain.verbose)
+
+    def _prepare_input(self, chain: ConversationChain, prompt: str, username: str) -> Tuple[bool, str]:
         # check whether user is a hackathon participant
         is_participant, user_full_name, user_bio = self.get_hackathon_database_connection().get_participant_details(username=username)
         user_details_text = f"User's full name is {user_full_name} and user has written \"{user_bio}\" in their bio." if is_participant else "User is not a hackathon participant"
 
         # talk to the LLM
-        num_tokens = chain.llm.get_num_tokens(prompt)
         combined_input = f'''
             User details: {user_details_text}
             You can use the "User details" information to personalize your responses and make light jokes.
@@ -95,9 +329,42 @@ class OpenAILLM:
         '''
 
         logger.info(f'LLM combined input {combined_input}')
-        response = chain({"input": combined_input})
-        logger.info('LLM full response', response)
-        llm_response = json.loads(response['response'])
+        return is_participant, combined_input
+
+    def _answer_locally(self, chain: ConversationChain, prompt: str, combined_input: str, is_participant: bool) -> Optional[str]:
+        '''
+        returns the response the LLM would give for an unambiguous message, None if the LLM is needed.
+        The turn is saved in the conversation memory, so that later turns still have it as context
+        '''
+        if self.intent_classifier is None:
+            return None
+        prediction = self.intent_classifier.local_action(prompt)
+        if prediction is None:
+            return None
+        if not is_participant and prediction.action not in ("list_teams", "get_unassigned_participants"):
+            return None  # the LLM explains why non participants can't do this
+
+        logger.info('Answered locally as %s (%s, confidence %.2f)', prediction.action, prediction.source, prediction.confidence)
+        tracer.current_span().set_attributes({"intent.action": prediction.action, "intent.source": prediction.source,
+                                              "intent.confidence": prediction.confidence})
+        response_text = json.dumps({"action": prediction.action, "team_name": "", "message": ""})
+        chain.memory.save_context({"input": combined_input}, {"response": response_text})
+        return response_text
+
+    @traced("hackathon.handle_action")
+    def _handle_llm_response(self, response_text: str, username: str, is_participant: bool, num_tokens: int) -> Tuple[str, int]:
+        try:
+            llm_response = json.loads(response_text)
+        except json.JSONDecodeError:
+            llm_response = None
+        if not isinstance(llm_response, dict):
+            # still not valid JSON after re-prompting, already counted in LLM_JSON_PARSE_FAILURES
+            return 'Oopsiedoodle, I got confused, pls say that again', num_tokens
+        # metric label, the LLM could answer with any string
+        action = llm_response.get("action") if llm_response.get("action") in ACTIONS else "other"
+        tracer.current_span().set_attributes({"hackathon.action": action, "hackathon.is_participant": is_participant,
+                                              "llm.total_tokens": num_tokens})
+        record_action(action)
 
         try:
             if is_participant:
@@ -110,10 +377,10 @@ class OpenAILLM:
 
                 elif llm_response["action"] == "join_team":
                     if "team_name" in llm_response and llm_response.get("team_name"):
-                        success = self.get_hackathon_database_connection().join_team(llm_response["team_name"], username)
-                        if not success:
+                        joined_team_name = self.get_hackathon_database_connection().join_team(llm_response["team_name"], username)
+                        if not joined_team_name:
                             raise HackathonError("Could not join team, please try again.")
-                        return f'You joined {llm_response.get("team_name")} team successfully', num_tokens
+                        return f'You joined {joined_team_name} team successfully', num_tokens
                     else:
                         return llm_response["message"], num_tokens
 
@@ -140,6 +407,13 @@ class OpenAILLM:
                     team_info = self.get_hackathon_database_connection().list_my_team(username=username)
                     return team_info, num_tokens
 
+                elif llm_response["action"] == "recommend_teammates":
+                    recommendations = self.get_hackathon_database_connection().recommend_teammates(username)
+                    if not recommendations:
+                        return "I couldn't find unassigned folks whose bio adds anything new to your team.", num_tokens
+                    userlist_str = "\n".join(f"{full_name} ({', '.join(skills)})" for full_name, skills in recommendations)
+                    return f'Unassigned folks who would add the most to your team: \n {userlist_str}', num_tokens
+
                 #### Archiving idea bit for now, will open later
                 # elif llm_response["action"] == "add_idea":
                 #     if "idea_text" in llm_response and llm_response.get("idea_text"):
@@ -174,21 +448,29 @@ class OpenAILLM:
 
         except HackathonError as e:
             logger.error('handle failed: %s\n %s', str(e), traceback.format_exc())
+            HACKATHON_ERRORS.labels(action, error_label(str(e))).inc()
             return str(e), num_tokens
 
         except Exception as e:
             logger.error('handle failed: %s\n %s', str(e), traceback.format_exc())
             return 'Oopsiedoodle, some error occured, pls try again', num_tokens
 
+    def _create_llm(self, model_name: str) -> ChatOpenAI:
+        # retries are done by self.llm_caller, the HTTP request times out with the attempt
+        llm = ChatOpenAI(model_name=model_name, streaming=self.stream_replies,
+                         request_timeout=self.llm_caller.attempt_timeout, max_retries=0)
+        llm.model_kwargs = {"temperature": 0.5, "response_format" : {"type": "json_object"}}
+        return llm
+
     def get_conversation_chain(self) -> ConversationChain:
         
-        llm = ChatOpenAI(model_name=self.model_name)
-        llm.model_kwargs = {"temperature": 0.5, "response_format" : {"type": "json_object"}}
+        llm = self._create_llm(self.model_name)
 
         prompt = PromptTemplate(
-            input_variables=["history", "input"], template=self.prompt_template)
+            input_variables=["history", "input"], template=self.prompt_template,
+            partial_variables={"max_team_size": str(self.get_hackathon_database_connection().max_team_size)})
 
-        memory = ConversationBufferMemory(human_prefix="User", ai_prefix="Bot")
+        memory = create_memory(self.memory_mode, llm, self.memory_max_tokens, self.summary_model_name)
         conversation = ConversationChain(
             prompt=prompt,
             llm=llm,
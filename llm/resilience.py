@@ -0,0 +1,330 @@
+'''
+Resilient LLM calls: every attempt has a deadline, failed attempts are retried after an exponential backoff with
+full jitter, a slow attempt can be hedged with a second request once it takes longer than the p95 latency of
+recent attempts, and a circuit breaker stops calling OpenAI for a while after consecutive failures, so that
+mentions are answered right away (from the intent fast path or with a clarify message) instead of timing out.
+
+Usage:
+    caller = ResilientCaller.from_env()
+    result = caller.call(lambda attempt: llm.generate_prompt(prompts))
+    result = await caller.acall(lambda attempt: llm.agenerate_prompt(prompts))
+'''
+
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Awaitable, Callable, List, Optional, TypeVar
+
+import openai
+from langchain.callbacks.base import BaseCallbackHandler
+
+from core.tracing import bind_context, tracer
+
+logging.basicConfig()
+logging.getLogger().setLevel(os.environ.get("LOG_LEVEL", "INFO"))
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class LLMTimeoutError(Exception):
+    '''
+    an attempt, and its hedge if any, didn't finish before its deadline
+    '''
+
+
+class CircuitOpenError(Exception):
+    '''
+    OpenAI failed repeatedly, calls are not attempted until the circuit breaker lets a trial call through
+    '''
+
+
+# errors worth another attempt, anything else (invalid request, authentication...) fails the call right away
+RETRYABLE_ERRORS = (openai.error.Timeout, openai.error.APIConnectionError, openai.error.RateLimitError,
+                    openai.error.ServiceUnavailableError, openai.error.APIError, openai.error.TryAgain, LLMTimeoutError)
+
+
+class Attempt:
+    '''
+    one request of a call. hedged is True for the second request of a hedged attempt. abandoned is set once the
+    caller stopped waiting for it, its deadline passed or another request won, a sync request keeps running on its
+    thread until its HTTP request ends though
+    '''
+
+    def __init__(self, hedged: bool = False):
+        self.hedged = hedged
+        self.abandoned = False
+
+
+class AttemptCallbackHandler(BaseCallbackHandler):
+    '''
+    forwards the LLM callbacks of an attempt to handlers until it's abandoned, so that a late request doesn't
+    stream into a reply another request is writing, nor adds its tokens to a turn that has moved on
+    '''
+
+    def __init__(self, attempt: Attempt, handlers: List[BaseCallbackHandler]):
+        self.attempt = attempt
+        self.handlers = handlers
+
+    def on_chat_model_start(self, serialized: dict, messages: list, **kwargs: Any) -> None:
+        self._forward("on_chat_model_start", serialized, messages, **kwargs)
+
+    def on_llm_new_token(self, token: str, **kwargs: Any) -> None:
+        self._forward("on_llm_new_token", token, **kwargs)
+
+    def on_llm_end(self, response, **kwargs: Any) -> None:
+        self._forward("on_llm_end", response, **kwargs)
+
+    def _forward(self, event: str, *args, **kwargs):
+        if self.attempt.abandoned:
+            return
+        for handler in self.handlers:
+            getattr(handler, event)(*args, **kwargs)
+
+
+class CircuitBreaker:
+    '''
+    Opens after failure_threshold consecutive failed attempts. While open no call is allowed, after reset_timeout
+    seconds a single trial call is let through (half open): the circuit closes if it succeeds, and opens again
+    for another reset_timeout if it fails.
+    '''
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened = 0
+        self.rejected = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                # this caller makes the trial call, the others are rejected until it's done
+                self.state = self.HALF_OPEN
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self.state != self.CLOSED:
+                logger.info('LLM circuit closed')
+            self.state = self.CLOSED
+            self.consecutive_failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            if self.state == self.HALF_OPEN or (self.state == self.CLOSED and self.consecutive_failures >= self.failure_threshold):
+                logger.warning('LLM circuit opened after %d consecutive failures', self.consecutive_failures)
+                self.state = self.OPEN
+                self.opened += 1
+                self._opened_at = time.monotonic()
+
+    def stats(self) -> dict:
+        return {"state": self.state, "consecutive_failures": self.consecutive_failures, "opened": self.opened,
+                "rejected": self.rejected}
+
+
+class ResilientCaller:
+    '''
+    Calls attempt(Attempt) until it succeeds, at most max_attempts times, each attempt bounded by attempt_timeout
+    seconds. Attempt.hedged is True for the second request of a hedged attempt, e.g so that it doesn't stream, and
+    Attempt.abandoned is set once its result won't be used, see AttemptCallbackHandler.
+
+    Hedging is off unless hedge_percentile is set. Once enough attempts were timed, an attempt still running after
+    max(hedge_min_delay, the hedge_percentile latency of recent attempts) gets a second, identical request and the
+    first response wins. Hedging costs the tokens of the extra requests, about (100 - hedge_percentile)% more.
+
+    Sync attempts run in a thread pool so that they can be abandoned at their deadline, their thread is freed when
+    the HTTP request times out too (ChatOpenAI's request_timeout). Async attempts are cancelled.
+    '''
+
+    def __init__(self, attempt_timeout: float = 30.0, max_attempts: int = 3, backoff_base: float = 0.5,
+                 backoff_max: float = 8.0, hedge_percentile: float = 0, hedge_min_delay: float = 1.0,
+                 breaker: CircuitBreaker = None, max_threads: int = 64):
+        self.attempt_timeout = attempt_timeout
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_delay = hedge_min_delay
+        self.breaker = breaker or CircuitBreaker()
+
+        self.attempts = 0
+        self.retries = 0
+        self.timeouts = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        # latencies of the most recent successful attempts, in seconds
+        self._latencies = deque(maxlen=200)
+        self._executor = ThreadPoolExecutor(max_workers=max_threads, thread_name_prefix="llm-attempt")
+
+    @classmethod
+    def from_env(cls) -> "ResilientCaller":
+        max_attempts = int(os.environ.get("LLM_MAX_ATTEMPTS", "3"))
+        if max_attempts < 1:
+            raise ValueError(f"LLM_MAX_ATTEMPTS is {max_attempts}, should be at least 1")
+        return cls(
+            attempt_timeout=float(os.environ.get("LLM_ATTEMPT_TIMEOUT_SECONDS", "30")),
+            max_attempts=max_attempts,
+            backoff_base=float(os.environ.get("LLM_BACKOFF_BASE_SECONDS", "0.5")),
+            backoff_max=float(os.environ.get("LLM_BACKOFF_MAX_SECONDS", "8")),
+            hedge_percentile=float(os.environ.get("LLM_HEDGE_PERCENTILE", "0")),
+            hedge_min_delay=float(os.environ.get("LLM_HEDGE_MIN_DELAY_SECONDS", "1.0")),
+            breaker=CircuitBreaker(
+                failure_threshold=int(os.environ.get("LLM_CIRCUIT_FAILURE_THRESHOLD", "5")),
+                reset_timeout=float(os.environ.get("LLM_CIRCUIT_RESET_SECONDS", "30")),
+            ),
+        )
+
+    def backoff(self, retry: int) -> float:
+        '''
+        seconds to wait before the given retry (0 based), "full jitter": uniform between 0 and the exponential backoff
+        '''
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** retry))
+
+    def hedge_delay(self) -> Optional[float]:
+        '''
+        seconds after which an attempt is hedged, None if hedging is off or too few attempts were timed yet
+        '''
+        if not self.hedge_percentile or len(self._latencies) < 20:
+            return None
+        latencies = sorted(self._latencies)
+        index = min(len(latencies) - 1, int(len(latencies) * self.hedge_percentile / 100))
+        return max(self.hedge_min_delay, latencies[index])
+
+    def call(self, attempt: Callable[[Attempt], T]) -> T:
+        for retry in range(self.max_attempts):
+            if not self.breaker.allow():
+                raise CircuitOpenError("LLM circuit is open")
+            try:
+                result = self._call_once(attempt)
+            except RETRYABLE_ERRORS as e:
+                self.breaker.record_failure()
+                if not self._should_retry(retry, e):
+                    raise
+                time.sleep(self.backoff(retry))
+                continue
+            except Exception:
+                # OpenAI answered, e.g an invalid request, it's not degraded
+                self.breaker.record_success()
+                raise
+            self.breaker.record_success()
+            return result
+
+    async def acall(self, attempt: Callable[[Attempt], Awaitable[T]]) -> T:
+        for retry in range(self.max_attempts):
+            if not self.breaker.allow():
+                raise CircuitOpenError("LLM circuit is open")
+            try:
+                result = await self._acall_once(attempt)
+            except RETRYABLE_ERRORS as e:
+                self.breaker.record_failure()
+                if not self._should_retry(retry, e):
+                    raise
+                await asyncio.sleep(self.backoff(retry))
+                continue
+            except Exception:
+                # OpenAI answered, e.g an invalid request, it's not degraded
+                self.breaker.record_success()
+                raise
+            self.breaker.record_success()
+            return result
+
+    def _should_retry(self, retry: int, error: Exception) -> bool:
+        tracer.current_span().set_attribute("llm.retries", retry)
+        if retry + 1 >= self.max_attempts:
+            logger.error('LLM call failed after %d attempts: %s', retry + 1, error)
+            return False
+        logger.warning('LLM attempt %d failed, retrying: %s', retry + 1, error)
+        self.retries += 1
+        return True
+
+    def _call_once(self, attempt: Callable[[Attempt], T]) -> T:
+        self.attempts += 1
+        start = time.monotonic()
+        deadline = start + self.attempt_timeout
+        requests = [Attempt()]
+        primary = self._executor.submit(bind_context(attempt), requests[0])
+        pending = {primary}
+        try:
+            hedge_delay = self.hedge_delay()
+            if hedge_delay is not None and hedge_delay < self.attempt_timeout:
+                done, _ = wait(pending, timeout=hedge_delay)
+                if not done:
+                    self.hedged += 1
+                    tracer.current_span().set_attribute("llm.hedged", True)
+                    requests.append(Attempt(hedged=True))
+                    pending.add(self._executor.submit(bind_context(attempt), requests[-1]))
+
+            error = None
+            while pending:
+                done, pending = wait(pending, timeout=max(0.0, deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+                if not done:
+                    self.timeouts += 1
+                    raise LLMTimeoutError(f"LLM attempt took more than {self.attempt_timeout}s")
+                for future in done:
+                    if future.exception() is None:
+                        self._on_success(future is not primary, start)
+                        return future.result()
+                    error = future.exception()
+            raise error
+        finally:
+            # the threads can't be stopped, what they still report is ignored
+            for request in requests:
+                request.abandoned = True
+
+    async def _acall_once(self, attempt: Callable[[Attempt], Awaitable[T]]) -> T:
+        self.attempts += 1
+        start = time.monotonic()
+        deadline = start + self.attempt_timeout
+        primary = asyncio.ensure_future(attempt(Attempt()))
+        pending = {primary}
+        try:
+            hedge_delay = self.hedge_delay()
+            if hedge_delay is not None and hedge_delay < self.attempt_timeout:
+                done, _ = await asyncio.wait(pending, timeout=hedge_delay)
+                if not done:
+                    self.hedged += 1
+                    tracer.current_span().set_attribute("llm.hedged", True)
+                    pending.add(asyncio.ensure_future(attempt(Attempt(hedged=True))))
+
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, timeout=max(0.0, deadline - time.monotonic()),
+                                                   return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    self.timeouts += 1
+                    raise LLMTimeoutError(f"LLM attempt took more than {self.attempt_timeout}s")
+                for task in done:
+                    if task.exception() is None:
+                        self._on_success(task is not primary, start)
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def _on_success(self, hedge_won: bool, start: float):
+        if hedge_won:
+            self.hedge_wins += 1
+        self._latencies.append(time.monotonic() - start)
+
+    def stats(self) -> dict:
+        return {"attempts": self.attempts, "retries": self.retries, "timeouts": self.timeouts, "hedged": self.hedged,
+                "hedge_wins": self.hedge_wins, "hedge_delay": self.hedge_delay(), "circuit": self.breaker.stats()}
@@ -0,0 +1,61 @@
+import json
+import re
+from typing import Any, Callable, Optional
+
+from langchain.callbacks.base import BaseCallbackHandler
+
+_ESCAPES = {'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+
+
+def partial_json_string_field(text: str, field: str) -> Optional[str]:
+    '''
+    returns the value decoded so far of a string field in an incomplete JSON object, e.g the "message" of
+    '{"action": "clarify", "message": "Ciao, how can I he', or None if the field hasn't started yet
+    '''
+    match = re.search(r'"%s"\s*:\s*"' % re.escape(field), text)
+    if match is None:
+        return None
+
+    value = []
+    i = match.end()
+    while i < len(text):
+        char = text[i]
+        if char == '"':
+            break
+        if char != '\\':
+            value.append(char)
+            i += 1
+            continue
+        # escape sequence, stop if it's cut off
+        if i + 1 >= len(text):
+            break
+        escaped = text[i + 1]
+        if escaped == 'u':
+            if i + 6 > len(text):
+                break
+            value.append(json.loads(f'"{text[i:i + 6]}"'))
+            i += 6
+        else:
+            value.append(_ESCAPES.get(escaped, escaped))
+            i += 2
+    return "".join(value)
+
+
+class JsonMessageStreamHandler(BaseCallbackHandler):
+    '''
+    collects the tokens streamed by the LLM and calls on_message with the "message" field of the JSON response
+    decoded so far, every time it grows
+    '''
+
+    def __init__(self, on_message: Callable[[str], Any], field: str = "message"):
+        self.on_message = on_message
+        self.field = field
+        self.text = ""
+        self.message = ""
+
+    def on_llm_new_token(self, token: str, **kwargs: Any) -> None:
+        self.text += token
+        message = partial_json_string_field(self.text, self.field)
+        if message and message != self.message:
+            self.message = message
+            self.on_message(message)
@@ -0,0 +1,86 @@
+import logging
+import os
+from typing import Callable, Dict, List, Optional
+
+from core.hackathon_base import HackathonBase
+
+logging.basicConfig()
+logging.getLogger().setLevel(os.environ.get("LOG_LEVEL", "INFO"))
+logger = logging.getLogger(__name__)
+
+
+def tiktoken_counter(model_name: str) -> Callable[[str], int]:
+    '''
+    counts tokens with the tokenizer of the given model
+    '''
+    import tiktoken
+    encoding = tiktoken.encoding_for_model(model_name)
+    return lambda text: len(encoding.encode(text))
+
+
+class TeamContextBuilder:
+    '''
+    Builds the "current state of teams" part of a prompt within max_tokens, whatever the number of teams, from indexed
+    lookups of the backend instead of its whole team list. Sections, in order, each one only if it fits what is left:
+    - a summary: how many teams and unassigned participants there are, and the maximum team size
+    - the team of the user
+    - the teams whose name is close to something in the message (the backend's team_names index), at most max_matches
+
+    The backend must have a team_names TeamNameIndex, as HackathonSQLite and HackathonJournal do.
+    '''
+
+    def __init__(self, engine: HackathonBase, count_tokens: Callable[[str], int], max_tokens: int = 300,
+                 max_matches: int = 3, min_similarity: float = 0.25):
+        self.engine = engine
+        self.count_tokens = count_tokens
+        self.max_tokens = max_tokens
+        self.max_matches = max_matches
+        self.min_similarity = min_similarity
+
+    @classmethod
+    def from_env(cls, engine: HackathonBase, count_tokens: Callable[[str], int]) -> "TeamContextBuilder":
+        return cls(engine, count_tokens,
+                   max_tokens=int(os.environ.get("TEAM_CONTEXT_MAX_TOKENS", "300")),
+                   max_matches=int(os.environ.get("TEAM_CONTEXT_MAX_MATCHES", "3")),
+                   min_similarity=float(os.environ.get("TEAM_CONTEXT_MIN_SIMILARITY", "0.25")))
+
+    def build(self, user_input: str, username: Optional[str] = None) -> str:
+        sections = [self._summary()]
+        if username:
+            my_team = self.engine.list_my_team(username)
+            sections.append(my_team if my_team != "You are not in any team." else "The user is not in any team yet.")
+
+        matches = []
+        for candidate in self.engine.team_names.search(user_input, self.max_matches):
+            if candidate.similarity < self.min_similarity:
+                continue
+            team = self.engine.get_team(candidate.team_id)
+            if team is not None:
+                matches.append(self._team_line(team))
+        if matches:
+            sections.append("Teams with a name close to the message:\n" + "\n".join(matches))
+
+        return self._fit(sections)
+
+    def _summary(self) -> str:
+        return (f"There are {len(self.engine.team_names)} teams, "
+                f"{self.engine.count_unassigned_participants()} participants are not in a team yet, "
+                f"teams have at most {self.engine.max_team_size} members.")
+
+    def _team_line(self, team: Dict) -> str:
+        size = 1 + len(team["members"])
+        members = f"members {', '.join(team['members'])}" if team["members"] else "no other members"
+        full = ", full" if size >= self.engine.max_team_size else ""
+        return f"- {team['team_name']}: captain {team['captain']}, {members} ({size}/{self.engine.max_team_size}{full})"
+
+    def _fit(self, sections: List[str]) -> str:
+        # whole sections only, a team cut in the middle would mislead the LLM
+        kept, used = [], 0
+        for section in sections:
+            tokens = self.count_tokens(section)
+            if used + tokens > self.max_tokens:
+                logger.debug("team context section of %d tokens dropped, %d of %d used", tokens, used, self.max_tokens)
+                continue
+            kept.append(section)
+            used += tokens
+        return "\n\n".join(kept)
@@ -0,0 +1,44 @@
+from typing import Any, List
+
+from langchain.callbacks.base import BaseCallbackHandler
+from langchain.chat_models.base import BaseChatModel
+from langchain.schema import BaseMessage, LLMResult
+
+
+class TokenUsageHandler(BaseCallbackHandler):
+    '''
+    collects the prompt and completion tokens of the LLM calls of a chain run, as reported by the API.
+    Streamed completions don't report usage, their tokens are counted with the model's tokenizer (tiktoken)
+    from the messages sent and the text received instead, and estimated is set
+    '''
+
+    def __init__(self, llm: BaseChatModel):
+        self.llm = llm
+        self.model_name = getattr(llm, "model_name", "")
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.calls = 0
+        self.estimated = False
+        self._messages: List[BaseMessage] = []
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    def on_chat_model_start(self, serialized: dict, messages: List[List[BaseMessage]], **kwargs: Any) -> None:
+        self._messages = messages[0] if messages else []
+
+    def on_llm_end(self, response: LLMResult, **kwargs: Any) -> None:
+        self.calls += 1
+        llm_output = response.llm_output or {}
+        self.model_name = llm_output.get("model_name") or self.model_name
+        token_usage = llm_output.get("token_usage") or {}
+        if token_usage:
+            self.prompt_tokens += token_usage.get("prompt_tokens", 0)
+            self.completion_tokens += token_usage.get("completion_tokens", 0)
+            return
+
+        self.estimated = True
+        self.prompt_tokens += self.llm.get_num_tokens_from_messages(self._messages) if self._messages else 0
+        self.completion_tokens += sum(self.llm.get_num_tokens(generation.text)
+                                      for generations in response.generations for generation in generations)
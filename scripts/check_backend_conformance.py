@@ -0,0 +1,217 @@
+'''
+This script checks that every registered HackathonBase backend (core/backends.py) behaves like the first one,
+HackathonSQLite: same results and same HackathonError messages for the same calls.
+
+Each case of CASES is a list of calls run against a fresh instance of every backend, then a random sequential
+workload of --ops calls (create/join/leave/delete/rename/list/ideas, with exact, lowercase and typo'd team names)
+is run the same way. The teams and unassigned participants are compared after every case too. Exits with status 1
+if any backend differs from the reference.
+'''
+
+import argparse
+import logging
+import os
+import random
+import sys
+import tempfile
+from typing import Any, Dict, List, Tuple
+
+from benchmarks.db_overhead import write_participants_csv
+from core.backends import BACKENDS, create_backend
+from core.hackathon_base import HackathonBase, HackathonError
+
+MAX_TEAM_SIZE = 3
+TEAM_WORDS = ["avengers", "rockets", "llamas", "pointers", "wizards", "ninjas", "coders", "vectors", "pixels", "owls"]
+
+Call = Tuple[str, tuple]
+# ("ok", normalised result), ("error", HackathonError message) or ("exception", exception class name)
+Outcome = Tuple[str, Any]
+
+CASES: Dict[str, List[Call]] = {
+    "create and list": [
+        ("create_team", ("Avengers", "user0")), ("list_teams", ()), ("list_my_team", ("user0",)),
+        ("list_my_team", ("user1",)), ("get_unassigned_participants", ())],
+    "create errors": [
+        ("create_team", ("Avengers", "user0")), ("create_team", ("Other", "user0")), ("create_team", ("Avengers", "user1")),
+        ("create_team", ("x" * 101, "user1")), ("create_team", ("Ghosts", "nobody"))],
+    "join by name": [
+        ("create_team", ("Spaghetti Coders", "user0")), ("create_team", ("The Avengers", "user1")),
+        ("create_team", ("Team Rocket", "user2")), ("create_team", ("Team Rocket 2", "user3")),
+        ("join_team", ("spagetti coders", "user4")), ("join_team", ("avengers", "user5")),
+        ("join_team", ("team rocket", "user6")), ("join_team", ("rocket", "user7")), ("join_team", ("zzz", "user7")),
+        ("list_teams", ())],
+    "join errors": [
+        ("create_team", ("Avengers", "user0")), ("create_team", ("Justice League", "user1")),
+        ("join_team", ("Avengers", "user2")), ("join_team", ("Justice League", "user2")),
+        ("join_team", ("Avengers", "user3")), ("join_team", ("Avengers", "user4")),
+        ("join_team", ("Avengers", "nobody")), ("join_team", ("Avengers", "user1"))],
+    "leave": [
+        ("create_team", ("Avengers", "user0")), ("join_team", ("Avengers", "user1")),
+        ("leave_current_team", ("user0",)), ("leave_current_team", ("user1",)), ("leave_current_team", ("user1",)),
+        ("leave_current_team", ("nobody",)), ("join_team", ("Avengers", "user1")), ("list_my_team", ("user1",))],
+    "rename": [
+        ("create_team", ("Avengers", "user0")), ("create_team", ("Justice League", "user1")),
+        ("join_team", ("Avengers", "user2")), ("rename_my_team", ("Justice League", "user0")),
+        ("rename_my_team", ("Avengers", "user0")), ("rename_my_team", ("Avengers Assemble", "user0")),
+        ("rename_my_team", ("Anything", "user2")), ("rename_my_team", ("x" * 101, "user0")),
+        ("join_team", ("avengers assemble", "user3")), ("join_team", ("Avengers", "user4"))],
+    "delete": [
+        ("create_team", ("Avengers", "user0")), ("join_team", ("Avengers", "user1")),
+        ("delete_my_team", ("user1",)), ("delete_my_team", ("nobody",)), ("delete_my_team", ("user0",)),
+        ("list_my_team", ("user1",)), ("create_team", ("Avengers", "user1")), ("delete_my_team", ("user0",))],
+    "member creates a team": [
+        ("create_team", ("Avengers", "user0")), ("join_team", ("Avengers", "user1")),
+        ("create_team", ("Justice League", "user1")), ("list_teams", ()), ("leave_current_team", ("user1",))],
+    "ideas": [
+        ("add_idea_to_team", ("user0", "a bot which forms teams")), ("create_team", ("Avengers", "user0")),
+        ("join_team", ("Avengers", "user1")), ("add_idea_to_team", ("user0", "a bot which forms teams")),
+        ("add_idea_to_team", ("user1", "a bot which writes the code")), ("list_team_ideas", ("user1",)),
+        ("list_team_ideas", ("user2",)), ("edit_idea", ("user0", "no such idea", "text")),
+        ("delete_my_team", ("user0",))],
+    "recommend teammates": [
+        ("recommend_teammates", ("user0",)), ("create_team", ("Avengers", "user0")), ("join_team", ("Avengers", "user1")),
+        ("recommend_teammates", ("user0",)), ("recommend_teammates", ("user2",)), ("leave_current_team", ("user1",)),
+        ("recommend_teammates", ("user0",)), ("delete_my_team", ("user0",)), ("recommend_teammates", ("user1",)),
+        ("recommend_teammates", ("nobody",))],
+}
+
+
+def random_workload(rng: random.Random, num_participants: int, num_calls: int) -> List[Call]:
+    '''
+    calls of random users on teams named after TEAM_WORDS, joins use the exact, a lowercase or a typo'd name
+    '''
+    team_names = [f"Team {word.title()}" for word in TEAM_WORDS] + [f"The {word.title()}" for word in TEAM_WORDS]
+
+    def query(team_name: str) -> str:
+        variant = rng.random()
+        if variant < 0.5:
+            return team_name
+        if variant < 0.8:
+            return team_name.lower()
+        i = rng.randrange(len(team_name) - 1)
+        return team_name[:i] + team_name[i + 1] + team_name[i] + team_name[i + 2:]
+
+    calls = []
+    for _ in range(num_calls):
+        username = f"user{rng.randrange(num_participants)}"
+        kind = rng.choices(["create_team", "join_team", "leave_current_team", "delete_my_team", "rename_my_team",
+                            "add_idea_to_team", "list_teams", "list_my_team", "get_unassigned_participants"],
+                           weights=[12, 30, 14, 6, 4, 3, 12, 14, 5])[0]
+        if kind in ("create_team", "rename_my_team"):
+            calls.append((kind, (rng.choice(team_names), username)))
+        elif kind == "join_team":
+            calls.append((kind, (query(rng.choice(team_names)), username)))
+        elif kind == "add_idea_to_team":
+            calls.append((kind, (username, f"idea {rng.randrange(1000)}")))
+        elif kind in ("list_teams", "get_unassigned_participants"):
+            calls.append((kind, ()))
+        else:
+            calls.append((kind, (username,)))
+    return calls
+
+
+def normalise(result: Any) -> Any:
+    # (team_name, team_id) of create_team and rename_my_team, ids are random
+    if isinstance(result, tuple) and len(result) == 2 and isinstance(result[0], str):
+        return result[0], "<team_id>"
+    return result
+
+
+def run_call(db: HackathonBase, call: Call) -> Outcome:
+    method, args = call
+    try:
+        return "ok", normalise(getattr(db, method)(*args))
+    except HackathonError as e:
+        return "error", e.message
+    except Exception as e:
+        return "exception", type(e).__name__
+
+
+FINAL_STATE_CALLS: List[Call] = [("get_teams", ()), ("get_unassigned_participants", ()),
+                                 ("count_unassigned_participants", ()), ("recommend_teammates", ("user0",))]
+
+
+def final_state(db: HackathonBase) -> List[Outcome]:
+    return [run_call(db, call) for call in FINAL_STATE_CALLS]
+
+
+def check_invariants(db: HackathonBase, num_participants: int, max_team_size: int) -> List[str]:
+    '''
+    violations of what must hold whatever the order of calls, e.g after concurrent calls
+    '''
+    violations = []
+    teams = db.get_teams()
+    unassigned = db.get_unassigned_participants()
+    assigned = [member for team in teams for member in [team["captain"], *team["members"]]]
+    for team in teams:
+        if 1 + len(team["members"]) > max_team_size:
+            violations.append(f"{team['team_name']} has {1 + len(team['members'])} members")
+    if len(assigned) != len(set(assigned)):
+        violations.append("participants in several teams")
+    if len(assigned) + len(unassigned) != num_participants:
+        violations.append(f"{len(assigned)} assigned + {len(unassigned)} unassigned != {num_participants} participants")
+    if len({team["team_name"] for team in teams}) != len(teams):
+        violations.append("duplicate team names")
+    recommended = {full_name for full_name, _ in db.recommend_teammates("user0", k=10)}
+    if not recommended <= set(unassigned):
+        violations.append(f"recommended participants in a team: {', '.join(sorted(recommended - set(unassigned)))}")
+    return violations
+
+
+def run_everywhere(tmpdir: str, csv_filepath: str, calls: List[Call], case: str) -> Dict[str, List[Outcome]]:
+    outcomes = {}
+    for name in BACKENDS:
+        db = create_backend(name, os.path.join(tmpdir, case, name), csv_filepath, max_team_size=MAX_TEAM_SIZE)
+        try:
+            outcomes[name] = [run_call(db, call) for call in calls] + final_state(db)
+        finally:
+            db.close()
+    return outcomes
+
+
+def report_diffs(case: str, calls: List[Call], outcomes: Dict[str, List[Outcome]], max_diffs: int = 5) -> int:
+    reference_name, reference = next(iter(outcomes.items()))
+    diffs = 0
+    calls = calls + FINAL_STATE_CALLS
+    for name, backend_outcomes in outcomes.items():
+        mismatches = [i for i, (expected, actual) in enumerate(zip(reference, backend_outcomes)) if expected != actual]
+        diffs += len(mismatches)
+        for i in mismatches[:max_diffs]:
+            method, args = calls[i]
+            print(f"[{case}] {name} differs from {reference_name} on call {i} {method}{args}")
+            print(f"    {reference_name}: {reference[i]!r}"[:300])
+            print(f"    {name}: {backend_outcomes[i]!r}"[:300])
+    return diffs
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ops", type=int, default=2000, help="calls of the random workload")
+    parser.add_argument("--participants", type=int, default=60)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(os.environ.get("LOG_LEVEL", "CRITICAL"))
+    diffs = 0
+    with tempfile.TemporaryDirectory() as tmpdir:
+        csv_filepath = os.path.join(tmpdir, "participants.csv")
+        write_participants_csv(csv_filepath, args.participants)
+
+        cases = dict(CASES)
+        cases[f"random workload, seed {args.seed}"] = random_workload(random.Random(args.seed), args.participants, args.ops)
+        for i, (case, calls) in enumerate(cases.items()):
+            case_diffs = report_diffs(case, calls, run_everywhere(tmpdir, csv_filepath, calls, f"case{i}"))
+            print(f"{case}: {len(calls)} calls, {case_diffs} difference(s)")
+            diffs += case_diffs
+
+    if diffs:
+        print(f"{diffs} difference(s) found between {', '.join(BACKENDS)}")
+        sys.exit(1)
+    print(f"All backends behave the same: {', '.join(BACKENDS)}")
+
+
+'''
+USAGE
+    python -m scripts.check_backend_conformance
+    python -m scripts.check_backend_conformance --ops 10000 --participants 200 --seed 42
+'''
@@ -0,0 +1,118 @@
+'''
+This script checks that the queries run by HackathonSQLite use indexes instead of table scans.
+
+Every public HackathonSQLite method is called against a temporary DB while all SQL statements are captured,
+then EXPLAIN QUERY PLAN is run for each captured statement. Exits with status 1 if any statement scans a table
+which is not listed in ALLOWED_TABLE_SCANS.
+'''
+
+import csv
+import os
+import sqlite3
+import sys
+import tempfile
+from collections import defaultdict
+
+from core.sqlite.hackathon_sqlite import HackathonSQLite
+
+# (method, table or alias as shown in the query plan) -> why a full scan is fine
+ALLOWED_TABLE_SCANS = {
+    ("list_teams", "t"): "every team is listed",
+}
+
+
+def exercise(db: HackathonSQLite, set_method):
+    set_method("create_team")
+    _, team_id = db.create_team("Avengers", "user0")
+    db.create_team("Justice League", "user1")
+    set_method("rename_my_team")
+    db.rename_my_team("Justice Society", "user1")
+    set_method("join_team")
+    db.join_team("avengers", "user2")
+    set_method("list_my_team")
+    db.list_my_team("user2")
+    set_method("get_team")
+    db.get_team(team_id)
+    set_method("list_teams")
+    db.list_teams()
+    set_method("get_unassigned_participants")
+    db.get_unassigned_participants()
+    set_method("count_unassigned_participants")
+    db.count_unassigned_participants()
+    set_method("add_idea_to_team")
+    db.add_idea_to_team("user2", "a bot which forms teams")
+    set_method("list_team_ideas")
+    db.list_team_ideas("user0")
+    set_method(None)
+    idea_id = db.cursor.execute("SELECT idea_id FROM ideas").fetchone()[0]
+    set_method("edit_idea")
+    db.edit_idea("user2", idea_id, "a bot which forms teams, in italian")
+    set_method("leave_current_team")
+    db.leave_current_team("user2")
+    set_method("delete_my_team")
+    db.delete_my_team("user1")
+    set_method("record_token_usage")
+    db.record_token_usage("user2", "C1:1", "gpt-4o", 100, 20)
+    set_method("get_user_token_usage")
+    db.get_user_token_usage("user2")
+    set_method("get_conversation_token_usage")
+    db.get_conversation_token_usage("C1:1")
+    set_method("list_token_usage")
+    db.list_token_usage()
+
+
+def is_query(sql: str) -> bool:
+    return sql.lstrip().split(None, 1)[0].upper() in ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH")
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as tmpdir:
+        db_filepath = os.path.join(tmpdir, "hackathon_data.db")
+        csv_filepath = os.path.join(tmpdir, "participants.csv")
+        with open(csv_filepath, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(["username", "full_name", "bio"])
+            writer.writerows([(f"user{i}", f"User {i}", "") for i in range(10)])
+
+        db = HackathonSQLite(db_filepath, csv_filepath)
+
+        current = {"method": None}
+        statements = defaultdict(set)
+
+        def trace(sql):
+            if current["method"] and is_query(sql):
+                statements[current["method"]].add(sql)
+
+        db.conn.set_trace_callback(trace)
+        db.writer.conn.set_trace_callback(trace)
+        exercise(db, lambda method: current.update(method=method))
+        db.conn.set_trace_callback(None)
+        db.writer.conn.set_trace_callback(None)
+
+        violations = 0
+        explain_conn = sqlite3.connect(db_filepath)
+        for method, sqls in sorted(statements.items()):
+            for sql in sorted(sqls):
+                plan = [row[3] for row in explain_conn.execute(f"EXPLAIN QUERY PLAN {sql}")]
+                print(f"[{method}] {' '.join(sql.split())}")
+                for detail in plan:
+                    words = detail.split()
+                    table_scan = words[0] == "SCAN" and "USING" not in words
+                    if table_scan and (method, words[1]) not in ALLOWED_TABLE_SCANS:
+                        violations += 1
+                        print(f"    {detail}    <-- table scan")
+                    else:
+                        print(f"    {detail}")
+        explain_conn.close()
+        db.close()
+
+    if violations:
+        print(f"{violations} table scan(s) found")
+        sys.exit(1)
+    print("All queries use indexes")
+
+
+'''
+USAGE
+    python -m scripts.check_query_plans
+'''
@@ -4,10 +4,12 @@ This script populates the participants table in given sqlite db file, with the d
 
 import os
 import sqlite3
-import csv
 import logging
 import sys
 
+from core.sqlite.migrations import migrate
+from core.sqlite.roster_sync import ParticipantRosterSync
+
 logging.basicConfig()
 logging.getLogger().setLevel(os.environ.get("LOG_LEVEL", "INFO"))
 logger = logging.getLogger(__name__)
@@ -22,24 +24,17 @@ if __name__ == "__main__":
         logger.error("Filepaths provided are either empty or does not exist.")
         sys.exit(1)
 
-    with open(participants_csv_filepath, 'r', newline='', encoding='utf-8') as csvfile :
-        csvreader = csv.DictReader(csvfile)
-        to_insert = []
-        
-        # loop and prepare data
-        for i, row in enumerate(csvreader):
-            to_insert.append((row['username'], row['full_name'], row['bio']))
-        
-        # insert if not already present
-        conn = sqlite3.connect(sqlite_db_filepath)
-        conn.executemany("""
-            INSERT OR IGNORE INTO participants (username, full_name, bio) VALUES (?, ?, ?)
-            """, to_insert)
-        conn.commit()
+    # only the rows which changed since last sync are written
+    conn = sqlite3.connect(sqlite_db_filepath)
+    conn.execute("PRAGMA foreign_keys = ON")
+    migrate(conn)
+    with conn:
+        ParticipantRosterSync(participants_csv_filepath).sync(conn)
+    conn.close()
     
     logger.info(f"Done. Participants data has been written to {sqlite_db_filepath}")
 
 '''
 USAGE
-    python scripts/populate_participants.py hackathon.db participants.csv
+    python -m scripts.populate_participants hackathon.db participants.csv
 '''
\ No newline at end of file
@@ -0,0 +1,42 @@
+'''
+This script prints the LLM tokens every user used on a UTC day, from the token ledger which OpenAILLM fills
+after every LLM call, along with TOKEN_BUDGET_PER_USER_PER_DAY if set, to see who is over budget.
+With --conversation the tokens of one conversation (e.g "C0123:1726136482.000100") are printed too.
+'''
+
+import argparse
+import os
+
+from core.sqlite.hackathon_sqlite import get_hackathon_sqlite, usage_day
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--day", default=None, help="UTC day, YYYY-MM-DD, today by default")
+    parser.add_argument("--conversation", default=None, help="conversation id, channel:thread_ts")
+    args = parser.parse_args()
+
+    db = get_hackathon_sqlite()
+    budget = int(os.environ.get("TOKEN_BUDGET_PER_USER_PER_DAY", "0"))
+    day = args.day or usage_day()
+
+    rows = db.list_token_usage(day)
+    print(f"Token usage on {day}" + (f", budget {budget} tokens per user" if budget else ""))
+    print(f"{'username':<24} {'calls':>6} {'prompt':>10} {'completion':>10} {'total':>10}")
+    for username, prompt_tokens, completion_tokens, calls in rows:
+        total = prompt_tokens + completion_tokens
+        over_budget = "  over budget" if budget and total >= budget else ""
+        print(f"{username:<24} {calls:>6} {prompt_tokens:>10} {completion_tokens:>10} {total:>10}{over_budget}")
+    print(f"{'total':<24} {sum(row[3] for row in rows):>6} {sum(row[1] for row in rows):>10} "
+          f"{sum(row[2] for row in rows):>10} {sum(row[1] + row[2] for row in rows):>10}")
+
+    if args.conversation:
+        prompt_tokens, completion_tokens = db.get_conversation_token_usage(args.conversation)
+        print(f"\nConversation {args.conversation}: {prompt_tokens} prompt, {completion_tokens} completion tokens")
+
+
+'''
+USAGE
+    python -m scripts.token_usage_report
+    python -m scripts.token_usage_report --day 2024-09-12 --conversation C0123:1726136482.000100
+'''
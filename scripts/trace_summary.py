@@ -0,0 +1,77 @@
+'''
+This script summarises spans exported by the file tracing exporter (TRACING_EXPORTER=file), to see where the
+time of slack replies goes: slack, the LLM or SQLite.
+
+For every span name it prints the count, p50/p95 duration and the share of the time of the traces it's part of.
+With --slowest N the span trees of the N slowest traces are printed too.
+'''
+
+import argparse
+import json
+from collections import defaultdict
+from typing import Dict, List
+
+
+def load_spans(filepath: str) -> List[dict]:
+    with open(filepath) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def percentile(values: List[float], p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] if values else 0.0
+
+
+def summarise(spans: List[dict]):
+    roots = {span["trace_id"]: span for span in spans if span["parent_id"] is None}
+    durations: Dict[str, List[float]] = defaultdict(list)
+    trace_time: Dict[str, float] = defaultdict(float)
+    for span in spans:
+        durations[span["name"]].append(span["duration_ms"])
+        root = roots.get(span["trace_id"])
+        if root is not None:
+            trace_time[span["name"]] += root["duration_ms"]
+
+    print(f"{len(spans)} spans, {len(roots)} traces")
+    print(f"{'span':<44} {'count':>7} {'p50 ms':>10} {'p95 ms':>10} {'% of trace':>11}")
+    for name, values in sorted(durations.items(), key=lambda item: -sum(item[1])):
+        share = sum(values) / trace_time[name] * 100 if trace_time[name] else 0.0
+        print(f"{name:<44} {len(values):>7} {percentile(values, 0.5):>10.1f} {percentile(values, 0.95):>10.1f} {share:>10.1f}%")
+
+
+def print_slowest(spans: List[dict], count: int):
+    children: Dict[str, List[dict]] = defaultdict(list)
+    for span in spans:
+        if span["parent_id"] is not None:
+            children[span["parent_id"]].append(span)
+
+    def print_tree(span: dict, depth: int, trace_start: int):
+        offset_ms = (span["start_ns"] - trace_start) / 1e6
+        attributes = ", ".join(f"{key}={value}" for key, value in span["attributes"].items())
+        error = f" ERROR {span['error']}" if span["error"] else ""
+        print(f"{'  ' * depth}{span['name']} +{offset_ms:.1f} ms {span['duration_ms']:.1f} ms  {attributes}{error}")
+        for child in sorted(children[span["span_id"]], key=lambda child: child["start_ns"]):
+            print_tree(child, depth + 1, trace_start)
+
+    roots = sorted((span for span in spans if span["parent_id"] is None), key=lambda span: -span["duration_ms"])
+    for root in roots[:count]:
+        print()
+        print_tree(root, 0, root["start_ns"])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("filepath", nargs="?", default="data/traces.jsonl")
+    parser.add_argument("--slowest", type=int, default=0, help="print the span trees of the slowest traces")
+    args = parser.parse_args()
+
+    spans = load_spans(args.filepath)
+    summarise(spans)
+    print_slowest(spans, args.slowest)
+
+
+'''
+USAGE
+    TRACING_EXPORTER=file TRACING_FILE=data/traces.jsonl python slackbot.py
+    python -m scripts.trace_summary data/traces.jsonl --slowest 3
+'''
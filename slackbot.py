@@ -1,5 +1,4 @@
 import os
-from typing import Dict
 from slack_bolt import App
 from slack_bolt.adapter.socket_mode import SocketModeHandler
 from slack_sdk import WebClient
@@ -7,12 +6,11 @@ from slack_sdk import WebClient
 from dotenv import load_dotenv
 import json
 import ssl
+import time
 import certifi
 import logging
 import http.client as http_client
 
-from langchain.chains import ConversationChain
-
 
 # load env vars
 load_dotenv()
@@ -30,6 +28,8 @@ logger = logging.getLogger(__name__)
 # Create a WebClient with a custom SSL context
 client = WebClient(
     token=os.environ.get("SLACK_BOT_TOKEN"),
+    # only set to point the bot at a stand-in, e.g the load test's fake slack
+    base_url=os.environ.get("SLACK_API_URL", WebClient.BASE_URL),
     ssl=ssl.create_default_context(cafile=certifi.where()))
 
 # Initialize the Slack app
@@ -37,18 +37,56 @@ app = App(client=client)
 
 SLACK_BOT_USER_ID = os.environ["SLACK_BOT_USER_ID"]
 
+from core.event_dedup import SlackEventDeduplicator
+from core.metrics import observe_mention, record_action, start_metrics_server_from_env
+from core.slack_reply import StreamingReply
+from core.tracing import tracer
+from core.worker_pool import BoundedWorkerPool
 from llm.openai import OpenAILLM
+from llm.conversation_store import ConversationStore
 llm = OpenAILLM()
 
-active_conversations: Dict[str, ConversationChain] = {}
+active_conversations = ConversationStore.from_env(llm.get_conversation_chain, llm.get_hackathon_database_connection())
+# mentions are acked right away and processed by these workers, slack redelivers events not acked within 3s
+mention_workers = BoundedWorkerPool.from_env(name="mention-worker")
+slack_events = SlackEventDeduplicator.from_env(llm.get_hackathon_database_connection())
 
 def get_conversation_id(channel_id, thread_ts):
     return f"{channel_id}:{thread_ts}"
 
 @app.event("app_mention")
-def handle_mention(event, say, client):
-    global active_conversations
-
+def handle_mention(body, event, say, client):
+    # the span of the event ends once a worker is done with it, the gap before its first child is the queue wait
+    received_at = time.monotonic()
+    thread_ts = event.get("thread_ts", event["ts"])
+    span = tracer.start_span("slack.app_mention", {
+        "slack.event_id": body.get("event_id", ""), "slack.channel": event["channel"], "slack.user": event["user"],
+        "slack.thread_ts": thread_ts})
+    with tracer.use_span(span):
+        # retries are dropped before they can reach the LLM or apply a mutation twice
+        if slack_events.is_duplicate(body, event):
+            span.set_attribute("slack.duplicate", True)
+            record_action("duplicate")
+            span.end()
+            return
+
+        # mentions of one thread are processed in order, one at a time, as its conversation chain is not thread safe
+        conversation_id = get_conversation_id(event["channel"], thread_ts)
+        if not mention_workers.submit(process_mention, event, say, client, span, received_at, key=conversation_id):
+            logger.warning('Mention queue is full, stats %s', mention_workers.stats())
+            span.set_attribute("slack.rejected", True)
+            with tracer.span("slack.say"):
+                say(text=f'<@{event["user"]}> Mamma mia, I am very busy right now, pls try again in a minute.', thread_ts=thread_ts)
+            span.end()
+
+
+def process_mention(event, say, client, span=None, received_at=None):
+    with tracer.use_span(span, end_on_exit=True), tracer.span("mention.process"), \
+            observe_mention(received_at or time.monotonic()):
+        _process_mention(event, say, client)
+
+
+def _process_mention(event, say, client):
     channel_id = event["channel"]
     user_id = event["user"]
     thread_ts = event.get("thread_ts", event["ts"])
@@ -57,8 +95,6 @@ def handle_mention(event, say, client):
     logger.info('logging event %s', json.dumps(event, indent=4, sort_keys=True))
 
     conversation_id = get_conversation_id(channel_id, thread_ts)
-    if conversation_id not in active_conversations:
-        active_conversations[conversation_id] = llm.get_conversation_chain()
 
     # is_first_message = thread_ts == current_ts
     # user_messages = []
@@ -77,16 +113,45 @@ def handle_mention(event, say, client):
         #     if message.get("user") == user_id and SLACK_BOT_USER_ID in message["text"]
         # ]
 
-    logger.info('active covnversations $$$$ %s', active_conversations)
-    conversation_chain: ConversationChain = active_conversations.get(conversation_id)
+    logger.info('active covnversations $$$$ %s', active_conversations.stats())
+    logger.info('mention workers %s, %s', mention_workers.stats(), slack_events.stats())
     user_input = event["text"].replace(SLACK_BOT_USER_ID, '').strip()
-    result, amount_of_tokens = llm.get_conversation(chain=conversation_chain, prompt=user_input, username=user_id)
+
+    # with streaming, a placeholder reply is posted right away and updated while the LLM writes its message
+    reply = None
+    if llm.stream_replies:
+        reply = StreamingReply.from_env(client, channel_id, thread_ts or current_ts, prefix=f'<@{user_id}> ')
+        reply.start()
+
+    try:
+        with active_conversations.conversation(conversation_id) as conversation_chain:
+            result, amount_of_tokens = llm.get_conversation(chain=conversation_chain, prompt=user_input, username=user_id,
+                                                            on_message=reply.update if reply else None,
+                                                            conversation_id=conversation_id)
+    except Exception:
+        if reply:
+            # don't leave the placeholder hanging
+            reply.finish('Oopsiedoodle, some error occured, pls try again')
+        raise
 
     logger.info('LLM tokens used  %s', amount_of_tokens)
+    tracer.current_span().set_attribute("llm.total_tokens", amount_of_tokens)
 
-    say(text=f'<@{user_id}> {result}.', thread_ts=thread_ts or current_ts)
+    if reply:
+        reply.finish(f'{result}.')
+    else:
+        with tracer.span("slack.say"):
+            say(text=f'<@{user_id}> {result}.', thread_ts=thread_ts or current_ts)
 
 
 if __name__ == "__main__":
+    # hot reload participants.csv changes (names, bios, new joiners) without a restart
+    participants_reload_interval = float(os.environ.get("PARTICIPANTS_RELOAD_INTERVAL_SECONDS", "0"))
+    if participants_reload_interval > 0:
+        llm.get_hackathon_database_connection().watch_participants(participants_reload_interval)
+
+    start_metrics_server_from_env(conversations=active_conversations, read_cache=llm.get_hackathon_database_connection().read_cache,
+                                  worker_pool=mention_workers, slack_events=slack_events, llm_caller=llm.llm_caller)
+
     handler = SocketModeHandler(app, os.environ["SLACK_APP_TOKEN"])
     handler.start()
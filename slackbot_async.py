@@ -0,0 +1,131 @@
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, Tuple
+from slack_bolt.async_app import AsyncApp
+from slack_bolt.adapter.socket_mode.async_handler import AsyncSocketModeHandler
+from slack_sdk.web.async_client import AsyncWebClient
+
+from dotenv import load_dotenv
+import json
+import ssl
+import certifi
+import logging
+
+from langchain.chains import ConversationChain
+
+
+# load env vars
+load_dotenv()
+
+# setup logging
+logging.basicConfig()
+logging.getLogger().setLevel(os.environ.get("LOG_LEVEL", "INFO"))
+logger = logging.getLogger(__name__)
+
+
+# Create an AsyncWebClient with a custom SSL context
+client = AsyncWebClient(
+    token=os.environ.get("SLACK_BOT_TOKEN"),
+    ssl=ssl.create_default_context(cafile=certifi.where()))
+
+# Initialize the Slack app
+app = AsyncApp(client=client)
+
+SLACK_BOT_USER_ID = os.environ["SLACK_BOT_USER_ID"]
+
+# max number of mentions handled at the same time, the rest wait for a free slot
+MAX_CONCURRENT_MENTIONS = int(os.environ.get("MAX_CONCURRENT_MENTIONS", "50"))
+
+from core.event_dedup import SlackEventDeduplicator
+from core.metrics import observe_mention, record_action, start_metrics_server_from_env
+from core.tracing import bind_context, tracer
+from llm.openai import OpenAILLM
+from llm.conversation_store import ConversationStore
+llm = OpenAILLM()
+
+active_conversations = ConversationStore.from_env(llm.get_conversation_chain, llm.get_hackathon_database_connection())
+slack_events = SlackEventDeduplicator.from_env(llm.get_hackathon_database_connection())
+mention_slots = asyncio.Semaphore(MAX_CONCURRENT_MENTIONS)
+# mentions of one thread are processed in order, one at a time, as its conversation chain is not thread safe.
+# conversation id -> (lock, number of mentions holding or waiting for it)
+conversation_locks: Dict[str, Tuple[asyncio.Lock, int]] = {}
+
+def get_conversation_id(channel_id, thread_ts):
+    return f"{channel_id}:{thread_ts}"
+
+@asynccontextmanager
+async def conversation_turn(conversation_id):
+    lock, users = conversation_locks.get(conversation_id, (None, 0))
+    lock = lock or asyncio.Lock()
+    conversation_locks[conversation_id] = (lock, users + 1)
+    try:
+        # asyncio.Lock wakes up waiters in FIFO order, i.e the order the mentions arrived in
+        async with lock:
+            yield
+    finally:
+        lock, users = conversation_locks[conversation_id]
+        if users == 1:
+            del conversation_locks[conversation_id]
+        else:
+            conversation_locks[conversation_id] = (lock, users - 1)
+
+@app.event("app_mention")
+async def handle_mention(body, event, say):
+    thread_ts = event.get("thread_ts", event["ts"])
+    with tracer.span("slack.app_mention", {
+            "slack.event_id": body.get("event_id", ""), "slack.channel": event["channel"], "slack.user": event["user"],
+            "slack.thread_ts": thread_ts}), observe_mention(time.monotonic()):
+        await process_mention(body, event, say)
+
+
+async def process_mention(body, event, say):
+    # retries are dropped before they can reach the LLM or apply a mutation twice
+    loop = asyncio.get_running_loop()
+    if await loop.run_in_executor(None, bind_context(slack_events.is_duplicate), body, event):
+        tracer.current_span().set_attribute("slack.duplicate", True)
+        record_action("duplicate")
+        return
+
+    channel_id = event["channel"]
+    user_id = event["user"]
+    thread_ts = event.get("thread_ts", event["ts"])
+    current_ts = event["ts"]
+
+    logger.info('logging event %s', json.dumps(event, indent=4, sort_keys=True))
+
+    conversation_id = get_conversation_id(channel_id, thread_ts)
+    async with conversation_turn(conversation_id), mention_slots:
+        user_input = event["text"].replace(SLACK_BOT_USER_ID, '').strip()
+
+        # acquiring may rehydrate history from the DB, releasing persists the new messages
+        conversation_chain: ConversationChain = await loop.run_in_executor(None, bind_context(active_conversations.acquire), conversation_id)
+        try:
+            result, amount_of_tokens = await llm.aget_conversation(chain=conversation_chain, prompt=user_input, username=user_id,
+                                                                   conversation_id=conversation_id)
+        finally:
+            await loop.run_in_executor(None, bind_context(active_conversations.release), conversation_id)
+
+        logger.info('LLM tokens used  %s', amount_of_tokens)
+        tracer.current_span().set_attribute("llm.total_tokens", amount_of_tokens)
+
+        with tracer.span("slack.say"):
+            await say(text=f'<@{user_id}> {result}.', thread_ts=thread_ts or current_ts)
+
+
+async def main():
+    # hot reload participants.csv changes (names, bios, new joiners) without a restart
+    participants_reload_interval = float(os.environ.get("PARTICIPANTS_RELOAD_INTERVAL_SECONDS", "0"))
+    if participants_reload_interval > 0:
+        llm.get_hackathon_database_connection().watch_participants(participants_reload_interval)
+
+    start_metrics_server_from_env(conversations=active_conversations, read_cache=llm.get_hackathon_database_connection().read_cache,
+                                  slack_events=slack_events, llm_caller=llm.llm_caller)
+
+    handler = AsyncSocketModeHandler(app, os.environ["SLACK_APP_TOKEN"])
+    await handler.start_async()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,21 +1,23 @@
 import streamlit as st
 from dotenv import load_dotenv
-import random
-import csv
 from llm.openai import OpenAILLM
+from streamlit_shared import pick_participant
 
 load_dotenv()
 
-llm = OpenAILLM()
+
+@st.cache_resource
+def get_llm() -> OpenAILLM:
+    # one per process, its DB connection, LLM caller and thread pools are shared by all sessions
+    return OpenAILLM()
+
+
+llm = get_llm()
 
 if "user_id" in st.session_state:
     user_id = st.session_state["user_id"]
 else:
-    with open("data/participants.csv") as f:
-        csv_reader = csv.reader(f)
-        lines = list(csv_reader)
-        line = random.choice(lines)
-        participant_username, participant_full_name = line[0], line[1]
+    participant_username, participant_full_name = pick_participant()
 
     st.session_state["user_id"] = participant_username
     st.session_state["user_full_name"] = participant_full_name
@@ -81,7 +83,8 @@ def handle_input():
     input = st.session_state.input
 
     llm_chain = st.session_state["llm_chain"]
-    result, amount_of_tokens = llm.get_conversation(chain=llm_chain, prompt=input, username=st.session_state["user_id"])
+    result, amount_of_tokens = llm.get_conversation(chain=llm_chain, prompt=input, username=st.session_state["user_id"],
+                                                    conversation_id=f'streamlit:{st.session_state["user_id"]}')
     question_with_id = {
         "question": input,
         "id": len(st.session_state.questions),
@@ -1,27 +1,39 @@
 import streamlit as st
 import json
 import os
-from datetime import datetime
 import openai  # You'll need to install this: pip install openai -- upgrade (version req for this script is higher)
 from dotenv import load_dotenv
-import random
+
+from core.hackathon_base import HackathonError
+from core.sqlite.hackathon_sqlite import HackathonSQLite
+from llm.team_context import TeamContextBuilder, tiktoken_counter
+from streamlit_shared import get_engine, pick_participant
 
 load_dotenv()
 
-openai_client = openai.OpenAI(
-    api_key=os.environ['OPENAI_API_KEY'],
-    max_retries=5,
-    timeout=10  # 7 seconds timeout
-)
 
-from core.json.hackathon_json import list_teams, create_team, join_team, load_data, get_unassigned_participants
+@st.cache_resource
+def get_openai_client() -> "openai.OpenAI":
+    # one per process, its HTTP connection pool is shared by all sessions
+    return openai.OpenAI(
+        api_key=os.environ['OPENAI_API_KEY'],
+        max_retries=5,
+        timeout=10  # 7 seconds timeout
+    )
+
+
+@st.cache_resource
+def get_team_context() -> TeamContextBuilder:
+    # the prompt gets the summary, the user's team and the teams named in the message, not every team
+    return TeamContextBuilder.from_env(get_engine(), tiktoken_counter("gpt-4o"))
+
 
 # Function to generate LLM prompt and get response
-def get_llm_response(user_input, data, context=None):
+def get_llm_response(user_input, engine: HackathonSQLite, context=None):
     prompt = f"""
     You are an AI assistant for a hackathon team creation and matching bot. Your task is to understand the user's intent and guide them through the process of creating a team, listing ideas, or joining a team. Here's the current state of teams:
 
-    {list_teams(data)}
+    {get_team_context().build(user_input, st.session_state.username)}
 
     The user has just said: "{user_input}"
 
@@ -50,7 +62,7 @@ def get_llm_response(user_input, data, context=None):
     # response = openai.Completion.create(engine="text-davinci-002", prompt=prompt, max_tokens=150)
     # llm_response = json.loads(response.choices[0].text.strip())
 
-    chat_completion_resp = openai_client.chat.completions.create(
+    chat_completion_resp = get_openai_client().chat.completions.create(
         model="gpt-4o",
         response_format={
             "type": "json_object"
@@ -105,8 +117,8 @@ def get_llm_response(user_input, data, context=None):
     return llm_response
 
 # Function to process user input based on LLM response
-def process_input(user_input, data, context=None):
-    llm_response = get_llm_response(user_input, data, context)
+def process_input(user_input, engine: HackathonSQLite, context=None):
+    llm_response = get_llm_response(user_input, engine, context)
     
     if llm_response["action"] == "start_team_creation":
         st.session_state.context = "waiting_for_team_name"
@@ -118,38 +130,61 @@ def process_input(user_input, data, context=None):
             return llm_response["message"]
     elif llm_response["action"] == "finalize_team_creation":
         idea = llm_response.get("idea", None)
-        result = create_team(data, st.session_state.team_name, idea, st.session_state.username)
+        result = create_team(engine, st.session_state.team_name, idea, st.session_state.username)
         st.session_state.context = None
         st.session_state.team_name = None
         return f"{result}\n\nIs there anything else you'd like to do?"
     elif llm_response["action"] == "list_ideas":
-        return list_teams(data)
+        return engine.list_teams()
     elif llm_response["action"] == "join_team":
         if "team_name" in llm_response:
-            return join_team(data, llm_response["team_name"], st.session_state.username)
+            return join_team(engine, llm_response["team_name"], st.session_state.username)
         else:
             return llm_response["message"]
     elif llm_response["action"] == "list_velle":
-        return get_unassigned_participants(data)
+        return ", ".join(engine.get_unassigned_participants())
     else:  # clarify
         return llm_response["message"]
 
+def create_team(engine: HackathonSQLite, team_name, idea, creator):
+    try:
+        team_name, _ = engine.create_team(team_name, creator)
+        if idea:
+            engine.add_idea_to_team(creator, idea)
+            return f"Team '{team_name}' has been created with the idea: {idea}"
+        return f"Team '{team_name}' has been created"
+    except HackathonError as e:
+        return e.message
+
+
+def join_team(engine: HackathonSQLite, team_name, participant):
+    try:
+        return f"You have successfully joined the team '{engine.join_team(team_name, participant)}'."
+    except HackathonError as e:
+        return e.message
+
+
 # Streamlit app
 def main():
     st.title("Hackathon Team Creation and Matching Bot")
 
+    # every session shares the engine of the process, so all tabs see the same teams
+    engine = get_engine()
+
     # Initialize session state
     if 'messages' not in st.session_state:
         st.session_state.messages = []
-    if 'data' not in st.session_state:
-        st.session_state.data = load_data()
+    if 'context' not in st.session_state:
+        st.session_state.context = None
     if 'username' not in st.session_state:
-        st.session_state.username = random.choice(["Alice", "Bob", "Charlie", "David", "Eve"]) # this will always be present in case of slack
+        # this will always be present in case of slack
+        st.session_state.username, st.session_state.user_full_name = pick_participant()
 
     # Username input
     if not st.session_state.username:
         st.session_state.username = st.text_input("Enter your name:")
         if st.session_state.username:
+            st.session_state.user_full_name = st.session_state.username
             st.success(f"Welcome, {st.session_state.username}!")
 
     if st.session_state.username:
@@ -179,23 +214,24 @@ def main():
                 st.markdown(prompt)
 
             # Generate bot response
-            response = process_input(prompt, st.session_state.data, st.session_state.context)
+            response = process_input(prompt, engine, st.session_state.context)
 
             # Add bot response to chat history
             st.session_state.messages.append({"role": "assistant", "content": response})
             with st.chat_message("assistant"):
                 st.markdown(response)
 
-        # Sidebar with team information
+        # Sidebar with team information, served from the engine's read cache until teams change
         st.sidebar.title("Team Information")
-        user_team = next((p['team'] for p in st.session_state.data['participants'] if p['name'] == st.session_state.username), None)
-        if user_team:
-            st.sidebar.success(f"You are in team: {user_team}")
+        st.sidebar.caption(f"You are {st.session_state.user_full_name}")
+        my_team = engine.list_my_team(st.session_state.username)
+        if my_team != "You are not in any team.":
+            st.sidebar.success(my_team)
         else:
             st.sidebar.warning("You are not in a team yet.")
-        
+
         st.sidebar.subheader("All Teams")
-        st.sidebar.text(list_teams(st.session_state.data))
+        st.sidebar.text(engine.list_teams())
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,34 @@
+'''
+Resources shared by every session of the streamlit apps in a process, created once with st.cache_resource.
+
+All tabs use the same hackathon engine (the process-wide HackathonSQLite, the one the slack bot uses), so they see
+each other's changes, and its reads (list_teams, list_my_team, ...) are served from its read cache until the next
+mutation bumps the data version. Reruns don't open the DB or read the participants CSV again.
+'''
+
+import random
+from typing import List, Tuple
+
+import streamlit as st
+
+from core.sqlite.hackathon_sqlite import HackathonSQLite, get_hackathon_sqlite
+
+
+@st.cache_resource
+def get_engine() -> HackathonSQLite:
+    return get_hackathon_sqlite()
+
+
+def get_roster() -> List[Tuple[str, str]]:
+    '''
+    (username, full_name) of every participant, from the engine's in-memory participants map. Not cached, so that
+    participants added or removed by a roster sync (reload_participants) show up on the next rerun
+    '''
+    return [(username, details['full_name']) for username, details in get_engine().participants_map.items()]
+
+
+def pick_participant() -> Tuple[str, str]:
+    '''
+    a random participant to play in a session
+    '''
+    return random.choice(get_roster())